@@ -1,5 +1,13 @@
 -- PostgreSQL schema for telegram-persona-bot
 
+-- Who may use the bot; loaded into an in-memory allowlist at startup and after every change
+CREATE TABLE IF NOT EXISTS users (
+user_id BIGINT PRIMARY KEY,
+role TEXT NOT NULL DEFAULT 'member', -- 'admin' or 'member'
+invited_by BIGINT,
+created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 CREATE TABLE IF NOT EXISTS settings (
 user_id BIGINT PRIMARY KEY,
 persona TEXT NOT NULL DEFAULT 'accountability',
@@ -18,4 +26,35 @@ timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 -- Index for faster message retrieval
 CREATE INDEX IF NOT EXISTS idx_messages_user_id_timestamp ON messages (user_id, timestamp);
 
+-- Append-only copy of every message, range-partitioned by month; partitions are created on demand.
+-- content_tsv is computed on insert and GIN-indexed for /search (the index is created by a migration,
+-- as archives from before search existed gain the column there).
+CREATE TABLE IF NOT EXISTS message_archive (
+id BIGSERIAL,
+user_id BIGINT NOT NULL,
+role TEXT NOT NULL,
+content TEXT NOT NULL,
+timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+content_tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', content)) STORED
+) PARTITION BY RANGE (timestamp);
+
+CREATE INDEX IF NOT EXISTS idx_message_archive_user_id_timestamp ON message_archive (user_id, timestamp);
+
+-- Rolling per-user summary of messages that have been folded out of the raw history
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+user_id BIGINT PRIMARY KEY,
+summary TEXT NOT NULL,
+last_message_id INTEGER NOT NULL, -- newest messages.id covered by the summary
+updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Scheduled jobs (APScheduler state), read once at startup in next_run_time order
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+id TEXT PRIMARY KEY,
+next_run_time DOUBLE PRECISION, -- UTC timestamp; NULL while paused
+job_state BYTEA NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_next_run_time ON scheduled_jobs (next_run_time);
+
 -- The 'schedule' table is now obsolete and will be removed by the application logic.
\ No newline at end of file
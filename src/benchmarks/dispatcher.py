@@ -0,0 +1,95 @@
+# src/benchmarks/dispatcher.py
+"""
+Per-chat dispatcher under load: for each --chats count, submits --jobs-per-chat jobs per chat
+in a shuffled interleaving, each sleeping --job-ms on average (as an awaited LLM or Telegram
+call would), and reports throughput, whether every chat's jobs ran in submission order, and
+whether the idle workers were reclaimed afterwards.
+
+    python src/benchmarks/dispatcher.py --chats 1,10,100,1000
+
+With chats running in parallel, throughput grows with the number of active chats while each
+chat stays at about 1000 / --job-ms jobs/sec.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import dispatcher
+from benchmarks.instrument import percentiles
+
+
+async def run_chats(chats: int, jobs_per_chat: int, job_seconds: float, rng: random.Random) -> dict:
+    ran = {chat: [] for chat in range(chats)}
+    latencies = []
+    reclaimed_before = dispatcher.stats()['workers_reclaimed']
+
+    def job(chat: int, index: int, seconds: float, submitted_at: float):
+        async def run():
+            await asyncio.sleep(seconds)
+            ran[chat].append(index)
+            latencies.append(time.perf_counter() - submitted_at)
+        return run
+
+    submissions = [chat for chat in range(chats) for _ in range(jobs_per_chat)]
+    rng.shuffle(submissions)
+    submitted = dict.fromkeys(range(chats), 0)
+    futures = []
+    started = time.perf_counter()
+    for chat in submissions:
+        seconds = rng.uniform(0, 2 * job_seconds)
+        futures.append(dispatcher.submit(chat, job(chat, submitted[chat], seconds, time.perf_counter())))
+        submitted[chat] += 1
+    await asyncio.gather(*futures)
+    elapsed = time.perf_counter() - started
+
+    await asyncio.sleep(dispatcher.DISPATCH_IDLE_TIMEOUT * 2)
+    return {
+        'jobs': len(submissions),
+        'seconds': round(elapsed, 3),
+        'jobs_per_sec': round(len(submissions) / elapsed),
+        'order_preserved': all(indexes == list(range(jobs_per_chat)) for indexes in ran.values()),
+        'job_latency_ms': percentiles(latencies),
+        'workers_reclaimed': dispatcher.stats()['workers_reclaimed'] - reclaimed_before,
+        'workers_left': dispatcher.stats()['active_workers'],
+    }
+
+
+async def main(args) -> dict:
+    dispatcher.DISPATCH_IDLE_TIMEOUT = args.idle_timeout
+    rng = random.Random(args.seed)
+    results = {}
+    for chats in [int(count) for count in args.chats.split(",")]:
+        results[chats] = await run_chats(chats, args.jobs_per_chat, args.job_ms / 1000, rng)
+    return {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            'python': platform.python_version(),
+            'args': {key: value for key, value in vars(args).items() if key != "output"},
+        },
+        'chats': results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", default="1,10,100,1000", help="Comma-separated active chat counts")
+    parser.add_argument("--jobs-per-chat", type=int, default=20)
+    parser.add_argument("--job-ms", type=float, default=10, help="Mean job duration")
+    parser.add_argument("--idle-timeout", type=float, default=0.1, help="dispatcher.DISPATCH_IDLE_TIMEOUT for the run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    output = json.dumps(asyncio.run(main(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
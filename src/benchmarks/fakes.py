@@ -0,0 +1,192 @@
+# src/benchmarks/fakes.py
+"""Local stand-ins for the Telegram Bot API, OpenRouter and Voice Monkey."""
+import asyncio
+import itertools
+import json
+import time
+import urllib.parse
+from typing import Any, Dict, List, Optional, Set
+
+from bot import http_server
+
+BENCHMARK_TOKEN = "123456:BENCHMARK"
+
+
+def _json_response(payload: Any) -> http_server.Response:
+    return 200, json.dumps(payload).encode("utf-8"), "application/json"
+
+
+def _form(request: http_server.Request) -> Dict[str, str]:
+    if request.headers.get("content-type", "").startswith("application/json"):
+        return json.loads(request.body or b"{}")
+    return {key: values[-1] for key, values in urllib.parse.parse_qs(request.body.decode("utf-8")).items()}
+
+
+class FakeServer:
+    """Serves a route table on a free local port."""
+
+    def __init__(self):
+        self.routes: Dict = {}
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.port = 0
+
+    async def start(self):
+        self.server = await http_server.serve(self.routes, 0, host="127.0.0.1")
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+
+class FakeTelegram(FakeServer):
+    """
+    Minimal Bot API: getMe, sendMessage, editMessageText, deleteMessage, sendDocument,
+    deleteWebhook and long-polling getUpdates. Every call takes `latency` seconds.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self.sent: List[Dict[str, Any]] = []
+        self._message_ids = itertools.count(1)
+        self._updates: List[Dict[str, Any]] = []
+        self._updates_ready = asyncio.Event()
+        self._polls: Set[asyncio.Task] = set()  # Connections waiting in a long poll
+        self._stopping = False
+        for method in ("getMe", "sendMessage", "editMessageText", "deleteMessage", "sendDocument",
+                       "deleteWebhook", "setWebhook", "getUpdates"):
+            self.routes[("POST", f"/bot{BENCHMARK_TOKEN}/{method}")] = self._handler(method)
+
+    @property
+    def api_url(self) -> str:
+        """Value for Bot(base_url=...)."""
+        return f"{self.base_url}/bot"
+
+    def _handler(self, method: str):
+        async def handle(request: http_server.Request) -> http_server.Response:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            params = _form(request)
+            if method == "getUpdates":
+                return _json_response({"ok": True, "result": await self._get_updates(params)})
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return _json_response({"ok": True, "result": self._result(method, params)})
+        return handle
+
+    def _result(self, method: str, params: Dict[str, str]) -> Any:
+        if method == "getMe":
+            return {"id": 123456, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+        if method in ("deleteMessage", "deleteWebhook", "setWebhook"):
+            return True
+        chat_id = int(params.get("chat_id", 0))
+        self.sent.append({"method": method, "chat_id": chat_id, "at": time.perf_counter()})
+        message_id = int(params["message_id"]) if "message_id" in params else next(self._message_ids)
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", ""),
+        }
+
+    def push_update(self, update: Dict[str, Any]):
+        """Queues an update for the next getUpdates call."""
+        self._updates.append(update)
+        self._updates_ready.set()
+
+    async def _get_updates(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset", 0))
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates:
+            self._updates_ready.clear()
+            poll = asyncio.current_task()
+            self._polls.add(poll)
+            try:
+                await asyncio.wait_for(self._updates_ready.wait(), float(params.get("timeout", 0)))
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # Cut short by stop(); the connection then finishes normally
+                if not self._stopping:
+                    raise
+            finally:
+                self._polls.discard(poll)
+        return list(self._updates)
+
+    async def stop(self):
+        """
+        Ends long polls still waiting for a client that has gone away, so no connection is
+        left to be cancelled, with a traceback, when the event loop closes.
+        """
+        self._stopping = True
+        polls = list(self._polls)
+        for poll in polls:
+            poll.cancel()
+        await asyncio.gather(*polls, return_exceptions=True)
+        await super().stop()
+
+
+class FakeOpenRouter(FakeServer):
+    """
+    Chat completions endpoint. Answers after `first_token_latency`, then (when streaming)
+    emits `tokens` chunks `token_interval` seconds apart.
+    """
+
+    def __init__(self, first_token_latency: float = 0.3, tokens: int = 40, token_interval: float = 0.01):
+        super().__init__()
+        self.first_token_latency = first_token_latency
+        self.tokens = tokens
+        self.token_interval = token_interval
+        self.calls = {'completion': 0, 'stream': 0}
+        self.routes[("POST", "/api/v1/chat/completions")] = self._complete
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.base_url}/api/v1/chat/completions"
+
+    async def _complete(self, request: http_server.Request) -> http_server.Response:
+        payload = json.loads(request.body)
+        words = [f"word{i} " for i in range(self.tokens)]
+        if not payload.get("stream"):
+            self.calls['completion'] += 1
+            await asyncio.sleep(self.first_token_latency + self.token_interval * self.tokens)
+            return _json_response({"choices": [{"message": {"role": "assistant", "content": "".join(words)}}],
+                                   "usage": {"prompt_tokens": 0, "completion_tokens": self.tokens}})
+        self.calls['stream'] += 1
+
+        async def events():
+            await asyncio.sleep(self.first_token_latency)
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(self.token_interval)
+                yield f"data: {json.dumps({'choices': [{'delta': {'content': word}}]})}\n\n".encode("utf-8")
+            yield b"data: [DONE]\n\n"
+
+        return 200, events(), "text/event-stream"
+
+
+class FakeVoiceMonkey(FakeServer):
+    """Announcement endpoint that counts calls and characters announced."""
+
+    def __init__(self, latency: float = 0.05):
+        super().__init__()
+        self.latency = latency
+        self.calls = 0
+        self.characters = 0
+        self.routes[("GET", "/announcement")] = self._announce
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.base_url}/announcement"
+
+    async def _announce(self, request: http_server.Request) -> http_server.Response:
+        self.calls += 1
+        self.characters += len(urllib.parse.parse_qs(request.query).get("text", [""])[0])
+        await asyncio.sleep(self.latency)
+        return _json_response({"success": True})
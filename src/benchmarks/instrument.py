@@ -0,0 +1,134 @@
+# src/benchmarks/instrument.py
+"""Stage timers patched onto module functions, a storage call counter, and an event-loop stall monitor."""
+import asyncio
+import functools
+import inspect
+import time
+from typing import Any, Dict, List
+
+
+def percentiles(samples: List[float], scale: float = 1000.0) -> Dict[str, float]:
+    """count/mean/p50/p95/p99/max of samples, in milliseconds by default."""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * scale, 3)
+
+    return {
+        'count': len(ordered),
+        'mean': round(sum(ordered) / len(ordered) * scale, 3),
+        'p50': pick(0.5),
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+        'max': round(ordered[-1] * scale, 3),
+    }
+
+
+class StageTimer:
+    """Replaces module attributes with timed wrappers; restore() puts the originals back."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self._patched: List[tuple] = []
+
+    def record(self, stage: str, seconds: float):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, module: Any, name: str, stage: str):
+        """Times an async function."""
+        original = getattr(module, name)
+
+        @functools.wraps(original)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+
+        self._patch(module, name, original, timed)
+
+    def wrap_stream(self, module: Any, name: str, first_stage: str, total_stage: str):
+        """Times an async generator function to its first item and to exhaustion."""
+        original = getattr(module, name)
+
+        @functools.wraps(original)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            first = True
+            try:
+                async for item in original(*args, **kwargs):
+                    if first:
+                        self.record(first_stage, time.perf_counter() - started)
+                        first = False
+                    yield item
+            finally:
+                self.record(total_stage, time.perf_counter() - started)
+
+        self._patch(module, name, original, timed)
+
+    def _patch(self, module, name, original, replacement):
+        setattr(module, name, replacement)
+        self._patched.append((module, name, original))
+
+    def restore(self):
+        for module, name, original in reversed(self._patched):
+            setattr(module, name, original)
+        self._patched.clear()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {stage: percentiles(samples) for stage, samples in sorted(self.samples.items())}
+
+
+class CountingBackend:
+    """Wraps a storage backend and counts its calls; each is one database round trip."""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self.counter = {'round_trips': 0}
+
+    def __getattr__(self, name):
+        attr = getattr(self._backend, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def counted(*args, **kwargs):
+            self.counter['round_trips'] += 1
+            return await attr(*args, **kwargs)
+        return counted
+
+
+class LoopMonitor:
+    """
+    Sleeps `interval` seconds in a loop; any extra delay before it wakes is time the event
+    loop spent blocked. Delays beyond `threshold` are counted as stalls.
+    """
+
+    def __init__(self, interval: float = 0.005, threshold: float = 0.01):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: List[float] = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> Dict[str, Any]:
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        stalls = [lag for lag in self.lags if lag > self.threshold]
+        return {
+            'blocked_ms_total': round(sum(stalls) * 1000, 3),
+            'stalls': len(stalls),
+            'lag_ms': percentiles(self.lags),
+        }
@@ -0,0 +1,137 @@
+# src/benchmarks/jobstore.py
+"""
+Job store latency with a large persisted schedule: add/remove as seen by the caller on the
+event loop, the due-job query a scheduler wakeup makes, write-behind drain time, and how
+long a restart takes to load everything back.
+
+    python src/benchmarks/jobstore.py --jobs 100000
+    python src/benchmarks/jobstore.py --backends sqlite,postgres --database-url postgresql://localhost/throwaway
+
+Postgres only runs with --database-url; point it at a throwaway database.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from database import db_utils
+from database.backends import create_backend
+from database.jobstore import BackendJobStore
+from benchmarks.instrument import percentiles
+
+JOB_FUNC = "builtins:print"
+
+
+async def _started_scheduler() -> BackendJobStore:
+    store = BackendJobStore()
+    await store.load()
+    scheduler = AsyncIOScheduler(jobstores={'default': store}, timezone=timezone.utc)
+    # Paused: nothing runs, so the store holds exactly what the benchmark put in
+    scheduler.start(paused=True)
+    return store
+
+
+async def run_backend(kind: str, args) -> dict:
+    database_path = os.path.join(tempfile.mkdtemp(prefix="bench-jobs-"), "bot.db")
+    db_utils.BACKEND = create_backend(kind, args.database_url, database_path)
+    await db_utils.BACKEND.connect()
+    await db_utils.BACKEND.initialize()
+    await db_utils.BACKEND.delete_all_jobs()
+    try:
+        store = await _started_scheduler()
+        scheduler = store._scheduler
+        now = datetime.now(timezone.utc)
+
+        add = []
+        for i in range(args.jobs):
+            # The first `due` jobs are already due; the rest spread out over the coming days
+            run_date = now - timedelta(seconds=1) if i < args.due else now + timedelta(seconds=i)
+            started = time.perf_counter()
+            scheduler.add_job(JOB_FUNC, 'date', run_date=run_date, id=f"bench-{i}", args=[i])
+            add.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        await store.flush()
+        drain_seconds = time.perf_counter() - started
+
+        due = []
+        for _ in range(200):
+            started = time.perf_counter()
+            due_jobs = store.get_due_jobs(datetime.now(timezone.utc))
+            due.append(time.perf_counter() - started)
+        assert len(due_jobs) == args.due, f"{len(due_jobs)} due jobs, expected {args.due}"
+
+        remove = []
+        for i in range(args.due, args.due + args.removals):
+            started = time.perf_counter()
+            scheduler.remove_job(f"bench-{i}")
+            remove.append(time.perf_counter() - started)
+        await store.flush()
+        scheduler.shutdown()
+        await store.close()
+
+        # A restart: read every persisted job and rebuild the in-memory index
+        started = time.perf_counter()
+        restarted = await _started_scheduler()
+        load_seconds = time.perf_counter() - started
+        loaded = len(restarted.get_all_jobs())
+        assert loaded == args.jobs - args.removals, f"{loaded} jobs reloaded"
+        restarted._scheduler.shutdown()
+        await restarted.close()
+
+        return {
+            'jobs': args.jobs,
+            'add_job_ms': percentiles(add),
+            'remove_job_ms': percentiles(remove),
+            'get_due_jobs_ms': {'due': args.due, **percentiles(due)},
+            'write_behind_drain_ms': round(drain_seconds * 1000, 1),
+            'restart_load_ms': round(load_seconds * 1000, 1),
+        }
+    finally:
+        await db_utils.BACKEND.delete_all_jobs()
+        await db_utils.BACKEND.close()
+
+
+async def main(args) -> dict:
+    results = {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            'python': platform.python_version(),
+            'args': {key: value for key, value in vars(args).items() if key not in ("database_url", "output")},
+        },
+        'backends': {},
+    }
+    for kind in [kind.strip() for kind in args.backends.split(",") if kind.strip()]:
+        if kind == "postgres" and not args.database_url:
+            results['backends'][kind] = {'skipped': "needs --database-url"}
+            continue
+        results['backends'][kind] = await run_backend(kind, args)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="memory,sqlite,postgres", help="Comma-separated subset of: memory, sqlite, postgres")
+    parser.add_argument("--database-url", help="Throwaway Postgres for the postgres backend")
+    parser.add_argument("--jobs", type=int, default=100_000, help="Persisted jobs")
+    parser.add_argument("--due", type=int, default=100, help="Jobs already due at query time")
+    parser.add_argument("--removals", type=int, default=1000)
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    output = json.dumps(asyncio.run(main(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
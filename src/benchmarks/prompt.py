@@ -0,0 +1,105 @@
+# src/benchmarks/prompt.py
+"""
+Prompt size and build time for long histories: packs a synthetic --messages history for each
+model in the route (and one with the default window) and compares the prompt with what
+sending the whole history would cost.
+
+    python src/benchmarks/prompt.py --messages 10000
+
+Cold builds estimate every message's tokens; warm builds hit the per-message token cache,
+as consecutive turns of one chat do.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import context_builder, personas
+from benchmarks.instrument import percentiles
+
+WORDS = ["goal", "gym", "sleep", "project", "deadline", "family", "focus", "habit", "music", "travel",
+         "budget", "reading", "coffee", "walk", "code", "meeting", "plan", "week", "tired", "happy"]
+
+
+def _history(rng: random.Random, count: int):
+    """Mostly short chat lines with the occasional long message, alternating speakers."""
+    history = []
+    for i in range(count):
+        length = rng.randint(3, 30) if rng.random() < 0.95 else rng.randint(200, 1500)
+        history.append(("user" if i % 2 else "bot", " ".join(rng.choices(WORDS, k=length))))
+    return history
+
+
+def _payload_bytes(messages) -> int:
+    return len(json.dumps(messages).encode("utf-8"))
+
+
+def run_model(model: str, history, system_prompt: str, repeats: int) -> dict:
+    def build():
+        return context_builder.build_messages(system_prompt, history, "latest message", model, summary="summary so far")
+
+    cold = []
+    for _ in range(max(1, repeats // 10)):
+        context_builder.estimate_tokens.cache_clear()
+        started = time.perf_counter()
+        messages = build()
+        cold.append(time.perf_counter() - started)
+    warm = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        messages = build()
+        warm.append(time.perf_counter() - started)
+
+    return {
+        'prompt_budget_tokens': context_builder.prompt_budget(model),
+        'history_messages_kept': len(messages) - 3,  # Less the system prompt, summary and latest turn
+        'prompt_tokens': sum(context_builder.estimate_tokens(message['content']) for message in messages),
+        'payload_bytes': _payload_bytes(messages),
+        'build_cold_ms': percentiles(cold),
+        'build_warm_ms': percentiles(warm),
+    }
+
+
+def main(args) -> dict:
+    history = _history(random.Random(args.seed), args.messages)
+    system_prompt = personas.PERSONAS["accountability"]["system_prompt"]
+    unbounded = [{"role": "system", "content": system_prompt}] + [
+        {"role": "assistant" if role == "bot" else "user", "content": content} for role, content in history
+    ]
+    models = list(dict.fromkeys(personas.MODEL_ROUTE + ["default-window/model"]))
+    return {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            'python': platform.python_version(),
+            'args': {key: value for key, value in vars(args).items() if key != "output"},
+            'prompt_token_budget': context_builder.PROMPT_TOKEN_BUDGET,
+            'max_output_tokens': context_builder.MAX_OUTPUT_TOKENS,
+        },
+        'whole_history': {
+            'messages': len(history),
+            'prompt_tokens': sum(context_builder.estimate_tokens(message['content']) for message in unbounded),
+            'payload_bytes': _payload_bytes(unbounded),
+        },
+        'models': {model: run_model(model, history, system_prompt, args.repeats) for model in models},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=10_000, help="History length")
+    parser.add_argument("--repeats", type=int, default=200, help="Warm builds per model")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    output = json.dumps(main(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
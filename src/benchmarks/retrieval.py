@@ -0,0 +1,125 @@
+# src/benchmarks/retrieval.py
+"""
+Relevant-context recall over a long history: indexes --messages synthetic messages for one
+user through retrieval.index_message (embedding, in-memory matrix and on-disk append), then
+times searches as personas' prompt building runs them, and reloading the index from disk.
+
+    python src/benchmarks/retrieval.py --messages 100000
+
+search_ms includes embedding the query; matrix_search_ms is the dot product and top-k alone.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db_utils
+from database.backends import create_backend
+from bot import retrieval
+from benchmarks.instrument import percentiles
+
+USER_ID = 9_300_000_000
+TARGET_MS = 5.0
+WORDS = ["goal", "gym", "sleep", "project", "deadline", "family", "focus", "habit", "music", "travel",
+         "budget", "reading", "coffee", "walk", "code", "meeting", "plan", "week", "tired", "happy"]
+RARE_WORDS = [f"topic{i}" for i in range(2000)]
+QUERIES = {
+    'common_words': "how is my gym habit going this week",
+    'rare_word': "what did I say about topic42",
+    'mixed': "coffee before the project deadline topic7",
+    'no_overlap': "quantum entanglement lecture",
+}
+
+
+def _message(rng: random.Random) -> str:
+    words = rng.choices(WORDS, k=rng.randint(4, 20))
+    if rng.random() < 0.2:
+        words.append(rng.choice(RARE_WORDS))
+    return " ".join(words)
+
+
+async def main(args) -> dict:
+    if not retrieval.RETRIEVAL_ENABLED:
+        return {'skipped': "retrieval is disabled (numpy missing or RETRIEVAL_ENABLED=false)"}
+    retrieval.RETRIEVAL_INDEX_DIR = tempfile.mkdtemp(prefix="bench-retrieval-")
+    # A user without an index is bootstrapped from their stored history; start from none
+    db_utils.BACKEND = create_backend("memory")
+    await db_utils.BACKEND.connect()
+
+    rng = random.Random(args.seed)
+    messages = [("user" if i % 2 else "bot", _message(rng)) for i in range(args.messages)]
+
+    started = time.perf_counter()
+    for role, content in messages:
+        await retrieval.index_message(USER_ID, role, content)
+    # Let the on-disk appends catch up before timing anything else
+    await asyncio.get_running_loop().run_in_executor(retrieval._io_executor, lambda: None)
+    index_seconds = time.perf_counter() - started
+
+    index = await retrieval._get_index(USER_ID)
+    search = {}
+    for name, query in QUERIES.items():
+        end_to_end, matrix = [], []
+        vector = retrieval.embed(query)
+        for _ in range(args.repeats):
+            started = time.perf_counter()
+            hits = await retrieval.search(USER_ID, query, exclude_recent=db_utils.MESSAGE_HISTORY_LIMIT)
+            end_to_end.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            index.search(vector, retrieval.RETRIEVAL_TOP_K, db_utils.MESSAGE_HISTORY_LIMIT, retrieval.RETRIEVAL_MIN_SCORE)
+            matrix.append(time.perf_counter() - started)
+        search[name] = {'hits': len(hits), 'search_ms': percentiles(end_to_end), 'matrix_search_ms': percentiles(matrix)}
+
+    # A restart (or eviction from the in-memory LRU) reads the index back from disk
+    retrieval._indexes.clear()
+    started = time.perf_counter()
+    await retrieval._get_index(USER_ID)
+    load_seconds = time.perf_counter() - started
+
+    await retrieval.clear(USER_ID)
+    await db_utils.BACKEND.close()
+    worst_p95 = max(result['search_ms']['p95'] for result in search.values())
+    return {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            'python': platform.python_version(),
+            'args': {key: value for key, value in vars(args).items() if key != "output"},
+            'dim': retrieval.RETRIEVAL_DIM,
+            'top_k': retrieval.RETRIEVAL_TOP_K,
+        },
+        'index': {
+            'messages': index.count,
+            'seconds': round(index_seconds, 2),
+            'messages_per_sec': round(index.count / index_seconds),
+            'matrix_mb': round(index.count * retrieval.RETRIEVAL_DIM * 4 / 2 ** 20, 1),
+            'load_from_disk_ms': round(load_seconds * 1000, 1),
+        },
+        'search': search,
+        'target_ms': TARGET_MS,
+        'p95_within_target': worst_p95 < TARGET_MS,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000, help="Messages indexed for the user")
+    parser.add_argument("--repeats", type=int, default=200, help="Timed searches per query")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    output = json.dumps(asyncio.run(main(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
@@ -0,0 +1,405 @@
+# src/benchmarks/run.py
+"""
+End-to-end benchmarks against local fakes of Telegram, OpenRouter and Voice Monkey.
+Synthetic updates go through the real handlers.handle_message and scheduler.send_ping
+paths; results (throughput, per-stage latency percentiles, DB round trips, event-loop
+blocking) are printed as JSON so runs can be diffed.
+
+    python src/benchmarks/run.py --users 50 --turns 5 --output results.json
+    python src/benchmarks/run.py --scenarios micro
+    python src/benchmarks/run.py --storage sqlite
+    python src/benchmarks/run.py --storage postgres --database-url postgresql://localhost/throwaway
+
+Storage defaults to the in-memory backend; sqlite uses a throwaway file.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Configure the bot modules before they read their settings at import time
+_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+_parser.add_argument("--scenarios", default="messages,pings,ingress,micro",
+                     help="Comma-separated subset of: messages, pings, ingress, micro")
+_parser.add_argument("--users", type=int, default=20, help="Concurrent chats")
+_parser.add_argument("--turns", type=int, default=5, help="Turns per chat in the messages scenario")
+_parser.add_argument("--burst", type=int, default=1, help="Messages sent back-to-back per turn")
+_parser.add_argument("--think-time", type=float, default=0.05, help="Seconds a user waits between turns")
+_parser.add_argument("--debounce", type=float, default=0.0, help="handlers.DEBOUNCE_WINDOW for the run")
+_parser.add_argument("--no-stream", action="store_true", help="Use non-streaming replies")
+_parser.add_argument("--llm-latency", type=float, default=0.3, help="Fake OpenRouter time to first token")
+_parser.add_argument("--llm-tokens", type=int, default=40)
+_parser.add_argument("--llm-token-interval", type=float, default=0.01)
+_parser.add_argument("--telegram-latency", type=float, default=0.02)
+_parser.add_argument("--telegram-limits", action="store_true",
+                     help="Keep the real outbound rate limits (default: unlimited, to measure the bot itself)")
+_parser.add_argument("--ingress-updates", type=int, default=500)
+_parser.add_argument("--ingress-rate", type=float, default=200, help="Updates per second for the ingress comparison")
+_parser.add_argument("--micro-messages", type=int, default=20000, help="Index size for the retrieval micro-benchmark")
+_parser.add_argument("--storage", choices=("memory", "sqlite", "postgres"), default="memory",
+                     help="Storage backend for the run")
+_parser.add_argument("--database-url", help="Throwaway Postgres for --storage postgres")
+_parser.add_argument("--output", help="Write JSON here instead of stdout")
+ARGS = _parser.parse_args() if __name__ == "__main__" else _parser.parse_args([])
+
+os.environ["OPENROUTER_API_KEY"] = "benchmark"
+os.environ["VOICE_MONKEY_TOKEN"] = "benchmark"
+os.environ["VOICE_MONKEY_DEVICE_ID"] = "benchmark"
+os.environ.setdefault("OWNER_TELEGRAM_ID", "1000")
+os.environ["RETRIEVAL_INDEX_DIR"] = tempfile.mkdtemp(prefix="bench-retrieval-")
+os.environ["STORAGE_BACKEND"] = ARGS.storage
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench-db-"), "bot.db")
+if ARGS.database_url:
+    os.environ["DATABASE_URL"] = ARGS.database_url
+else:
+    os.environ.pop("DATABASE_URL", None)
+
+from telegram import Bot, Update
+from telegram.ext import Application
+from telegram.request import HTTPXRequest
+
+from database import db_utils
+from bot import access, context_builder, handlers, http_server, llm_client, memory, outbound, personas, retrieval, scheduler, utils, webhook
+from benchmarks import webhook_load
+from benchmarks.fakes import BENCHMARK_TOKEN, FakeOpenRouter, FakeTelegram, FakeVoiceMonkey
+from benchmarks.instrument import CountingBackend, LoopMonitor, StageTimer, percentiles
+
+FIRST_USER_ID = 1000
+
+
+def _update_payload(update_id: int, user_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": text,
+        },
+    }
+
+
+class Environment:
+    """Fakes, patched endpoints, the storage backend and a Bot wired to the fake API."""
+
+    def __init__(self, args):
+        self.args = args
+        self.telegram = FakeTelegram(latency=args.telegram_latency)
+        self.openrouter = FakeOpenRouter(args.llm_latency, args.llm_tokens, args.llm_token_interval)
+        self.voice = FakeVoiceMonkey()
+        self.storage = None
+        self.bot = None
+        self.user_ids = list(range(FIRST_USER_ID, FIRST_USER_ID + args.users))
+
+    async def __aenter__(self):
+        for fake in (self.telegram, self.openrouter, self.voice):
+            await fake.start()
+        personas.OPENROUTER_API_URL = self.openrouter.api_url
+        utils.VOICE_MONKEY_URL = self.voice.api_url
+        handlers.DEBOUNCE_WINDOW = self.args.debounce
+        handlers.STREAM_REPLIES = not self.args.no_stream
+
+        await db_utils.open_storage()
+        await db_utils.initialize_database()
+        self.storage = db_utils.BACKEND = CountingBackend(db_utils.BACKEND)
+        for user_id in self.user_ids:
+            await db_utils.save_user(user_id, 'member', None)
+            await db_utils.update_user_setting(user_id, 'persona', 'accountability')
+            await memory.clear_memory(user_id)
+        await access.load()
+        db_utils.start_background_tasks()
+
+        if not self.args.telegram_limits:
+            for name in ("OUTBOUND_GLOBAL_RATE", "OUTBOUND_GLOBAL_BURST", "OUTBOUND_CHAT_RATE", "OUTBOUND_CHAT_BURST"):
+                setattr(outbound, name, 1e9)
+        outbound.start()
+        utils.start_announcer()
+
+        self.bot = Bot(BENCHMARK_TOKEN, base_url=self.telegram.api_url,
+                       request=HTTPXRequest(connection_pool_size=256))
+        await self.bot.initialize()
+        scheduler.set_bot(self.bot)
+        return self
+
+    async def __aexit__(self, *exc):
+        await outbound.stop()
+        await utils.stop_announcer()
+        await db_utils.stop_background_tasks()
+        await llm_client.close()
+        await self.bot.shutdown()
+        await db_utils.close_storage()
+        for fake in (self.telegram, self.openrouter, self.voice):
+            await fake.stop()
+
+    def update(self, update_id: int, user_id: int, text: str) -> Update:
+        return Update.de_json(_update_payload(update_id, user_id, text), self.bot)
+
+
+def _instrument() -> StageTimer:
+    timer = StageTimer()
+    timer.wrap(db_utils, "get_user_setting", "settings")
+    timer.wrap(memory, "get_context", "history")
+    timer.wrap(retrieval, "search", "retrieval")
+    timer.wrap(memory, "add_message", "persist")
+    timer.wrap_stream(personas, "stream_response", "llm_first_token", "llm_stream")
+    timer.wrap(personas, "generate_response", "llm_completion")
+    timer.wrap(scheduler, "generate_ping", "llm_ping")
+    timer.wrap(outbound, "send", "telegram_send")
+    timer.wrap(utils, "_announce", "alexa_announce")
+    return timer
+
+
+async def scenario_messages(env: Environment) -> dict:
+    """Closed loop: each chat sends a burst, waits for the reply to be stored, thinks, repeats."""
+    args = env.args
+    turn_done = {}
+    original_run_turn = handlers._run_turn
+    timer = _instrument()
+    timer.wrap(handlers, "_run_turn", "turn")
+    timed_turn = handlers._run_turn
+
+    async def tracked_turn(turn):
+        try:
+            return await timed_turn(turn)
+        finally:
+            turn_done[turn.update.effective_chat.id].set()
+
+    handlers._run_turn = tracked_turn
+    latencies = []
+    update_ids = iter(range(1, 10 ** 9))
+
+    async def user_loop(user_id: int):
+        await asyncio.sleep(random.random() * args.think_time)
+        for turn in range(args.turns):
+            turn_done[user_id] = asyncio.Event()
+            started = time.perf_counter()
+            for i in range(args.burst):
+                await handlers.handle_message(env.update(next(update_ids), user_id, f"turn {turn} part {i} about goals"), None)
+            await turn_done[user_id].wait()
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(args.think_time)
+
+    round_trips_before = env.storage.counter['round_trips']
+    llm_before = dict(env.openrouter.calls)
+    monitor = LoopMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(user_loop(user_id) for user_id in env.user_ids))
+        elapsed = time.perf_counter() - started
+        await db_utils.flush_messages()
+    finally:
+        handlers._run_turn = original_run_turn
+        timer.restore()
+    loop_stats = await monitor.stop()
+
+    turns = len(latencies)
+    updates = turns * args.burst
+    return {
+        'chats': len(env.user_ids),
+        'updates': updates,
+        'turns': turns,
+        'seconds': round(elapsed, 3),
+        'turns_per_sec': round(turns / elapsed, 2),
+        'update_to_reply_ms': percentiles(latencies),
+        'stages_ms': timer.summary(),
+        'db_round_trips_per_update': round((env.storage.counter['round_trips'] - round_trips_before) / updates, 3),
+        'llm_calls': {kind: count - llm_before[kind] for kind, count in env.openrouter.calls.items()},
+        'event_loop': loop_stats,
+        'outbound': outbound.stats(),
+    }
+
+
+async def scenario_pings(env: Environment) -> dict:
+    """Fires send_ping for every chat at once, as a shared schedule tick would."""
+    timer = _instrument()
+    timer.wrap(scheduler, "send_ping", "ping")
+    round_trips_before = env.storage.counter['round_trips']
+    monitor = LoopMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(scheduler.send_ping(user_id) for user_id in env.user_ids))
+        elapsed = time.perf_counter() - started
+        await db_utils.flush_messages()
+    finally:
+        timer.restore()
+    loop_stats = await monitor.stop()
+    return {
+        'pings': len(env.user_ids),
+        'seconds': round(elapsed, 3),
+        'pings_per_sec': round(len(env.user_ids) / elapsed, 2),
+        'stages_ms': timer.summary(),
+        'db_round_trips_per_ping': round((env.storage.counter['round_trips'] - round_trips_before) / len(env.user_ids), 3),
+        'event_loop': loop_stats,
+    }
+
+
+async def _measure_delivery(application: Application, deliver, count: int, rate: float) -> dict:
+    """Delivers `count` updates at `rate`/s via deliver(update_id) and times their arrival on the update queue."""
+    sent_at = {}
+    latencies = []
+
+    async def drain():
+        for _ in range(count):
+            update = await application.update_queue.get()
+            latencies.append(time.perf_counter() - sent_at[update.update_id])
+
+    drainer = asyncio.create_task(drain())
+    for update_id in range(1, count + 1):
+        sent_at[update_id] = time.perf_counter()
+        await deliver(update_id)
+        await asyncio.sleep(1 / rate)
+    await asyncio.wait_for(drainer, 30)
+    return percentiles(latencies)
+
+
+async def scenario_ingress(env: Environment) -> dict:
+    """Update delivery latency at a fixed rate, polling vs webhook, plus webhook max throughput."""
+    args = env.args
+
+    polling_app = Application.builder().token(BENCHMARK_TOKEN).base_url(env.telegram.api_url).build()
+    await polling_app.initialize()
+    await polling_app.updater.start_polling(poll_interval=0, timeout=10)
+
+    async def push(update_id):
+        env.telegram.push_update(_update_payload(update_id, FIRST_USER_ID, "hi"))
+
+    polling = await _measure_delivery(polling_app, push, args.ingress_updates, args.ingress_rate)
+    await polling_app.updater.stop()
+    await polling_app.shutdown()
+
+    webhook_app = Application.builder().token(BENCHMARK_TOKEN).base_url(env.telegram.api_url).updater(None).build()
+    webhook.register(webhook_app)
+    port = 18081
+    await http_server.start(port, host="127.0.0.1")
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+    async def post(update_id):
+        body = json.dumps(_update_payload(update_id, FIRST_USER_ID, "hi")).encode("utf-8")
+        writer.write((
+            f"POST {webhook.WEBHOOK_PATH} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n"
+            f"X-Telegram-Bot-Api-Secret-Token: {webhook.WEBHOOK_SECRET}\r\n\r\n"
+        ).encode("latin-1") + body)
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        await reader.readexactly(length)
+
+    webhook_delivery = await _measure_delivery(webhook_app, post, args.ingress_updates, args.ingress_rate)
+    writer.close()
+    await http_server.stop()
+
+    return {
+        'rate_per_sec': args.ingress_rate,
+        'polling_delivery_ms': polling,
+        'webhook_delivery_ms': webhook_delivery,
+        'webhook_max_throughput': await webhook_load.run(5000, 16, port),
+    }
+
+
+def _time_per_call(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+async def scenario_micro(env: Environment) -> dict:
+    """Hot-path building blocks in isolation."""
+    args = env.args
+    results = {}
+
+    if retrieval.RETRIEVAL_ENABLED:
+        import numpy as np
+        words = ["goal", "gym", "sleep", "project", "deadline", "family", "focus", "habit", "music", "travel",
+                 "budget", "reading", "coffee", "walk", "code", "meeting", "plan", "week", "tired", "happy"]
+        messages = [("user", " ".join(random.choices(words, k=12))) for _ in range(args.micro_messages)]
+        started = time.perf_counter()
+        vectors = np.array([retrieval.embed(content) for _, content in messages], dtype=np.float32)
+        embed_seconds = (time.perf_counter() - started) / len(messages)
+        index = retrieval._UserIndex(vectors, messages)
+        query = retrieval.embed("how is my gym habit going this week")
+        results['retrieval'] = {
+            'messages': len(messages),
+            'embed_us': round(embed_seconds * 1e6, 2),
+            'search_ms': round(_time_per_call(
+                lambda: index.search(query, retrieval.RETRIEVAL_TOP_K, 50, retrieval.RETRIEVAL_MIN_SCORE), 50) * 1000, 3),
+        }
+
+    history = [("user" if i % 2 else "bot", f"message number {i} " * 20) for i in range(50)]
+    context_builder.estimate_tokens.cache_clear()
+    results['context_builder'] = {
+        'history_messages': len(history),
+        'build_messages_us': round(_time_per_call(
+            lambda: context_builder.build_messages("system prompt", history, "latest message",
+                                                   personas.DEFAULT_MODEL, "summary"), 2000) * 1e6, 2),
+    }
+
+    user_id = env.user_ids[0]
+    await db_utils.get_user_settings(user_id)
+    repeat = 20000
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await db_utils.get_user_settings(user_id)
+    results['settings_cache_hit_us'] = round((time.perf_counter() - started) / repeat * 1e6, 3)
+
+    async def noop():
+        return None
+
+    repeat = 5000
+    started = time.perf_counter()
+    await asyncio.gather(*(outbound.send(i % 100, noop) for i in range(repeat)))
+    results['outbound_dispatch_us'] = round((time.perf_counter() - started) / repeat * 1e6, 2)
+    return results
+
+
+SCENARIOS = {
+    'messages': scenario_messages,
+    'pings': scenario_pings,
+    'ingress': scenario_ingress,
+    'micro': scenario_micro,
+}
+
+
+async def main(args) -> dict:
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            'python': platform.python_version(),
+            'storage': args.storage,
+            'args': {key: value for key, value in vars(args).items() if key not in ("database_url", "output")},
+        },
+        'scenarios': {},
+    }
+    async with Environment(args) as env:
+        for name in selected:
+            results['scenarios'][name] = await SCENARIOS[name](env)
+        results['meta']['fake_telegram_calls'] = env.telegram.calls
+        results['meta']['fake_voice_monkey'] = {'calls': env.voice.calls, 'characters': env.voice.characters}
+        results['meta']['db'] = dict(env.storage.counter)
+    return results
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.WARNING)
+    output = json.dumps(asyncio.run(main(ARGS)), indent=2)
+    if ARGS.output:
+        with open(ARGS.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
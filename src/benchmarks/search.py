@@ -0,0 +1,153 @@
+# src/benchmarks/search.py
+"""
+/search latency over a large archive: seeds one user's history with synthetic messages
+(Zipf-distributed words over two years, so every month has its own partition), then times
+queries from very common to absent words, and a deep page.
+
+    python src/benchmarks/search.py --messages 1000000
+    python src/benchmarks/search.py --backends sqlite,postgres --database-url postgresql://localhost/throwaway
+
+Postgres only runs with --database-url; point it at a throwaway database, as the seeded
+archive is left in place. The memory backend scans every message per query and is off by default.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import string
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db_utils
+from database.backends import StorageBackend, create_backend
+from benchmarks.instrument import percentiles
+
+BASE_USER_ID = 9_100_000_000
+SEED_BATCH_SIZE = 10_000
+HISTORY_DAYS = 730
+RARE_WORD = "zanzibarx"  # Planted in about one message in ten thousand
+
+
+def _vocabulary(rng: random.Random, size: int) -> list:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))))
+    return sorted(words)
+
+
+def _messages(rng: random.Random, vocabulary: list, count: int, user_id: int, start: datetime):
+    """Yields batches of message rows, spread evenly over HISTORY_DAYS."""
+    cumulative = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+    step = timedelta(days=HISTORY_DAYS) / count
+    for first in range(0, count, SEED_BATCH_SIZE):
+        batch = []
+        for i in range(first, min(first + SEED_BATCH_SIZE, count)):
+            words = rng.choices(vocabulary, cum_weights=cumulative, k=rng.randint(6, 30))
+            if rng.random() < 0.0001:
+                words[rng.randrange(len(words))] = RARE_WORD
+            batch.append((user_id, "user" if i % 2 else "bot", " ".join(words), start + step * i))
+        yield batch
+
+
+async def _seed(backend: StorageBackend, args, user_id: int) -> dict:
+    rng = random.Random(args.seed)
+    vocabulary = _vocabulary(rng, args.vocabulary)
+    start = datetime.now(timezone.utc) - timedelta(days=HISTORY_DAYS)
+    insert = []
+    started = time.perf_counter()
+    for batch in _messages(rng, vocabulary, args.messages, user_id, start):
+        batch_started = time.perf_counter()
+        await backend.insert_messages(batch)
+        insert.append(time.perf_counter() - batch_started)
+        # Keep the recent-history table at its usual size; only the archive grows
+        await backend.trim_messages(keep=db_utils.MESSAGE_HISTORY_LIMIT, retain_unsummarized=False, hard_limit=0)
+    seconds = time.perf_counter() - started
+    return {
+        'vocabulary': vocabulary,
+        'seed': {
+            'messages': args.messages,
+            'seconds': round(seconds, 1),
+            'messages_per_sec': round(args.messages / seconds),
+            f'insert_batch_{SEED_BATCH_SIZE}_ms': percentiles(insert),
+        },
+    }
+
+
+async def run_backend(kind: str, args) -> dict:
+    database_path = os.path.join(tempfile.mkdtemp(prefix="bench-search-"), "bot.db")
+    backend = create_backend(kind, args.database_url, database_path)
+    user_id = BASE_USER_ID + int(time.time()) % 100_000
+    await backend.connect()
+    try:
+        await backend.initialize()
+        seeded = await _seed(backend, args, user_id)
+        vocabulary = seeded.pop('vocabulary')
+        # From a word in most messages (listed newest first past --max-ranked) to one in none
+        queries = {
+            'common_word': (vocabulary[0], 1),
+            'mid_word': (vocabulary[100], 1),
+            'tail_word': (vocabulary[-1], 1),
+            'rare_word': (RARE_WORD, 1),
+            'two_words': (f"{vocabulary[10]} {vocabulary[100]}", 1),
+            'no_match': ("qqqqqqqqqq", 1),
+            'mid_word_page_20': (vocabulary[100], 20),
+        }
+        results = {}
+        for name, (query, page) in queries.items():
+            samples = []
+            for _ in range(args.repeats):
+                started = time.perf_counter()
+                total, hits = await backend.search_archive(
+                    user_id, query, db_utils.SEARCH_PAGE_SIZE, (page - 1) * db_utils.SEARCH_PAGE_SIZE, args.max_ranked
+                )
+                samples.append(time.perf_counter() - started)
+            results[name] = {'matches': total, 'page': page, 'hits': len(hits), **percentiles(samples)}
+        return {**seeded, 'search_ms': results}
+    finally:
+        await backend.close()
+
+
+async def main(args) -> dict:
+    results = {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            'python': platform.python_version(),
+            'args': {key: value for key, value in vars(args).items() if key not in ("database_url", "output")},
+        },
+        'backends': {},
+    }
+    for kind in [kind.strip() for kind in args.backends.split(",") if kind.strip()]:
+        if kind == "postgres" and not args.database_url:
+            results['backends'][kind] = {'skipped': "needs --database-url"}
+            continue
+        results['backends'][kind] = await run_backend(kind, args)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="sqlite,postgres", help="Comma-separated subset of: memory, sqlite, postgres")
+    parser.add_argument("--database-url", help="Throwaway Postgres for the postgres backend")
+    parser.add_argument("--messages", type=int, default=1_000_000, help="Archived messages to seed")
+    parser.add_argument("--vocabulary", type=int, default=20_000, help="Distinct words in the synthetic messages")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed runs per query")
+    parser.add_argument("--max-ranked", type=int, default=db_utils.SEARCH_MAX_RANKED, help="Match count above which results are newest first")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    output = json.dumps(asyncio.run(main(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
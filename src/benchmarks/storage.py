@@ -0,0 +1,130 @@
+# src/benchmarks/storage.py
+"""
+Times the operations on the message hot path against each storage backend. What each
+backend must do is checked in tests/test_storage_backends.py.
+
+    python src/benchmarks/storage.py
+    python src/benchmarks/storage.py --backends memory,sqlite,postgres --database-url postgresql://localhost/throwaway
+
+Postgres only runs with --database-url; point it at a throwaway database.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.backends import StorageBackend, create_backend
+from benchmarks.instrument import percentiles
+
+# Far above real Telegram ids, so a shared database keeps its own rows
+BASE_USER_ID = 9_000_000_000
+
+
+def _rows(user_id: int, count: int, start: datetime):
+    return [(user_id, "user" if i % 2 else "bot", f"message {i}", start + timedelta(seconds=i)) for i in range(count)]
+
+
+async def _time(samples: list, coro):
+    started = time.perf_counter()
+    result = await coro
+    samples.append(time.perf_counter() - started)
+    return result
+
+
+async def measure_latency(backend: StorageBackend, iterations: int, users: int) -> dict:
+    """Per-call latency of the operations each message turn and retention sweep performs."""
+    user_ids = [BASE_USER_ID - 1000 - i for i in range(users)]
+    start = datetime.now(timezone.utc)
+    samples = {name: [] for name in (
+        'fetch_settings', 'upsert_setting', 'insert_message', 'insert_batch_100', 'last_messages_50', 'summary_state')}
+
+    for user_id in user_ids:
+        await backend.clear_memory(user_id)
+        await backend.insert_messages(_rows(user_id, 50, start - timedelta(days=1)))
+    for i in range(iterations):
+        user_id = user_ids[i % users]
+        await _time(samples['upsert_setting'], backend.upsert_setting(user_id, 'persona', 'accountability'))
+        await _time(samples['fetch_settings'], backend.fetch_settings(user_id))
+        await _time(samples['insert_message'], backend.insert_messages(_rows(user_id, 1, start + timedelta(seconds=i))))
+        await _time(samples['last_messages_50'], backend.last_messages(user_id, 50))
+        await _time(samples['summary_state'], backend.summary_state(user_id))
+        if i % 10 == 0:
+            await _time(samples['insert_batch_100'], backend.insert_messages(_rows(user_id, 100, start + timedelta(seconds=i))))
+
+    started = time.perf_counter()
+    removed = await backend.trim_messages(keep=50, retain_unsummarized=False, hard_limit=500)
+    trim_seconds = time.perf_counter() - started
+
+    # Concurrent turns: how calls from many chats at once queue up on the backend
+    concurrent = []
+    started = time.perf_counter()
+    await asyncio.gather(*(_time(concurrent, backend.last_messages(user_id, 50)) for user_id in user_ids * 10))
+    concurrent_seconds = time.perf_counter() - started
+
+    for user_id in user_ids:
+        await backend.clear_memory(user_id)
+    return {
+        'operations_ms': {name: percentiles(values) for name, values in samples.items()},
+        'trim_ms': round(trim_seconds * 1000, 3),
+        'trim_removed': removed,
+        'concurrent_last_messages': {
+            'calls': len(concurrent),
+            'calls_per_sec': round(len(concurrent) / concurrent_seconds, 1),
+            'latency_ms': percentiles(concurrent),
+        },
+    }
+
+
+async def run_backend(kind: str, args) -> dict:
+    database_path = os.path.join(tempfile.mkdtemp(prefix="bench-storage-"), "bot.db")
+    backend = create_backend(kind, args.database_url, database_path)
+    await backend.connect()
+    try:
+        await backend.initialize()
+        return await measure_latency(backend, args.iterations, args.users)
+    finally:
+        await backend.close()
+
+
+async def main(args) -> dict:
+    kinds = [kind.strip() for kind in args.backends.split(",") if kind.strip()]
+    results = {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            'python': platform.python_version(),
+            'args': {key: value for key, value in vars(args).items() if key not in ("database_url", "output")},
+        },
+        'backends': {},
+    }
+    for kind in kinds:
+        if kind == "postgres" and not args.database_url:
+            results['backends'][kind] = {'skipped': "needs --database-url"}
+            continue
+        results['backends'][kind] = await run_backend(kind, args)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="memory,sqlite,postgres", help="Comma-separated subset of: memory, sqlite, postgres")
+    parser.add_argument("--database-url", help="Throwaway Postgres for the postgres backend")
+    parser.add_argument("--iterations", type=int, default=1000, help="Timed turns per backend")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    output = json.dumps(asyncio.run(main(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
@@ -0,0 +1,148 @@
+# src/benchmarks/ticks.py
+"""
+Ping scheduling at scale: registers --users synthetic users with a spread of ping frequencies
+and timezones, then times what the scheduler does for them on the in-memory backend:
+
+- sync: scheduler.sync_and_reschedule_jobs from every settings row, cold and again warm.
+- reschedule: scheduler.reschedule_user after a user changes their frequency.
+- tick: scheduler.send_ping_tick for the largest tick, then for every tick at once (all
+  users pinged). Ping generation takes --llm-latency seconds and Telegram sends return at
+  once, so this is the fan-out itself.
+
+    python src/benchmarks/ticks.py --users 10000
+    python src/benchmarks/ticks.py --users 10000 --llm-latency 0.05
+
+Ticks never fire on their own here; the scheduler is paused once started.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db_utils
+from database.backends import create_backend
+from bot import access, outbound, scheduler
+from benchmarks.instrument import percentiles
+
+FIRST_USER_ID = 9_400_000_000
+FREQUENCIES = [1, 2, 3, 4, 6, 8, 12, 24]
+TIMEZONES = ["UTC", "Europe/London", "Europe/Berlin", "America/New_York", "America/Los_Angeles", "Asia/Tokyo"]
+
+
+class _FakeBot:
+    async def send_message(self, chat_id: int, text: str):
+        return None
+
+
+async def _populate(users: int, rng: random.Random):
+    for user_id in range(FIRST_USER_ID, FIRST_USER_ID + users):
+        await db_utils.BACKEND.save_user(user_id, access.MEMBER, None)
+        await db_utils.BACKEND.create_settings(user_id, db_utils.SETTING_DEFAULTS)
+        await db_utils.BACKEND.upsert_setting(user_id, 'ping_frequency_hours', rng.choice(FREQUENCIES))
+        await db_utils.BACKEND.upsert_setting(user_id, 'timezone', rng.choice(TIMEZONES))
+
+
+def _stub_delivery(llm_latency: float):
+    """Replaces ping generation, the Alexa announcement and Telegram with local stand-ins."""
+    async def generate_ping(persona, history, summary=None):
+        if llm_latency:
+            await asyncio.sleep(llm_latency)
+        return "Time to check in."
+
+    async def send(chat_id, call, priority=outbound.INTERACTIVE):
+        return await call()
+
+    scheduler.generate_ping = generate_ping
+    scheduler.send_to_alexa = lambda message_text: None
+    scheduler.outbound.send = send
+    scheduler.set_bot(_FakeBot())
+
+
+async def _timed(coroutine) -> float:
+    started = time.perf_counter()
+    await coroutine
+    return time.perf_counter() - started
+
+
+async def main(args) -> dict:
+    rng = random.Random(args.seed)
+    scheduler.TELEGRAM_TOKEN = scheduler.TELEGRAM_TOKEN or "benchmark"
+    db_utils.BACKEND = create_backend("memory")
+    await db_utils.BACKEND.connect()
+    await _populate(args.users, rng)
+    await access.load()
+    db_utils.start_background_tasks()
+    _stub_delivery(args.llm_latency)
+
+    await scheduler.start()
+    scheduler.scheduler.pause()
+
+    sync_cold = await _timed(scheduler.sync_and_reschedule_jobs())
+    sync_warm = await _timed(scheduler.sync_and_reschedule_jobs())
+
+    reschedule = []
+    for user_id in rng.sample(range(FIRST_USER_ID, FIRST_USER_ID + args.users), min(args.reschedules, args.users)):
+        await db_utils.update_user_setting(user_id, 'ping_frequency_hours', rng.choice(FREQUENCIES))
+        started = time.perf_counter()
+        await scheduler.reschedule_user(user_id)
+        reschedule.append(time.perf_counter() - started)
+
+    largest = max(scheduler._tick_members, key=lambda key: len(scheduler._tick_members[key]))
+    members = len(scheduler._tick_members[largest])
+    tick_seconds = await _timed(scheduler.send_ping_tick(largest))
+    all_ticks_seconds = await _timed(asyncio.gather(*(scheduler.send_ping_tick(key) for key in list(scheduler._tick_members))))
+    ticks = len(scheduler._tick_members)
+    job_count = len(scheduler.scheduler.get_jobs())
+
+    await scheduler.shutdown()
+    await db_utils.stop_background_tasks()
+    await db_utils.BACKEND.close()
+    return {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            'python': platform.python_version(),
+            'args': {key: value for key, value in vars(args).items() if key != "output"},
+            'ping_concurrency': scheduler.PING_CONCURRENCY,
+        },
+        'users': args.users,
+        'ticks': ticks,
+        'scheduled_jobs': job_count,  # The ticks plus ping pre-generation
+        'sync_seconds': {'cold': round(sync_cold, 3), 'warm': round(sync_warm, 3)},
+        'reschedule_user_ms': percentiles(reschedule),
+        'tick': {
+            'tick': largest,
+            'users': members,
+            'seconds': round(tick_seconds, 3),
+            'pings_per_sec': round(members / tick_seconds),
+        },
+        'all_ticks': {
+            'users': args.users,
+            'seconds': round(all_ticks_seconds, 3),
+            'pings_per_sec': round(args.users / all_ticks_seconds),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000, help="Registered users with settings")
+    parser.add_argument("--reschedules", type=int, default=1_000, help="Users whose frequency is changed and rescheduled")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds each ping takes to generate")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    output = json.dumps(asyncio.run(main(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
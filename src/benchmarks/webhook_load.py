@@ -0,0 +1,109 @@
+# src/benchmarks/webhook_load.py
+"""
+Posts synthetic Telegram updates at the webhook server as fast as a pool of keep-alive
+connections allows, and reports requests/sec, ack latency percentiles and the delay
+until each update reaches the application's update queue, as JSON.
+
+    python src/benchmarks/webhook_load.py --requests 20000 --connections 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram.ext import Application
+
+from bot import http_server, webhook
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def _update_body(update_id: int) -> bytes:
+    return json.dumps({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": 1000 + update_id % 50, "type": "private"},
+            "from": {"id": 1000 + update_id % 50, "is_bot": False, "first_name": "Load"},
+            "text": f"synthetic message {update_id}",
+        },
+    }).encode("utf-8")
+
+
+async def _client(port: int, update_ids, ack_latencies, sent_at, statuses):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for update_id in update_ids:
+            body = _update_body(update_id)
+            request = (
+                f"POST {webhook.WEBHOOK_PATH} HTTP/1.1\r\nHost: localhost\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                f"X-Telegram-Bot-Api-Secret-Token: {webhook.WEBHOOK_SECRET}\r\n\r\n"
+            ).encode("latin-1") + body
+            started = time.perf_counter()
+            sent_at[update_id] = started
+            writer.write(request)
+            status_line = await reader.readline()
+            length = 0
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            ack_latencies.append(time.perf_counter() - started)
+            status = int(status_line.split()[1])
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def _drain(queue: asyncio.Queue, sent_at, handoff_latencies, expected: int):
+    for _ in range(expected):
+        update = await queue.get()
+        handoff_latencies.append(time.perf_counter() - sent_at[update.update_id])
+
+
+async def run(requests: int, connections: int, port: int) -> dict:
+    application = Application.builder().token("123456:BENCHMARK").updater(None).build()
+    webhook.register(application)
+    await http_server.start(port, host="127.0.0.1")
+
+    ack_latencies, handoff_latencies, sent_at, statuses = [], [], {}, {}
+    drainer = asyncio.create_task(_drain(application.update_queue, sent_at, handoff_latencies, requests))
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _client(port, range(i, requests, connections), ack_latencies, sent_at, statuses)
+        for i in range(connections)
+    ))
+    elapsed = time.perf_counter() - started
+    await asyncio.wait_for(drainer, 10)
+    await http_server.stop()
+
+    return {
+        "mode": "webhook",
+        "requests": requests,
+        "connections": connections,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(requests / elapsed, 1),
+        "status_counts": statuses,
+        "ack_ms": {f"p{int(q * 100)}": round(_percentile(ack_latencies, q) * 1000, 3) for q in (0.5, 0.95, 0.99)},
+        "to_update_queue_ms": {
+            f"p{int(q * 100)}": round(_percentile(handoff_latencies, q) * 1000, 3) for q in (0.5, 0.95, 0.99)
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.requests, args.connections, args.port)), indent=2))
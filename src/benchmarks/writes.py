@@ -0,0 +1,174 @@
+# src/benchmarks/writes.py
+"""
+Message inserts/sec before and after write-behind persistence. Concurrent chats each add
+--messages messages as fast as they can:
+
+- per_message: the original add_message, one transaction per message that inserts the row
+  and deletes the user's rows beyond the newest 50 with a window function.
+- write_behind: db_utils.add_message, queued and written in batches by the background
+  writer, with retention left to one set-based sweep (timed separately).
+
+    python src/benchmarks/writes.py --backends sqlite
+    python src/benchmarks/writes.py --backends postgres --database-url postgresql://localhost/throwaway
+
+write_behind also appends every row to the search-indexed archive, which per_message never
+did, so the comparison favours the old path. Postgres only runs with --database-url; point
+it at a throwaway database.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db_utils
+from database.backends import StorageBackend, create_backend
+from benchmarks.instrument import percentiles
+
+BASE_USER_ID = 9_200_000_000
+
+# The original add_message, statement for statement
+_PG_INSERT = "INSERT INTO messages (user_id, role, content) VALUES ($1, $2, $3)"
+_PG_TRIM = """
+    DELETE FROM messages WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY timestamp DESC) as rn
+            FROM messages WHERE user_id = $1
+        ) t WHERE t.rn > 50
+    );
+"""
+_SQLITE_INSERT = "INSERT INTO messages (user_id, role, content, timestamp) VALUES (?, ?, ?, ?)"
+_SQLITE_TRIM = """
+    DELETE FROM messages WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY timestamp DESC) as rn
+            FROM messages WHERE user_id = ?
+        ) t WHERE t.rn > 50
+    );
+"""
+
+
+def _per_message_insert(backend: StorageBackend):
+    """Returns the original one-transaction-per-message add_message for this backend."""
+    if backend.name == "postgres":
+        async def add_message(user_id: int, role: str, content: str):
+            async with backend.pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute(_PG_INSERT, user_id, role, content)
+                    await conn.execute(_PG_TRIM, user_id)
+        return add_message
+
+    def insert(conn, user_id: int, role: str, content: str):
+        with conn:
+            conn.execute(_SQLITE_INSERT, (user_id, role, content, datetime.now(timezone.utc).isoformat()))
+            conn.execute(_SQLITE_TRIM, (user_id,))
+
+    async def add_message(user_id: int, role: str, content: str):
+        await backend._run(insert, user_id, role, content)
+    return add_message
+
+
+async def _drive(add_message, user_ids, messages: int) -> dict:
+    """Has every chat add `messages` messages concurrently; returns throughput and per-call latency."""
+    latencies = []
+
+    async def chat(user_id: int):
+        for i in range(messages):
+            started = time.perf_counter()
+            await add_message(user_id, "user" if i % 2 else "bot", f"benchmark message {i} from chat {user_id}")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(chat(user_id) for user_id in user_ids))
+    return {'started': started, 'latencies': latencies}
+
+
+async def _clear(backend: StorageBackend, user_ids):
+    for user_id in user_ids:
+        await backend.clear_memory(user_id)
+
+
+async def run_backend(kind: str, args) -> dict:
+    database_path = os.path.join(tempfile.mkdtemp(prefix="bench-writes-"), "bot.db")
+    backend = create_backend(kind, args.database_url, database_path)
+    user_ids = [BASE_USER_ID + i for i in range(args.chats)]
+    total = args.chats * args.messages
+    await backend.connect()
+    db_utils.BACKEND = backend
+    try:
+        await backend.initialize()
+        results = {}
+
+        await _clear(backend, user_ids)
+        run = await _drive(_per_message_insert(backend), user_ids, args.messages)
+        seconds = time.perf_counter() - run['started']
+        results['per_message'] = {
+            'inserts_per_sec': round(total / seconds),
+            'add_message_ms': percentiles(run['latencies']),
+        }
+
+        await _clear(backend, user_ids)
+        db_utils.start_background_tasks()
+        try:
+            run = await _drive(db_utils.add_message, user_ids, args.messages)
+            # Throughput counts until every row is written, not just queued
+            await db_utils.flush_messages()
+            seconds = time.perf_counter() - run['started']
+        finally:
+            await db_utils.stop_background_tasks()
+        started = time.perf_counter()
+        removed = await db_utils.trim_messages()
+        results['write_behind'] = {
+            'inserts_per_sec': round(total / seconds),
+            'add_message_ms': percentiles(run['latencies']),
+            'sweep_ms': round((time.perf_counter() - started) * 1000, 3),
+            'sweep_removed': removed,
+        }
+        results['speedup'] = round(results['write_behind']['inserts_per_sec'] / results['per_message']['inserts_per_sec'], 1)
+
+        await _clear(backend, user_ids)
+        return results
+    finally:
+        await backend.close()
+
+
+async def main(args) -> dict:
+    results = {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            'python': platform.python_version(),
+            'args': {key: value for key, value in vars(args).items() if key not in ("database_url", "output")},
+        },
+        'backends': {},
+    }
+    for kind in [kind.strip() for kind in args.backends.split(",") if kind.strip()]:
+        if kind == "postgres" and not args.database_url:
+            results['backends'][kind] = {'skipped': "needs --database-url"}
+            continue
+        results['backends'][kind] = await run_backend(kind, args)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="sqlite,postgres", help="Comma-separated subset of: sqlite, postgres")
+    parser.add_argument("--database-url", help="Throwaway Postgres for the postgres backend")
+    parser.add_argument("--chats", type=int, default=50, help="Chats adding messages concurrently")
+    parser.add_argument("--messages", type=int, default=200, help="Messages per chat")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    output = json.dumps(asyncio.run(main(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
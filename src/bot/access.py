@@ -0,0 +1,88 @@
+# src/bot/access.py
+import logging
+from typing import Dict, Optional, Set
+
+from database import db_utils
+
+logger = logging.getLogger(__name__)
+
+# --- Access Control ---
+# Who may use the bot lives in the users table. Updates are authorized against an in-memory
+# copy, so a check is one dict lookup with no database round trip. The copy is loaded at
+# startup and replaced wholesale after every invite or revoke; a check never sees a change
+# half applied.
+ADMIN, MEMBER = 'admin', 'member'
+ROLES = (ADMIN, MEMBER)
+
+_roles: Dict[int, str] = {}
+# Registered users known to have a settings row and a place on the schedule; anyone else
+# is provisioned (and scheduled) on first contact
+_provisioned: Set[int] = set()
+
+
+async def load():
+    """Reads the registry and which users already have settings. Call once the database is initialized."""
+    await refresh()
+    # Settings outlive revoked access, and sync only schedules registered users. Someone
+    # invited back later must still count as a first contact, so they get scheduled then.
+    _provisioned.update(
+        settings['user_id'] for settings in await db_utils.get_all_user_settings() if settings['user_id'] in _roles
+    )
+    admins = sum(role == ADMIN for role in _roles.values())
+    logger.info(f"Loaded {len(_roles)} registered user(s), {admins} admin(s).")
+
+
+async def refresh():
+    """Replaces the in-memory allowlist with the registry's current contents."""
+    global _roles
+    _roles = await db_utils.get_users()
+
+
+def is_allowed(user_id: int) -> bool:
+    return user_id in _roles
+
+
+def is_admin(user_id: int) -> bool:
+    return _roles.get(user_id) == ADMIN
+
+
+def role_of(user_id: int) -> Optional[str]:
+    return _roles.get(user_id)
+
+
+def registered_users() -> Dict[int, str]:
+    return dict(_roles)
+
+
+async def invite(user_id: int, role: str, invited_by: int):
+    """Registers a user (or changes their role) and refreshes the allowlist."""
+    if role not in ROLES:
+        raise ValueError(f"Unknown role: {role}")
+    await db_utils.save_user(user_id, role, invited_by)
+    await refresh()
+    logger.info(f"User {invited_by} registered user {user_id} as {role}.")
+
+
+async def revoke(user_id: int) -> bool:
+    """Unregisters a user and refreshes the allowlist. Returns whether they were registered."""
+    removed = await db_utils.delete_user(user_id)
+    await refresh()
+    # Their settings row is kept, but they are scheduled again on contact if re-invited
+    _provisioned.discard(user_id)
+    if removed:
+        logger.info(f"Revoked access for user {user_id}.")
+    return removed
+
+
+async def provision(user_id: int) -> bool:
+    """
+    Creates a user's default settings on their first contact, keeping any they already have.
+    Returns True on first contact, in which case the caller should schedule them; after that
+    this is a set lookup.
+    """
+    if user_id in _provisioned:
+        return False
+    if await db_utils.create_user_settings(user_id):
+        logger.info(f"Created default settings for user {user_id} on first contact.")
+    _provisioned.add(user_id)
+    return True
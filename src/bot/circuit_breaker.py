@@ -0,0 +1,95 @@
+# src/bot/circuit_breaker.py
+import logging
+import os
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+# --- Breaker Settings ---
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 3))  # Consecutive failures to open
+BREAKER_COOL_DOWN = float(os.getenv("BREAKER_COOL_DOWN", 60))  # Seconds open before a trial request
+BREAKER_HALF_OPEN_MAX_CALLS = int(os.getenv("BREAKER_HALF_OPEN_MAX_CALLS", 1))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker for one upstream. After `failure_threshold` consecutive
+    failures it opens and rejects calls instantly; once `cool_down` has passed it lets up to
+    `half_open_max_calls` trial calls through, closing on success and re-opening on failure.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 cool_down: float = BREAKER_COOL_DOWN, half_open_max_calls: int = BREAKER_HALF_OPEN_MAX_CALLS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cool_down = cool_down
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_calls = 0
+        self.counters = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        log = logger.warning if state == OPEN else logger.info
+        log(f"Circuit breaker '{self.name}': {self.state} -> {state}")
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            self.counters['opened'] += 1
+        self.trial_calls = 0
+
+    def allow(self) -> bool:
+        """Returns True if a call may proceed. Every allowed call must end in record_success, record_failure or release."""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.cool_down:
+            self._transition(HALF_OPEN)
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and self.trial_calls < self.half_open_max_calls:
+            self.trial_calls += 1
+            return True
+        self.counters['rejected'] += 1
+        return False
+
+    def record_success(self):
+        self.counters['successes'] += 1
+        self.consecutive_failures = 0
+        self._transition(CLOSED)
+
+    def record_failure(self):
+        self.counters['failures'] += 1
+        self.consecutive_failures += 1
+        # A failed trial call re-opens immediately; calls finishing after it opened don't extend the cool-down
+        if self.state != OPEN and (self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold):
+            self._transition(OPEN)
+
+    def release(self):
+        """Gives back a trial slot for a call that was cancelled without an outcome."""
+        if self.state == HALF_OPEN and self.trial_calls > 0:
+            self.trial_calls -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {'state': self.state, 'consecutive_failures': self.consecutive_failures, **self.counters}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Returns the breaker for `name` (e.g. a model id), creating it on first use."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    """Returns state and counters for every breaker."""
+    return {name: breaker.stats() for name, breaker in _breakers.items()}
@@ -0,0 +1,104 @@
+# src/bot/context_builder.py
+import logging
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# --- Token Budgets ---
+# Context window sizes (tokens) for the models we call. Unknown models use DEFAULT_CONTEXT_TOKENS.
+MODEL_CONTEXT_TOKENS: Dict[str, int] = {
+    "x-ai/grok-4-fast:free": 2_000_000,
+    "deepseek/deepseek-chat-v3.1:free": 163_840,
+}
+DEFAULT_CONTEXT_TOKENS = 32_768
+# Tokens requested for the completion, and kept free in the window for the reply. Models with
+# a window under four times this get a quarter of their window instead.
+MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", 32000))
+# Hard cap on prompt size regardless of the model's window, to bound latency and cost.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 8000))
+
+# Chat formats add a few tokens of framing per message.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_HEADER = "Summary of our earlier conversation (older messages are not shown):"
+RECALLED_HEADER = "Earlier messages that may be relevant to the current one:"
+
+_unknown_models: Set[str] = set()  # Already warned about
+
+
+@lru_cache(maxsize=16384)
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local token estimate: ~4 characters per token for ASCII text and
+    roughly one token per non-ASCII character (CJK, emoji), which tokenizers
+    rarely merge. Cached per distinct message text.
+    """
+    non_ascii = len(text) - len(text.encode("ascii", "ignore"))
+    return (len(text) - non_ascii + 3) // 4 + non_ascii + MESSAGE_OVERHEAD_TOKENS
+
+
+def _context_window(model: str) -> int:
+    window = MODEL_CONTEXT_TOKENS.get(model)
+    if window is None:
+        if model not in _unknown_models:
+            _unknown_models.add(model)
+            logger.warning(f"No context window known for model {model}; assuming {DEFAULT_CONTEXT_TOKENS} tokens.")
+        window = DEFAULT_CONTEXT_TOKENS
+    return window
+
+
+def output_budget(model: str) -> int:
+    """Tokens requested for the reply: MAX_OUTPUT_TOKENS, or a quarter of a smaller model's window."""
+    return min(MAX_OUTPUT_TOKENS, _context_window(model) // 4)
+
+
+def prompt_budget(model: str) -> int:
+    """Tokens available for the prompt once room for the reply is reserved."""
+    return max(0, min(PROMPT_TOKEN_BUDGET, _context_window(model) - output_budget(model)))
+
+
+def build_messages(
+    system_prompt: str,
+    history: List[Tuple[str, str]],
+    final_user_content: str,
+    model: str,
+    summary: Optional[str] = None,
+    recalled: Optional[List[Tuple[str, str]]] = None,
+) -> List[Dict[str, str]]:
+    """
+    Builds the chat-completions message list: system prompt, the running summary of
+    older conversation (if any), recalled relevant past messages (if any), as much of
+    the most recent history as fits the model's prompt budget, then the final user
+    turn. Everything except the packed history is always included.
+    """
+    remaining = prompt_budget(model) - estimate_tokens(system_prompt) - estimate_tokens(final_user_content)
+    summary_content = f"{SUMMARY_HEADER}\n{summary}" if summary else None
+    if summary_content:
+        remaining -= estimate_tokens(summary_content)
+    recalled_content = None
+    if recalled:
+        recalled_content = RECALLED_HEADER + "".join(
+            f"\n- {'Assistant' if role == 'bot' else 'User'}: {content}" for role, content in recalled
+        )
+        remaining -= estimate_tokens(recalled_content)
+
+    # Walk backwards from the newest turn and stop at the first one that doesn't fit
+    start = len(history)
+    for role, content in reversed(history):
+        remaining -= estimate_tokens(content)
+        if remaining < 0:
+            break
+        start -= 1
+
+    messages = [{"role": "system", "content": system_prompt}]
+    if summary_content:
+        messages.append({"role": "system", "content": summary_content})
+    if recalled_content:
+        messages.append({"role": "system", "content": recalled_content})
+    for role, content in history[start:]:
+        # Convert role 'user'/'bot' to expected 'user'/'assistant' format
+        messages.append({"role": "assistant" if role == "bot" else "user", "content": content})
+    messages.append({"role": "user", "content": final_user_content})
+    return messages
@@ -0,0 +1,90 @@
+# src/bot/dispatcher.py
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from bot import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- Dispatcher Settings ---
+# Work for one chat runs strictly in submission order; different chats run in parallel.
+# A chat's worker exits after this many idle seconds and is recreated on its next job.
+DISPATCH_IDLE_TIMEOUT = float(os.getenv("DISPATCH_IDLE_TIMEOUT", 60))
+
+
+class _ChatWorker:
+    __slots__ = ("queue", "task")
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task = None
+
+
+_workers: Dict[Hashable, _ChatWorker] = {}
+_counters = {'jobs': 0, 'workers_started': 0, 'workers_reclaimed': 0}
+
+
+async def _run_worker(key: Hashable, worker: _ChatWorker):
+    try:
+        while True:
+            try:
+                job, future, context, submitted_at = await asyncio.wait_for(worker.queue.get(), DISPATCH_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                # Nothing can be queued between this check and the worker's removal
+                if worker.queue.empty():
+                    _counters['workers_reclaimed'] += 1
+                    return
+                continue
+            if future.cancelled():
+                continue
+            metrics.observe(metrics.QUEUE_WAIT_SECONDS, time.monotonic() - submitted_at, queue="dispatcher")
+            # Each job is its own task, so cancelling one job leaves the worker running. It runs
+            # in the submitter's context, so context variables (e.g. traces) carry over.
+            task = context.run(asyncio.ensure_future, job())
+            task.set_name(f"chat-{key}")  # Identifies the chat in watchdog stall reports
+            await asyncio.wait([task])
+            if future.cancelled():
+                continue
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+    finally:
+        if _workers.get(key) is worker:
+            del _workers[key]
+
+
+def submit(key: Hashable, job: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+    """
+    Queues job() to run after all previously submitted jobs for `key`.
+    Returns a future with its result; the future is cancelled if the job was.
+    """
+    worker = _workers.get(key)
+    if worker is None:
+        worker = _workers[key] = _ChatWorker()
+        worker.task = asyncio.create_task(_run_worker(key, worker))
+        _counters['workers_started'] += 1
+    future = asyncio.get_running_loop().create_future()
+    worker.queue.put_nowait((job, future, contextvars.copy_context(), time.monotonic()))
+    _counters['jobs'] += 1
+    return future
+
+
+async def run(key: Hashable, job: Callable[[], Awaitable[Any]]) -> Any:
+    """Submits job() for `key` and waits for its result."""
+    return await submit(key, job)
+
+
+def stats() -> Dict[str, int]:
+    """Returns live worker and queued job counts plus lifetime counters."""
+    return {
+        'active_workers': len(_workers),
+        'queued_jobs': sum(worker.queue.qsize() for worker in _workers.values()),
+        **_counters,
+    }
@@ -0,0 +1,131 @@
+# src/bot/export.py
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import zlib
+from typing import List, Optional, Sequence
+
+from telegram import Bot, InputFile
+
+from database import db_utils
+from database.backends import ArchiveRow
+from bot import outbound
+
+logger = logging.getLogger(__name__)
+
+# --- History Export ---
+# Archive rows stream from a database cursor through an incremental encoder (and gzip)
+# into temporary files, which are uploaded straight from disk, so memory use stays flat
+# however long the history is.
+EXPORT_FORMATS = ('csv', 'ndjson')
+# Bots may upload documents of up to 50 MB; longer exports are split into parts
+EXPORT_PART_BYTES = int(os.getenv("EXPORT_PART_BYTES", 45 * 1024 * 1024))
+EXPORT_UPLOAD_TIMEOUT = float(os.getenv("EXPORT_UPLOAD_TIMEOUT", 300))  # Seconds per part
+EXPORT_DIR = os.getenv("EXPORT_DIR")  # Where parts are staged; the system temp dir if unset
+
+
+class _Encoder:
+    """Encodes batches of archive rows as CSV (with a header at the top of each part) or NDJSON."""
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self._buffer = io.StringIO()
+        self._csv = csv.writer(self._buffer)
+
+    def header(self) -> bytes:
+        if self.fmt == 'csv':
+            self._csv.writerow(['timestamp', 'role', 'content'])
+        return self._take()
+
+    def encode(self, rows: Sequence[ArchiveRow]) -> bytes:
+        if self.fmt == 'csv':
+            self._csv.writerows((timestamp.isoformat(), role, content) for timestamp, role, content in rows)
+        else:
+            for timestamp, role, content in rows:
+                json.dump({'timestamp': timestamp.isoformat(), 'role': role, 'content': content}, self._buffer, ensure_ascii=False)
+                self._buffer.write("\n")
+        return self._take()
+
+    def _take(self) -> bytes:
+        data = self._buffer.getvalue().encode('utf-8')
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+class _PartFile:
+    """One staged output file, gzip-compressed incrementally when requested."""
+
+    def __init__(self, path: str, compress: bool):
+        self.file = open(path, 'wb')
+        self.size = 0  # Bytes on disk so far
+        # wbits=31 writes a gzip header and trailer around the deflate stream
+        self._gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def write(self, data: bytes):
+        if self._gzip is not None:
+            data = self._gzip.compress(data)
+        self.file.write(data)
+        self.size += len(data)
+
+    def close(self):
+        if self._gzip is not None:
+            self.file.write(self._gzip.flush())
+        self.file.close()
+
+
+def export_filename(fmt: str, compress: bool, part: Optional[int] = None) -> str:
+    name = "conversation_history" + (f".part{part}" if part else "") + f".{fmt}"
+    return name + ".gz" if compress else name
+
+
+async def write_export(user_id: int, fmt: str, compress: bool, directory: str) -> List[str]:
+    """
+    Streams the user's archive into part files in `directory`, starting a new part once one
+    reaches EXPORT_PART_BYTES. Returns the part paths in order (none if there is no history).
+    """
+    encoder = _Encoder(fmt)
+    paths: List[str] = []
+    part: Optional[_PartFile] = None
+    try:
+        async for batch in db_utils.iter_message_archive(user_id):
+            if part is None or part.size >= EXPORT_PART_BYTES:
+                if part is not None:
+                    await asyncio.to_thread(part.close)
+                paths.append(os.path.join(directory, f"part{len(paths) + 1}"))
+                part = await asyncio.to_thread(_PartFile, paths[-1], compress)
+                await asyncio.to_thread(part.write, encoder.header())
+            # Encoding, compression and disk writes all run off the event loop
+            await asyncio.to_thread(lambda: part.write(encoder.encode(batch)))
+    finally:
+        if part is not None:
+            await asyncio.to_thread(part.close)
+    return paths
+
+
+async def send_file(bot: Bot, chat_id: int, path: str, filename: str, caption: str):
+    """Uploads a file from disk. The open handle is passed through to the HTTP client, which streams it."""
+    with open(path, 'rb') as f:
+        await bot.send_document(
+            chat_id, InputFile(f, filename=filename, read_file_handle=False),
+            caption=caption, write_timeout=EXPORT_UPLOAD_TIMEOUT,
+        )
+
+
+async def export_history(bot: Bot, chat_id: int, user_id: int, fmt: str = 'csv', compress: bool = False) -> int:
+    """Exports the user's full history to the chat as one or more documents. Returns the number of parts sent."""
+    with tempfile.TemporaryDirectory(prefix="export-", dir=EXPORT_DIR) as directory:
+        paths = await write_export(user_id, fmt, compress, directory)
+        for index, path in enumerate(paths, start=1):
+            numbered = len(paths) > 1
+            filename = export_filename(fmt, compress, index if numbered else None)
+            caption = "Here is your conversation history." + (f" (part {index} of {len(paths)})" if numbered else "")
+            await outbound.send(
+                chat_id, lambda path=path, filename=filename, caption=caption: send_file(bot, chat_id, path, filename, caption)
+            )
+    logger.info(f"Exported history of user {user_id} as {len(paths)} {fmt} part(s).")
+    return len(paths)
@@ -1,87 +1,213 @@
 # src/bot/handlers.py
+import asyncio
 import logging
 import os
 import re
 from functools import wraps
+from typing import AsyncIterator, Callable, Dict, List, Optional
 
+import pytz
 from telegram import Update, InputFile
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import ContextTypes
 
 from database import db_utils
-from bot import memory, personas, scheduler
+from bot import access, dispatcher, export, memory, metrics, model_router, outbound, personas, retrieval, scheduler, watchdog
+from bot.circuit_breaker import breaker_stats
 import requests                
 import urllib.parse
 from bot.utils import send_to_alexa 
 
 # --- Constants ---
-OWNER_ID = int(os.getenv("OWNER_TELEGRAM_ID", 0))
 VALID_PERSONAS = list(personas.PERSONAS.keys())
 VALID_FREQUENCIES = [0.03, 1, 2, 3, 4, 6, 8, 12, 24]
 
+# --- Streaming Replies ---
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "true").lower() == "true"
+# Minimum seconds between edits of the same message; Telegram throttles faster edit loops.
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", 1.5))
+STREAM_PLACEHOLDER = "…"
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+
+# --- Help ---
+# Only admins see these in /start
+ADMIN_HELP = (
+    "\n\nAdmin commands:\n"
+    "/invite <user_id> [admin|member] - Let someone use the bot\n"
+    "/revoke <user_id> - Take their access away\n"
+    "/users - List everyone who can use the bot\n"
+    "/stats - Show latency and queue statistics\n"
+    "/profile [start|stop] - Sample the event loop into a flamegraph file"
+)
+
+# --- Search ---
+SEARCH_PAGE_ARGUMENT = re.compile(r"#(\d+)")  # A trailing "#2" selects the page
+
+# --- Message Debounce ---
+# Messages sent within this many seconds of each other are answered as one turn, and
+# newer input cancels a reply that is still being generated. 0 answers each message as it arrives.
+DEBOUNCE_WINDOW = float(os.getenv("DEBOUNCE_WINDOW", 1.0))
+
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
 )
 logger = logging.getLogger(__name__)
 
-# --- Decorator for Owner-Only Commands ---
-def owner_only(func):
+# --- Access Decorators ---
+def _restricted(func, authorized: Callable[[int], bool]):
+    # Every handler is traced when metrics are enabled
+    func = metrics.traced(func.__name__)(func)
+
     @wraps(func)
     async def wrapped(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         user_id = update.effective_user.id
-        if user_id != OWNER_ID:
+        # In-memory allowlist: no database round trip per update
+        if not authorized(user_id):
             logger.warning(f"Unauthorized access denied for {user_id}.")
-            await update.message.reply_text("This bot is for private use only.")
+            await _reply(update, "This bot is for private use only.")
             return
+        if await access.provision(user_id):
+            # First contact: the user now has default settings, so start their pings
+            await scheduler.reschedule_user(user_id)
         return await func(update, context, *args, **kwargs)
     return wrapped
 
+def users_only(func):
+    """Lets any registered user through."""
+    return _restricted(func, access.is_allowed)
+
+def admin_only(func):
+    """Lets only admins through."""
+    return _restricted(func, access.is_admin)
+
+def per_chat(func):
+    """Runs the handler through the chat's ordered dispatcher queue, after any earlier work for that chat."""
+    @wraps(func)
+    async def wrapped(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+        return await dispatcher.run(update.effective_chat.id, lambda: func(update, context, *args, **kwargs))
+    return wrapped
+
+async def _reply(update: Update, text: str, **kwargs):
+    """Replies to the update's message through the rate-limited outbound dispatcher."""
+    return await outbound.send(update.effective_chat.id, lambda: update.message.reply_text(text, **kwargs))
+
+async def _stream_reply(update: Update, chunks: AsyncIterator[str]) -> str:
+    """
+    Posts a placeholder reply and progressively edits it as chunks arrive,
+    at most once every STREAM_EDIT_INTERVAL seconds. Text beyond Telegram's
+    message length limit continues in a new message. Returns the full text.
+    """
+    loop = asyncio.get_running_loop()
+    message = await _reply(update, STREAM_PLACEHOLDER)
+    full_text = ""
+    offset = 0  # Start of the text shown in the current message
+    shown = STREAM_PLACEHOLDER
+    next_edit_at = loop.time() + STREAM_EDIT_INTERVAL
+
+    async def flush(final: bool):
+        nonlocal message, offset, shown, next_edit_at
+        while True:
+            # Roll over into a fresh message once the current one is full
+            if len(full_text) - offset > TELEGRAM_MAX_MESSAGE_LENGTH:
+                target = full_text[offset:offset + TELEGRAM_MAX_MESSAGE_LENGTH]
+            else:
+                target = full_text[offset:]
+            if target.strip() and target != shown:
+                try:
+                    await outbound.send(update.effective_chat.id, lambda: message.edit_text(target))
+                    shown = target
+                except RetryAfter as e:
+                    delay = outbound.retry_after_seconds(e)
+                    if not final:
+                        next_edit_at = loop.time() + delay
+                        return
+                    await asyncio.sleep(delay)
+                    continue
+                except BadRequest as e:
+                    # "Message is not modified" is harmless; anything else is worth a log line
+                    if "not modified" not in str(e).lower():
+                        logger.warning(f"Failed to edit streamed reply: {e}")
+                    shown = target
+            if len(full_text) - offset <= TELEGRAM_MAX_MESSAGE_LENGTH:
+                break
+            offset += TELEGRAM_MAX_MESSAGE_LENGTH
+            message = await _reply(update, STREAM_PLACEHOLDER)
+            shown = STREAM_PLACEHOLDER
+        next_edit_at = loop.time() + STREAM_EDIT_INTERVAL
+
+    try:
+        async for chunk in chunks:
+            full_text += chunk
+            if loop.time() >= next_edit_at:
+                await flush(final=False)
+    except asyncio.CancelledError:
+        # Superseded by newer input: don't leave an empty placeholder behind
+        if offset == 0 and shown == STREAM_PLACEHOLDER:
+            try:
+                await outbound.send(update.effective_chat.id, message.delete)
+            except Exception as e:
+                logger.warning(f"Failed to remove placeholder of cancelled reply: {e}")
+        raise
+    finally:
+        # Closing the stream cancels the upstream request right away
+        await chunks.aclose()
+
+    await flush(final=True)
+    return full_text
+
 # --- Command Handlers ---
-@owner_only
+@users_only
+@per_chat
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles the /start command."""
     user_id = update.effective_user.id
     current_persona = await db_utils.get_user_setting(user_id, 'persona')
     persona_name = personas.PERSONAS.get(current_persona, {}).get('name', 'Default')
 
-    await update.message.reply_text(
+    await _reply(update,
         f"Hello! I am your personal assistant.\n"
         f"Current Persona: **{persona_name}**\n\n"
         "Available commands:\n"
         "/personas - List available personas\n"
         "/set_persona <name> - Switch my personality\n"
         "/set_schedule <hours> - Configure ping frequency (e.g., 1, 2, 4, etc.)\n"
-        "/memory_clear - Clear our conversation history\n"
-        "/export_memory - Export our conversation as a CSV file"
+        "/memory_clear - Clear our conversation history, archive included\n"
+        "/export_memory [csv|ndjson] [gz] - Export our full conversation history\n"
+        "/search <words> [#page] - Find past messages containing all the words"
+        + (ADMIN_HELP if access.is_admin(user_id) else "")
     )
 
-@owner_only
+@users_only
+@per_chat
 async def set_persona_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles the /set_persona command."""
     user_id = update.effective_user.id
     try:
         new_persona = context.args[0].lower()
         if new_persona not in VALID_PERSONAS:
-            await update.message.reply_text(f"Invalid persona. Please choose from: {', '.join(VALID_PERSONAS)}")
+            await _reply(update, f"Invalid persona. Please choose from: {', '.join(VALID_PERSONAS)}")
             return
         
         await db_utils.update_user_setting(user_id, 'persona', new_persona)
         persona_name = personas.PERSONAS[new_persona]['name']
-        await update.message.reply_text(f"Persona switched to: **{persona_name}**")
+        await _reply(update, f"Persona switched to: **{persona_name}**")
         logger.info(f"User {user_id} switched persona to {new_persona}")
 
     except (IndexError, ValueError):
-        await update.message.reply_text("Usage: /set_persona <name>\n"
-                                        f"Example: /set_persona motivational")
+        await _reply(update, "Usage: /set_persona <name>\n"
+                             f"Example: /set_persona motivational")
 
-@owner_only
+@users_only
+@per_chat
 async def list_personas_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles the /personas command."""
     message = "Available Personas:\n"
     for key, data in personas.PERSONAS.items():
         message += f"- **{key}**: {data['name']}\n"
-    await update.message.reply_text(message)
+    await _reply(update, message)
 
-@owner_only
+@users_only
+@per_chat
 async def set_schedule_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles the /set_schedule command for ping frequency."""
     user_id = update.effective_user.id
@@ -89,7 +215,7 @@ async def set_schedule_command(update: Update, context: ContextTypes.DEFAULT_TYP
     if not context.args:
         current_frequency = await db_utils.get_user_setting(user_id, 'ping_frequency_hours')
         freq_options = ", ".join(map(str, VALID_FREQUENCIES))
-        await update.message.reply_text(
+        await _reply(update,
             f"Pings are currently set to every {current_frequency} hour(s).\n\n"
             "To change this, use `/set_schedule <hours>`.\n"
             f"Valid options for hours are: {freq_options}.\n"
@@ -104,77 +230,306 @@ async def set_schedule_command(update: Update, context: ContextTypes.DEFAULT_TYP
         new_frequency = float(cleaned_arg)
 
         if new_frequency not in VALID_FREQUENCIES:
-            await update.message.reply_text(f"Invalid frequency. Please choose from: {', '.join(map(str, VALID_FREQUENCIES))}")
+            await _reply(update, f"Invalid frequency. Please choose from: {', '.join(map(str, VALID_FREQUENCIES))}")
             return
             
         await db_utils.update_user_setting(user_id, 'ping_frequency_hours', new_frequency)
-        await scheduler.sync_and_reschedule_jobs()  # Immediately apply the new schedule
+        await scheduler.reschedule_user(user_id)  # Immediately apply the new schedule
         
         if new_frequency == 0.03:
-             await update.message.reply_text(
+             await _reply(update,
                 f"Success! I will now ping you every 2 minutes for testing."
             )
         else:
-            await update.message.reply_text(
+            await _reply(update,
                 f"Success! I will now ping you every {int(new_frequency)} hour(s) between 6 AM and midnight."
             )
         logger.info(f"User {user_id} updated ping frequency to every {new_frequency} hours.")
 
     except (IndexError, ValueError):
-        await update.message.reply_text("Invalid format. Please provide a number for the frequency.")
+        await _reply(update, "Invalid format. Please provide a number for the frequency.")
     except Exception as e:
         logger.error(f"Error setting schedule: {e}", exc_info=True)
-        await update.message.reply_text("An error occurred while trying to set the schedule.")
+        await _reply(update, "An error occurred while trying to set the schedule.")
 
-@owner_only
+@users_only
+@per_chat
 async def clear_memory_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles the /memory_clear command."""
     user_id = update.effective_user.id
-    await db_utils.clear_memory(user_id)
-    await update.message.reply_text("Conversation memory has been cleared.")
+    await memory.clear_memory(user_id)
+    await _reply(update, "Conversation memory and archived history have been cleared.")
     logger.info(f"Memory cleared for user {user_id}")
 
-@owner_only
+@users_only
+@per_chat
 async def export_memory_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handles the /export_memory command."""
+    """Handles the /export_memory [csv|ndjson] [gz] command: the full archived history."""
+    args = [arg.lower() for arg in context.args or []]
+    unknown = [arg for arg in args if arg not in export.EXPORT_FORMATS + ('gz',)]
+    if unknown:
+        await _reply(update, "Usage: /export_memory [csv|ndjson] [gz]")
+        return
+    fmt = next((arg for arg in args if arg in export.EXPORT_FORMATS), 'csv')
+    parts = await export.export_history(context.bot, update.effective_chat.id, update.effective_user.id, fmt, 'gz' in args)
+    if not parts:
+        await _reply(update, "No conversation history to export.")
+
+def _format_search_results(query: str, page: int, total: int, hits, tz) -> str:
+    first = (page - 1) * db_utils.SEARCH_PAGE_SIZE + 1
+    lines = [f'Matches {first}-{first + len(hits) - 1} of {total} for "{query}":', ""]
+    for timestamp, role, snippet in hits:
+        speaker = "You" if role == "user" else "Bot"
+        lines.append(f"{timestamp.astimezone(tz):%Y-%m-%d %H:%M} {speaker}: {snippet}")
+    if first + len(hits) - 1 < total:
+        lines += ["", f"Next page: /search {query} #{page + 1}"]
+    return "\n".join(lines)[:TELEGRAM_MAX_MESSAGE_LENGTH]
+
+@users_only
+@per_chat
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handles the /search <words> [#page] command: ranked snippets from the full history."""
+    args = list(context.args or [])
+    page = 1
+    if args and (match := SEARCH_PAGE_ARGUMENT.fullmatch(args[-1])):
+        page = max(1, int(match.group(1)))
+        args.pop()
+    query = " ".join(args)
+    if not query:
+        await _reply(update, "Usage: /search <words> [#page]\nExample: /search dentist appointment")
+        return
+
     user_id = update.effective_user.id
-    csv_data = await memory.export_memory_as_csv(user_id)
-    if csv_data:
-        await update.message.reply_document(
-            document=InputFile(csv_data, filename="conversation_history.csv"),
-            caption="Here is your conversation history."
-        )
+    total, hits = await db_utils.search_messages(user_id, query, page)
+    if not hits:
+        await _reply(update, f'No messages match "{query}".' if page == 1 or not total else f'There are only {total} matches for "{query}".')
+        return
+    tz = pytz.timezone(await db_utils.get_user_setting(user_id, 'timezone') or db_utils.DEFAULT_TIMEZONE)
+    await _reply(update, _format_search_results(query, page, total, hits, tz))
+
+def _format_percentiles(title: str, series) -> List[str]:
+    lines = [f"{title} (p50/p95/p99 ms, count):"]
+    for name, p in sorted(series.items()):
+        lines.append(f"- {name}: {p['p50'] * 1000:.1f}/{p['p95'] * 1000:.1f}/{p['p99'] * 1000:.1f} ({p['count']})")
+    return lines
+
+def _format_stats() -> str:
+    lines = []
+    if metrics.METRICS_ENABLED:
+        lines += _format_percentiles("Handlers", metrics.recent_percentiles(metrics.HANDLER_SECONDS))
+        lines += _format_percentiles("Stages", metrics.recent_percentiles(metrics.STAGE_SECONDS))
+        lines += _format_percentiles("Queue waits", metrics.recent_percentiles(metrics.QUEUE_WAIT_SECONDS))
+        tokens = metrics.counter_totals(metrics.LLM_TOKENS_TOTAL)
+        if tokens:
+            lines.append("LLM tokens: " + ", ".join(f"{name}={int(value)}" for name, value in sorted(tokens.items())))
     else:
-        await update.message.reply_text("No conversation history to export.")
+        lines.append("Detailed metrics are off (set METRICS_ENABLED=true).")
+
+    for name, stats in sorted(model_router.latency_stats().items()):
+        lines.append(f"LLM {name}: p50 {stats['p50']:.2f}s, p95 {stats['p95']:.2f}s ({stats['count']})")
+    for name, stats in sorted(breaker_stats().items()):
+        lines.append(f"Breaker {name}: {stats['state']} (opened {stats['opened']}x)")
+    queue = outbound.stats()
+    lines.append(
+        f"Outbound: depth {queue['queue_depth']}, interactive wait avg {queue['interactive']['wait_avg'] * 1000:.0f} ms, "
+        f"scheduled wait avg {queue['scheduled']['wait_avg'] * 1000:.0f} ms"
+    )
+    cache = db_utils.settings_cache_stats()
+    lookups = cache['hits'] + cache['misses']
+    lines.append(f"Settings cache: {cache['hits']}/{lookups} hits, {cache['size']} users")
+    workers = dispatcher.stats()
+    lines.append(f"Chat workers: {workers['active_workers']} active, {workers['queued_jobs']} queued jobs")
+    return "\n".join(lines)[:TELEGRAM_MAX_MESSAGE_LENGTH]
+
+@admin_only
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handles the /stats command: recent latency percentiles, queues and circuit breakers."""
+    await _reply(update, _format_stats())
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+@admin_only
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handles the /profile command: starts or stops the sampling profiler."""
+    action = context.args[0].lower() if context.args else ("stop" if watchdog.profiler_running() else "start")
+    if action == "start":
+        if watchdog.start_profiler():
+            await _reply(update, "Profiler started. Send /profile stop to collect the samples.")
+        else:
+            await _reply(update, "The profiler is already running.")
+        return
+    if action != "stop":
+        await _reply(update, "Usage: /profile [start|stop]")
+        return
+
+    # Writing and reading the samples is file I/O; keep it off the event loop
+    path = await asyncio.to_thread(watchdog.stop_profiler)
+    if path is None:
+        await _reply(update, "The profiler is not running.")
+        return
+    data = await asyncio.to_thread(_read_bytes, path)
+    await outbound.send(update.effective_chat.id, lambda: update.message.reply_document(
+        document=InputFile(data, filename=os.path.basename(path)),
+        caption="Folded stacks; render with flamegraph.pl or speedscope."
+    ))
+
+# --- Access Management ---
+def _parse_user_id(args) -> Optional[int]:
+    try:
+        return int(args[0])
+    except (IndexError, ValueError):
+        return None
+
+@admin_only
+async def invite_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handles the /invite <user_id> [admin|member] command: registers a user or changes their role."""
+    user_id = _parse_user_id(context.args)
+    role = context.args[1].lower() if len(context.args or []) > 1 else access.MEMBER
+    if user_id is None or role not in access.ROLES:
+        await _reply(update, "Usage: /invite <user_id> [admin|member]\n"
+                             "The user can find their ID with a bot such as @userinfobot.")
+        return
+    if user_id == db_utils.OWNER_ID and role != access.ADMIN:
+        await _reply(update, "The owner is always an admin.")
+        return
+    previous = access.role_of(user_id)
+    await access.invite(user_id, role, update.effective_user.id)
+    if previous is None:
+        await _reply(update, f"User {user_id} can now use the bot as {role}. They should send /start to begin.")
+    else:
+        await _reply(update, f"User {user_id} is now {role} (was {previous}).")
+
+@admin_only
+async def revoke_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handles the /revoke <user_id> command: takes a user's access away."""
+    user_id = _parse_user_id(context.args)
+    if user_id is None:
+        await _reply(update, "Usage: /revoke <user_id>")
+        return
+    if user_id in (update.effective_user.id, db_utils.OWNER_ID):
+        await _reply(update, "You can't revoke your own or the owner's access.")
+        return
+    if not await access.revoke(user_id):
+        await _reply(update, f"User {user_id} is not registered.")
+        return
+    scheduler.unschedule_user(user_id)
+    await _reply(update, f"User {user_id} can no longer use the bot. Their history is kept.")
+
+@admin_only
+async def users_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handles the /users command: lists everyone registered and their role."""
+    users = sorted(access.registered_users().items(), key=lambda item: (item[1] != access.ADMIN, item[0]))
+    lines = [f"Registered users ({len(users)}):"] + [f"- {user_id}: {role}" for user_id, role in users]
+    await _reply(update, "\n".join(lines)[:TELEGRAM_MAX_MESSAGE_LENGTH])
 
 # --- Message Handler ---
-@owner_only
+class _PendingTurn:
+    """Messages from one chat answered as one turn, from the first message until the reply is delivered."""
+
+    def __init__(self):
+        self.texts: List[str] = []
+        self.update: Optional[Update] = None
+        self.timer: Optional[asyncio.Task] = None
+        # Once answering: the task newer input cancels, and whether the texts are stored yet
+        self.task: Optional[asyncio.Task] = None
+        self.stored = False
+        self.superseded = False
+
+
+_pending_turns: Dict[int, _PendingTurn] = {}  # Waiting out the debounce window
+_active_turns: Dict[int, _PendingTurn] = {}  # Queued, preparing or answering, until the reply is delivered
+
+@users_only
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handles all non-command text messages."""
+    """Handles all non-command text messages by queueing them into the chat's next turn."""
+    chat_id = update.effective_chat.id
+    pending = _pending_turns.get(chat_id)
+    if pending is None:
+        pending = _pending_turns[chat_id] = _PendingTurn()
+        # Newer input supersedes a turn at any point before its reply is delivered
+        active = _active_turns.pop(chat_id, None)
+        if active is not None:
+            logger.info(f"New input from chat {chat_id}; cancelling the reply in progress.")
+            active.superseded = True
+            active.task.cancel()
+            if not active.stored:
+                # Never stored, so its messages are answered together with the new ones
+                pending.texts.extend(active.texts)
+    pending.texts.append(update.message.text)
+    pending.update = update  # Reply to the latest message of the burst
+
+    # Each message restarts the debounce window
+    if pending.timer is not None:
+        pending.timer.cancel()
+    pending.timer = asyncio.create_task(_debounced_turn(chat_id))
+
+async def _debounced_turn(chat_id: int):
+    await asyncio.sleep(DEBOUNCE_WINDOW)
+    turn = _pending_turns.pop(chat_id)
+    # Cancelling this while queued means the dispatcher never starts the turn
+    turn.task = asyncio.current_task()
+    _active_turns[chat_id] = turn
+    try:
+        # Queued behind the chat's previous turn (and commands), which finish or unwind first
+        await dispatcher.run(chat_id, lambda: _run_turn(turn))
+    except asyncio.CancelledError:
+        pass  # Superseded by newer input
+    except Exception as e:
+        logger.error(f"Exception while answering chat {chat_id}: {e}", exc_info=True)
+    finally:
+        _end_turn(chat_id, turn)
+
+def _end_turn(chat_id: int, turn: _PendingTurn):
+    """Stops newer input from cancelling the turn, unless a newer turn has already taken its place."""
+    if _active_turns.get(chat_id) is turn:
+        del _active_turns[chat_id]
+
+@metrics.traced("turn")
+async def _run_turn(turn: _PendingTurn):
+    """Stores a burst of messages as one user turn and answers it with a single LLM call."""
+    if turn.superseded:
+        return  # Newer input arrived as the dispatcher was starting it
+    turn.task = asyncio.current_task()
+    update = turn.update
     user_id = update.effective_user.id
-    user_message = update.message.text
+    chat_id = update.effective_chat.id
+    user_message = "\n".join(turn.texts)
 
     # --- ADDED: Send message to Alexa via Voice Monkey ---
     #send_to_alexa(f"New message from Telegram says: {user_message}")
     # ----------------------------------------------------
 
-    # Store user message
-    await db_utils.add_message(user_id, 'user', user_message)
-    
-    # Get context for response generation
+    # Get context for response generation (served from the in-memory buffer).
+    # History is read before storing the new message so it isn't sent to the LLM twice.
     current_persona = await db_utils.get_user_setting(user_id, 'persona')
-    history = await db_utils.get_last_n_messages(user_id, n=50) # Use last 50 messages for context
+    summary, history = await memory.get_context(user_id, n=50) # Use last 50 messages for context
+    # Pull semantically related older messages that aren't already in the prompt
+    recalled = await retrieval.search(user_id, user_message, exclude_recent=len(history))
 
-    # Generate and send response
-    bot_response = await personas.generate_response(current_persona, user_message, history)
-    await update.message.reply_text(bot_response)
+    # Store user message. Shielded and flagged in one step, so input that cancels the turn from
+    # here on finds it stored exactly once rather than re-sending its texts in the next turn.
+    turn.stored = True
+    await asyncio.shield(memory.add_message(user_id, 'user', user_message))
+
+    # Generate and send response; newer input cancels this until the reply is delivered
+    if STREAM_REPLIES:
+        # Show tokens as they arrive; the reply is only persisted once the stream completes
+        bot_response = await _stream_reply(
+            update, personas.stream_response(current_persona, user_message, history, summary, recalled)
+        )
+    else:
+        bot_response = await personas.generate_response(current_persona, user_message, history, summary, recalled)
+        await _reply(update, bot_response)
+    _end_turn(chat_id, turn)
 
     # --- Step 2: Read the OUTGOING bot reply aloud --- (This is the new part)
     send_to_alexa(f"Elon says: {bot_response}")
     # ---------------------------------------------------
     
     # Store bot response
-    await db_utils.add_message(user_id, 'bot', bot_response)
+    await memory.add_message(user_id, 'bot', bot_response)
 
 # --- Error Handler ---
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
@@ -0,0 +1,162 @@
+# src/bot/http_server.py
+import asyncio
+import functools
+import logging
+import os
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# --- HTTP Server Settings ---
+# A deliberately small HTTP/1.1 server (keep-alive, Content-Length request bodies) for the
+# webhook and health endpoints, so no web framework is needed.
+HTTP_HOST = os.getenv("HTTP_HOST", "0.0.0.0")
+HTTP_MAX_BODY_BYTES = int(os.getenv("HTTP_MAX_BODY_BYTES", 1024 * 1024))
+HTTP_IDLE_TIMEOUT = float(os.getenv("HTTP_IDLE_TIMEOUT", 75))  # Seconds a keep-alive connection may sit idle
+
+_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class Request:
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(self, method: str, path: str, query: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers  # Lower-cased names
+        self.body = body
+
+
+# A handler returns (status, body, content type); an async iterator body is sent chunked
+Response = Tuple[int, Union[bytes, AsyncIterator[bytes]], str]
+Handler = Callable[[Request], Awaitable[Response]]
+
+_routes: Dict[Tuple[str, str], Handler] = {}
+_server: Optional[asyncio.AbstractServer] = None
+
+
+def route(method: str, path: str, handler: Handler):
+    """Registers `handler` for requests matching `method` and `path` exactly."""
+    _routes[(method.upper(), path)] = handler
+
+
+def text_response(status: int, text: str) -> Response:
+    return status, text.encode("utf-8"), "text/plain; charset=utf-8"
+
+
+async def _health(request: Request) -> Response:
+    return text_response(200, "ok")
+
+
+route("GET", "/healthz", _health)
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    """Reads one request. Raises ValueError if it is malformed and _BodyTooLarge if its body is."""
+    request_line = await asyncio.wait_for(reader.readline(), HTTP_IDLE_TIMEOUT)
+    if not request_line:
+        return None
+    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length < 0:
+        raise ValueError(f"negative content-length: {length}")
+    if length > HTTP_MAX_BODY_BYTES:
+        raise _BodyTooLarge()
+    body = await reader.readexactly(length) if length else b""
+    path, _, query = target.partition("?")
+    return Request(method.upper(), path, query, headers, body)
+
+
+async def _write_response(writer: asyncio.StreamWriter, response: Response, keep_alive: bool):
+    status, body, content_type = response
+    streamed = not isinstance(body, bytes)
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        + ("Transfer-Encoding: chunked\r\n" if streamed else f"Content-Length: {len(body)}\r\n")
+        + f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    ).encode("latin-1")
+    if not streamed:
+        writer.write(head + body)
+        return
+    writer.write(head)
+    async for chunk in body:
+        if chunk:
+            writer.write(f"{len(chunk):x}\r\n".encode("latin-1") + chunk + b"\r\n")
+            await writer.drain()
+    writer.write(b"0\r\n\r\n")
+
+
+async def _serve_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                            routes: Dict[Tuple[str, str], Handler]):
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                break
+            except _BodyTooLarge:
+                await _write_response(writer, text_response(413, "payload too large"), keep_alive=False)
+                break
+            except ValueError:
+                await _write_response(writer, text_response(400, "bad request"), keep_alive=False)
+                break
+            if request is None:
+                break
+
+            handler = routes.get((request.method, request.path))
+            if handler is None:
+                known_path = any(path == request.path for _, path in routes)
+                response = text_response(405 if known_path else 404, "not found")
+            else:
+                try:
+                    response = await handler(request)
+                except Exception as e:
+                    logger.error(f"HTTP handler for {request.path} failed: {e}", exc_info=True)
+                    response = text_response(500, "internal error")
+
+            keep_alive = request.headers.get("connection", "").lower() != "close"
+            await _write_response(writer, response, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(routes: Dict[Tuple[str, str], Handler], port: int, host: str = HTTP_HOST) -> asyncio.AbstractServer:
+    """Serves a separate route table on host:port; the caller closes the returned server."""
+    return await asyncio.start_server(functools.partial(_serve_connection, routes=routes), host, port)
+
+
+async def start(port: int, host: str = HTTP_HOST):
+    """Starts serving the registered routes on host:port."""
+    global _server
+    if _server is not None:
+        return
+    _server = await serve(_routes, port, host)
+    logger.info(f"HTTP server listening on {host}:{port}.")
+
+
+async def stop():
+    global _server
+    if _server is None:
+        return
+    _server.close()
+    await _server.wait_closed()
+    _server = None
@@ -0,0 +1,92 @@
+# src/bot/llm_client.py
+import asyncio
+import json
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# --- Client Configuration ---
+# Connect timeout bounds how long we wait for OpenRouter to accept a connection;
+# read timeout bounds the gap between bytes while a completion is being generated.
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 120))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", 10))
+# Upper bound on simultaneous in-flight LLM requests across the whole bot.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Returns the shared keep-alive HTTP client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            ),
+        )
+        logger.info("LLM HTTP client initialized.")
+    return _client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def post_json(url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    POSTs a JSON payload over the pooled client and returns the decoded JSON body.
+    Waits for a concurrency slot first so a burst of updates cannot open an
+    unbounded number of requests. Raises httpx errors on timeouts and bad statuses.
+    """
+    async with _get_semaphore():
+        response = await get_client().post(url, json=payload, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+
+async def stream_sse(url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    POSTs a streaming request and yields each decoded server-sent event payload
+    until the terminating `[DONE]` marker. The concurrency slot is held for the
+    lifetime of the stream.
+    """
+    async with _get_semaphore():
+        async with get_client().stream("POST", url, json=payload, headers=headers) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                # Skip blank separators and SSE comments (OpenRouter sends keep-alive comments)
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    event = json.loads(data)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping malformed SSE payload: {data[:200]}")
+                    continue
+                if "error" in event:
+                    raise RuntimeError(f"Stream aborted by provider: {event['error']}")
+                yield event
+
+
+async def close():
+    """Closes the shared client. Safe to call when it was never created."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.info("LLM HTTP client closed.")
+    _client = None
@@ -1,33 +1,109 @@
 # src/bot/memory.py
-import csv
-import io
-from typing import List, Tuple
+import asyncio
+import os
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
 from database import db_utils
+from bot import metrics, retrieval
+
+# --- Conversation Buffer ---
+# The last HISTORY_LIMIT turns per user are kept in memory, warmed lazily from the
+# messages table and appended to as turns are stored, so building LLM context
+# never has to query the database.
+HISTORY_LIMIT = 50
+MEMORY_BUFFER_MAX_USERS = int(os.getenv("MEMORY_BUFFER_MAX_USERS", 256))
+
+_buffers: "OrderedDict[int, Deque[Tuple[str, str]]]" = OrderedDict()
+_warm_locks: Dict[int, asyncio.Lock] = {}
+# Per-user running summary and the number of buffered turns newer than it covers
+_summaries: Dict[int, Tuple[Optional[str], int]] = {}
+# Bumped whenever a user's history changes, so derived data (e.g. pre-generated pings) can detect staleness
+_versions: Dict[int, int] = {}
+
+async def _get_buffer(user_id: int) -> Deque[Tuple[str, str]]:
+    """Returns the user's ring buffer, loading it from the database on first access."""
+    buffer = _buffers.get(user_id)
+    if buffer is not None:
+        _buffers.move_to_end(user_id)
+        return buffer
+
+    # Only one coroutine warms a given user; the others wait and reuse its result
+    lock = _warm_locks.setdefault(user_id, asyncio.Lock())
+    async with lock:
+        buffer = _buffers.get(user_id)
+        if buffer is None:
+            rows = await db_utils.get_last_n_messages(user_id, HISTORY_LIMIT)
+            _summaries[user_id] = await db_utils.get_summary_state(user_id)
+            buffer = deque(rows, maxlen=HISTORY_LIMIT)
+            _store_buffer(user_id, buffer)
+    _warm_locks.pop(user_id, None)
+    return buffer
+
+def _store_buffer(user_id: int, buffer: Deque[Tuple[str, str]]):
+    _buffers[user_id] = buffer
+    _buffers.move_to_end(user_id)
+    # Evict the least recently active users beyond the cap; they are re-warmed on demand
+    while len(_buffers) > MEMORY_BUFFER_MAX_USERS:
+        evicted_user_id, _ = _buffers.popitem(last=False)
+        _summaries.pop(evicted_user_id, None)
+
+def invalidate(user_id: int):
+    """Drops a user's buffer and summary so the next access reloads them from the database."""
+    _buffers.pop(user_id, None)
+    _summaries.pop(user_id, None)
+
+def history_version(user_id: int) -> int:
+    """Returns a counter that changes every time the user's history is appended to or cleared."""
+    return _versions.get(user_id, 0)
+
+async def get_history(user_id: int, n: int = HISTORY_LIMIT) -> List[Tuple[str, str]]:
+    """Returns up to the last n (role, content) turns in chronological order."""
+    buffer = await _get_buffer(user_id)
+    if n >= len(buffer):
+        return list(buffer)
+    return list(buffer)[-n:]
+
+@metrics.timed("memory.get_context")
+async def get_context(user_id: int, n: int = HISTORY_LIMIT) -> Tuple[Optional[str], List[Tuple[str, str]]]:
+    """
+    Returns the user's running summary (or None) and the recent turns to send alongside it.
+    When a summary exists, only turns newer than what it covers are returned.
+    """
+    history = await get_history(user_id, n)
+    summary, pending = _summaries.get(user_id, (None, 0))
+    if summary is not None and pending < len(history):
+        history = history[len(history) - pending:] if pending else []
+    return summary, history
+
+@metrics.timed("memory.add_message")
+async def add_message(user_id: int, role: str, content: str):
+    """Persists a turn and appends it to the user's in-memory history."""
+    # Warm before writing so the initial load cannot race with this insert
+    buffer = await _get_buffer(user_id)
+    # Index before storing so a first-time index bootstrap from the table can't include it twice
+    await retrieval.index_message(user_id, role, content)
+    await db_utils.add_message(user_id, role, content)
+    buffer.append((role, content))
+    summary, pending = _summaries.get(user_id, (None, 0))
+    _summaries[user_id] = (summary, pending + 1)
+    _versions[user_id] = _versions.get(user_id, 0) + 1
+
+async def clear_memory(user_id: int):
+    """Deletes a user's stored history and summary and resets their buffer to empty."""
+    await db_utils.clear_memory(user_id)
+    await retrieval.clear(user_id)
+    _store_buffer(user_id, deque(maxlen=HISTORY_LIMIT))
+    _summaries[user_id] = (None, 0)
+    _versions[user_id] = _versions.get(user_id, 0) + 1
 
 async def get_formatted_memory(user_id: int) -> str:
     """
     Retrieves the last 50 messages and formats them into a string.
     """
-    messages = await db_utils.get_last_n_messages(user_id, 50)
+    messages = await get_history(user_id, 50)
     if not messages:
         return "No recent conversation history."
-    
+
     # Format for simple text display or for LLM context
     history = "\n".join([f"{role.capitalize()}: {content}" for role, content in messages])
     return f"--- Recent Conversation ---\n{history}"
-
-async def export_memory_as_csv(user_id: int):
-    """
-    Exports the user's message history as a CSV file content.
-    """
-    messages = await db_utils.get_last_n_messages(user_id, 50)
-    if not messages:
-        return None
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['role', 'content'])
-    writer.writerows(messages)
-    
-    output.seek(0)
-    return output.read().encode('utf-8')
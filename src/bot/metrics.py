@@ -0,0 +1,225 @@
+# src/bot/metrics.py
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from bot import http_server
+
+logger = logging.getLogger(__name__)
+
+# --- Metrics Settings ---
+# Disabled by default: the decorators below then return the functions unchanged and
+# observe()/inc() return after a single flag check.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+METRICS_RECENT_SAMPLES = int(os.getenv("METRICS_RECENT_SAMPLES", 512))  # Per series, for /stats percentiles
+# Updates slower than this many seconds get their per-stage breakdown logged
+METRICS_SLOW_UPDATE = float(os.getenv("METRICS_SLOW_UPDATE", 10))
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = "bot_stage_seconds"
+HANDLER_SECONDS = "bot_handler_seconds"
+QUEUE_WAIT_SECONDS = "bot_queue_wait_seconds"
+LLM_SECONDS = "bot_llm_seconds"
+UPDATES_TOTAL = "bot_updates_total"
+ERRORS_TOTAL = "bot_handler_errors_total"
+DB_QUERIES_TOTAL = "bot_db_queries_total"
+LLM_TOKENS_TOTAL = "bot_llm_tokens_total"
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class _Histogram:
+    __slots__ = ("bucket_counts", "sum", "count", "recent")
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+        self.recent: Deque[float] = deque(maxlen=METRICS_RECENT_SAMPLES)
+
+    def observe(self, value: float):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+
+_histograms: Dict[_Key, _Histogram] = {}
+_counters: Dict[_Key, float] = {}
+# Per-update trace: stage name -> accumulated seconds, plus a DB query count
+_trace: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("metrics_trace", default=None)
+_started_at = time.time()
+
+
+def _key(name: str, labels: Dict[str, Any]) -> _Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1.0, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0.0) + value
+
+
+def observe(name: str, seconds: float, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = _Histogram()
+    histogram.observe(seconds)
+
+
+def record_stage(stage: str, seconds: float):
+    """Records a stage duration and adds it to the current update's trace."""
+    if not METRICS_ENABLED:
+        return
+    observe(STAGE_SECONDS, seconds, stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace[stage] = trace.get(stage, 0.0) + seconds
+        if stage.startswith("db."):
+            trace['db_queries'] = trace.get('db_queries', 0) + 1
+    if stage.startswith("db."):
+        inc(DB_QUERIES_TOTAL, query=stage[3:])
+
+
+def timed(stage: str):
+    """Decorator recording an async function's (or async generator's) duration as `stage`."""
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def wrapped_gen(*args, **kwargs):
+                started = time.perf_counter()
+                first = True
+                inner = func(*args, **kwargs)
+                try:
+                    async for item in inner:
+                        if first:
+                            record_stage(f"{stage}.first_chunk", time.perf_counter() - started)
+                            first = False
+                        yield item
+                finally:
+                    # Closing the wrapper must close the inner generator now, not at garbage collection,
+                    # so its own cleanup (e.g. cancelling an upstream request) runs immediately
+                    try:
+                        await inner.aclose()
+                    finally:
+                        record_stage(stage, time.perf_counter() - started)
+            return wrapped_gen
+
+        @functools.wraps(func)
+        async def wrapped(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                record_stage(stage, time.perf_counter() - started)
+        return wrapped
+    return decorator
+
+
+def traced(handler: str):
+    """
+    Decorator for update handlers and jobs: counts calls and errors, times the whole call,
+    and collects the stages run inside it into a trace that is logged when slow.
+    """
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        async def wrapped(*args, **kwargs):
+            trace: Dict[str, float] = {}
+            token = _trace.set(trace)
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except BaseException:
+                inc(ERRORS_TOTAL, handler=handler)
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                _trace.reset(token)
+                inc(UPDATES_TOTAL, handler=handler)
+                observe(HANDLER_SECONDS, elapsed, handler=handler)
+                if elapsed >= METRICS_SLOW_UPDATE:
+                    breakdown = ", ".join(f"{stage}={value:.3f}" for stage, value in sorted(trace.items()))
+                    logger.info(f"Slow {handler}: {elapsed:.2f}s ({breakdown})")
+        return wrapped
+    return decorator
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], **extra: str) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus() -> str:
+    """Renders all counters and histograms in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for name in sorted({name for name, _ in _counters}):
+        lines.append(f"# TYPE {name} counter")
+        for (series, labels), value in sorted(_counters.items()):
+            if series == name:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+    for name in sorted({name for name, _ in _histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (series, labels), histogram in sorted(_histograms.items(), key=lambda item: item[0]):
+            if series != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.bucket_counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, le=str(bound))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, le='+Inf')} {histogram.count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+    lines.append("# TYPE bot_uptime_seconds gauge")
+    lines.append(f"bot_uptime_seconds {time.time() - _started_at}")
+    return "\n".join(lines) + "\n"
+
+
+def recent_percentiles(name: str) -> Dict[str, Dict[str, float]]:
+    """p50/p95/p99 over each series' recent samples for one histogram, keyed by its label values."""
+    result = {}
+    for (series, labels), histogram in _histograms.items():
+        if series != name or not histogram.recent:
+            continue
+        ordered = sorted(histogram.recent)
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        result[",".join(v for _, v in labels)] = {
+            'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99), 'count': histogram.count,
+        }
+    return result
+
+
+def counter_totals(name: str) -> Dict[str, float]:
+    return {",".join(v for _, v in labels): value for (series, labels), value in _counters.items() if series == name}
+
+
+def register_endpoint():
+    """Serves the metrics at GET /metrics on the embedded HTTP server."""
+    async def metrics_endpoint(request: http_server.Request) -> http_server.Response:
+        return 200, render_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+
+    http_server.route("GET", "/metrics", metrics_endpoint)
@@ -0,0 +1,226 @@
+# src/bot/model_router.py
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Tuple
+
+from bot import metrics
+from bot.circuit_breaker import get_breaker
+
+logger = logging.getLogger(__name__)
+
+# --- Hedging Settings ---
+# If the primary model hasn't answered within its recent latency percentile, the same
+# request is sent to the next model and whichever answers first wins. Only the slowest
+# ~(1 - HEDGE_PERCENTILE) of requests are duplicated, so average cost barely moves.
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 0.95))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", 2))  # Seconds
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY", 30))
+# Used until a model has enough samples for a meaningful percentile
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", 10))
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 10
+
+# Separate latency distributions for full completions and time-to-first-token of streams
+COMPLETION = "completion"
+FIRST_TOKEN = "first_token"
+
+_latencies: Dict[Tuple[str, str], Deque[float]] = {}
+_END = object()
+
+
+class AllModelsFailed(Exception):
+    """Raised when every model in the route failed."""
+
+
+class AllCircuitsOpen(AllModelsFailed):
+    """Raised without making any request when every model's circuit breaker is open."""
+
+
+def _next_allowed(remaining: List[str]):
+    """Pops models off the route until one whose breaker admits a call; None if none do."""
+    while remaining:
+        model = remaining.pop(0)
+        if get_breaker(model).allow():
+            return model
+        logger.debug(f"Skipping {model}: circuit open.")
+    return None
+
+
+def record_latency(model: str, kind: str, seconds: float):
+    _latencies.setdefault((model, kind), deque(maxlen=LATENCY_WINDOW)).append(seconds)
+    metrics.observe(metrics.LLM_SECONDS, seconds, model=model, kind=kind)
+
+
+def _percentile(samples: Deque[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def hedge_delay(model: str, kind: str) -> float:
+    """Seconds to wait on `model` before hedging, adapted from its recent latencies."""
+    samples = _latencies.get((model, kind))
+    if not samples or len(samples) < MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, _percentile(samples, HEDGE_PERCENTILE)))
+
+
+def latency_stats() -> Dict[str, Dict[str, float]]:
+    """Returns p50/p95 and sample counts per model and request kind."""
+    return {
+        f"{model}:{kind}": {
+            "p50": _percentile(samples, 0.5),
+            "p95": _percentile(samples, 0.95),
+            "count": len(samples),
+        }
+        for (model, kind), samples in _latencies.items() if samples
+    }
+
+
+async def _cancel_all(tasks):
+    for task in tasks:
+        task.cancel()
+    # Let cancellations unwind so losing requests release their connections
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def complete(models: List[str], request: Callable[[str], Awaitable[str]], hedge: bool = True) -> str:
+    """
+    Runs request(model) against the route's first model, failing over to the next one on
+    error and, when hedging, also after the primary's hedge delay. Returns the first
+    successful result and cancels the rest. Raises AllModelsFailed if none succeed.
+    """
+    remaining = list(models)
+    attempts: Dict[asyncio.Task, Tuple[str, float]] = {}
+    loop = asyncio.get_running_loop()
+    errors = []
+
+    def start_next() -> bool:
+        model = _next_allowed(remaining)
+        if model is None:
+            return False
+        attempts[asyncio.ensure_future(request(model))] = (model, loop.time())
+        return True
+
+    try:
+        if not start_next():
+            raise AllCircuitsOpen("All model circuits are open.")
+        while attempts:
+            timeout = None
+            if hedge and HEDGE_ENABLED and remaining and len(attempts) == 1:
+                model, started = next(iter(attempts.values()))
+                timeout = max(0.0, started + hedge_delay(model, COMPLETION) - loop.time())
+            done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.info(f"Hedging: no answer from {next(iter(attempts.values()))[0]} yet, also asking {remaining[0]}.")
+                start_next()
+                continue
+            for task in done:
+                model, started = attempts.pop(task)
+                if task.exception() is None:
+                    get_breaker(model).record_success()
+                    record_latency(model, COMPLETION, loop.time() - started)
+                    return task.result()
+                get_breaker(model).record_failure()
+                logger.warning(f"Model {model} failed: {task.exception()}")
+                errors.append(task.exception())
+            if not attempts:
+                start_next()
+        raise AllModelsFailed(f"All models failed: {errors}")
+    finally:
+        for model, _ in attempts.values():
+            get_breaker(model).release()
+        await _cancel_all(list(attempts))
+
+
+async def _pump(chunks: AsyncIterator[str], queue: asyncio.Queue):
+    """Forwards a stream into a queue, ending with _END or the exception that stopped it."""
+    try:
+        async for chunk in chunks:
+            await queue.put(chunk)
+        await queue.put(_END)
+    except Exception as e:
+        await queue.put(e)
+
+
+async def stream(models: List[str], open_stream: Callable[[str], AsyncIterator[str]]) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of complete(): hedges on time-to-first-token. The first model to
+    produce a chunk wins and the others are cancelled; a model that fails or ends empty
+    before its first chunk is replaced by the next one. Errors after the first chunk propagate.
+    """
+    remaining = list(models)
+    queues: Dict[str, asyncio.Queue] = {}
+    pumps: Dict[str, asyncio.Task] = {}
+    started: Dict[str, float] = {}
+    getters: Dict[asyncio.Task, str] = {}
+    loop = asyncio.get_running_loop()
+    errors = []
+
+    def start_next() -> bool:
+        model = _next_allowed(remaining)
+        if model is None:
+            return False
+        queues[model] = asyncio.Queue()
+        pumps[model] = asyncio.create_task(_pump(open_stream(model), queues[model]))
+        started[model] = loop.time()
+        getters[asyncio.create_task(queues[model].get())] = model
+        return True
+
+    winner = None
+    try:
+        if not start_next():
+            raise AllCircuitsOpen("All model circuits are open.")
+        first_chunk = None
+        while winner is None:
+            if not getters:
+                raise AllModelsFailed(f"All models failed: {errors}")
+            timeout = None
+            if HEDGE_ENABLED and remaining and len(getters) == 1:
+                model = next(iter(getters.values()))
+                timeout = max(0.0, started[model] + hedge_delay(model, FIRST_TOKEN) - loop.time())
+            done, _ = await asyncio.wait(getters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.info(f"Hedging: no tokens from {next(iter(getters.values()))} yet, also asking {remaining[0]}.")
+                start_next()
+                continue
+            for task in done:
+                model = getters.pop(task)
+                item = task.result()
+                if item is _END or isinstance(item, Exception):
+                    error = item if item is not _END else "empty reply"
+                    logger.warning(f"Model {model} failed before streaming any content: {error}")
+                    get_breaker(model).record_failure()
+                    errors.append(error)
+                    pumps.pop(model)
+                    if not getters:
+                        start_next()
+                elif winner is None:
+                    winner, first_chunk = model, item
+                    get_breaker(model).record_success()
+
+        record_latency(winner, FIRST_TOKEN, loop.time() - started[winner])
+        # Cancel the losers before streaming the rest of the winner
+        await _cancel_all(list(getters))
+        getters.clear()
+        losers = [model for model in pumps if model != winner]
+        for model in losers:
+            get_breaker(model).release()
+        await _cancel_all([pumps.pop(model) for model in losers])
+
+        yield first_chunk
+        while True:
+            item = await queues[winner].get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                get_breaker(winner).record_failure()
+                raise item
+            yield item
+    finally:
+        if winner is None:
+            for model in pumps:
+                get_breaker(model).release()
+        await _cancel_all(list(getters) + list(pumps.values()))
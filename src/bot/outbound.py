@@ -0,0 +1,280 @@
+# src/bot/outbound.py
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from telegram.error import RetryAfter
+
+from bot import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- Rate Limits ---
+# Telegram allows roughly 30 messages/s per bot overall and about 1 message/s per chat
+# (with short bursts). Every outbound call goes through token buckets for both.
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", 30))  # Requests per second
+OUTBOUND_GLOBAL_BURST = float(os.getenv("OUTBOUND_GLOBAL_BURST", 30))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", 1))
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", 3))
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", 8))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 3))
+OUTBOUND_MAX_CHATS = 4096  # Per-chat state kept for the most recently active chats only
+
+# Lower values are sent first
+INTERACTIVE = 0
+SCHEDULED = 1
+_PRIORITY_NAMES = {INTERACTIVE: "interactive", SCHEDULED: "scheduled"}
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available; 0 if one is available now."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        """Waits until a token is available and takes it."""
+        while (delay := self.wait_time()) > 0:
+            await asyncio.sleep(delay)
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        """Empties the bucket so the next token is only available after `seconds`."""
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class _Request:
+    __slots__ = ("priority", "call", "future", "enqueued_at", "attempts")
+
+    def __init__(self, priority: int, call: Callable[[], Awaitable[Any]], future: asyncio.Future):
+        self.priority = priority
+        self.call = call
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+class _ChatState:
+    __slots__ = ("bucket", "pending", "scheduled")
+
+    def __init__(self):
+        self.bucket = TokenBucket(OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST)
+        # Sent strictly in submission order, which keeps messages and streamed edits in order
+        self.pending: Deque[_Request] = deque()
+        # In the ready queue, waiting out its bucket, or being sent; at most once at a time
+        self.scheduled = False
+
+
+# Workers take chats, not requests, off the ready queue, highest priority head request first.
+# A chat that has to wait for its bucket or a flood-control back-off is put back on a timer
+# instead of holding a worker, so throttled chats never delay the others.
+_ready: Optional[asyncio.PriorityQueue] = None
+_workers: List[asyncio.Task] = []
+_global_bucket: Optional[TokenBucket] = None
+_chats: "OrderedDict[int, _ChatState]" = OrderedDict()
+_sequence = itertools.count()
+_depth = 0  # Requests not yet finished
+_idle: Optional[asyncio.Event] = None
+_stats = {
+    name: {'sent': 0, 'failed': 0, 'retries': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+    for name in _PRIORITY_NAMES.values()
+}
+
+
+def _chat_state(chat_id: int) -> _ChatState:
+    state = _chats.get(chat_id)
+    if state is None:
+        state = _chats[chat_id] = _ChatState()
+        # Forget the least recently used idle chats; a fresh bucket starts full, which is safe
+        # because an idle chat's bucket would have refilled anyway
+        for old_chat_id in list(itertools.islice(_chats, max(0, len(_chats) - OUTBOUND_MAX_CHATS))):
+            if not _chats[old_chat_id].scheduled:
+                del _chats[old_chat_id]
+    else:
+        _chats.move_to_end(chat_id)
+    return state
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    # Newer python-telegram-bot versions may report a timedelta
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+def _make_ready(chat_id: int, state: _ChatState):
+    _ready.put_nowait((state.pending[0].priority, next(_sequence), chat_id))
+
+
+def _wake(chat_id: int, state: _ChatState):
+    # The dispatcher may have been stopped while the chat was waiting
+    if state.pending and _workers:
+        _make_ready(chat_id, state)
+
+
+def _make_ready_later(chat_id: int, state: _ChatState, delay: float):
+    asyncio.get_running_loop().call_later(delay, _wake, chat_id, state)
+
+
+def _finish(state: _ChatState):
+    global _depth
+    state.pending.popleft()
+    _depth -= 1
+    if not _depth:
+        _idle.set()
+
+
+async def _serve(chat_id: int, state: _ChatState):
+    """Makes one attempt at the chat's oldest request, or puts the chat back until it may."""
+    # Skip requests whose senders have given up
+    while state.pending and state.pending[0].future.done():
+        _finish(state)
+    if not state.pending:
+        state.scheduled = False
+        return
+
+    request = state.pending[0]
+    delay = state.bucket.wait_time()
+    if delay > 0:
+        _make_ready_later(chat_id, state, delay)
+        return
+    state.bucket.tokens -= 1
+    await _global_bucket.acquire()
+
+    name = _PRIORITY_NAMES[request.priority]
+    stats = _stats[name]
+    if request.attempts == 0:
+        # Time spent queued and rate-limited before the first API call
+        wait = time.monotonic() - request.enqueued_at
+        stats['wait_total'] += wait
+        stats['wait_max'] = max(stats['wait_max'], wait)
+        metrics.observe(metrics.QUEUE_WAIT_SECONDS, wait, queue=f"outbound_{name}")
+    request.attempts += 1
+
+    try:
+        result = await request.call()
+    except RetryAfter as e:
+        delay = retry_after_seconds(e)
+        if request.attempts <= OUTBOUND_MAX_RETRIES:
+            stats['retries'] += 1
+            logger.warning(f"Telegram asked to retry chat {chat_id} after {delay}s.")
+            # Honor the back-off for this chat and, as flood control can be bot-wide, for all sends
+            state.bucket.pause(delay)
+            _global_bucket.pause(delay)
+            _make_ready_later(chat_id, state, delay)
+            return
+        stats['failed'] += 1
+        if not request.future.done():
+            request.future.set_exception(e)
+    except asyncio.CancelledError:
+        if not request.future.done():
+            request.future.cancel()
+        raise
+    except Exception as e:
+        stats['failed'] += 1
+        if not request.future.done():
+            request.future.set_exception(e)
+    else:
+        stats['sent'] += 1
+        if not request.future.done():
+            request.future.set_result(result)
+
+    _finish(state)
+    if state.pending:
+        _make_ready(chat_id, state)
+    else:
+        state.scheduled = False
+
+
+async def _worker():
+    while True:
+        _, _, chat_id = await _ready.get()
+        await _serve(chat_id, _chats[chat_id])
+
+
+def start():
+    """Starts the dispatcher workers on the running loop."""
+    global _ready, _global_bucket, _idle
+    if _workers:
+        return
+    _ready = asyncio.PriorityQueue()
+    _global_bucket = TokenBucket(OUTBOUND_GLOBAL_RATE, OUTBOUND_GLOBAL_BURST)
+    _idle = asyncio.Event()
+    _idle.set()
+    _workers.extend(asyncio.create_task(_worker()) for _ in range(OUTBOUND_WORKERS))
+    logger.info(f"Outbound dispatcher started with {OUTBOUND_WORKERS} workers.")
+
+
+async def stop(timeout: float = 10):
+    """Gives queued messages up to `timeout` seconds to go out, then stops the workers."""
+    global _depth
+    if not _workers:
+        return
+    try:
+        await asyncio.wait_for(_idle.wait(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Outbound dispatcher stopped with {_depth} message(s) unsent.")
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    # Nothing will send what's left; release its senders
+    for state in _chats.values():
+        for request in state.pending:
+            request.future.cancel()
+        state.pending.clear()
+        state.scheduled = False
+    _depth = 0
+
+
+@metrics.timed("telegram.send")
+async def send(chat_id: int, request: Callable[[], Awaitable[Any]], priority: int = INTERACTIVE) -> Any:
+    """
+    Queues a Telegram API call for `chat_id` and returns its result once sent. `request` is
+    a zero-argument callable producing the coroutine, so retries can issue it again.
+    Runs the call directly when the dispatcher hasn't been started.
+    """
+    global _depth
+    if not _workers:
+        return await request()
+    future = asyncio.get_running_loop().create_future()
+    state = _chat_state(chat_id)
+    state.pending.append(_Request(priority, request, future))
+    _depth += 1
+    _idle.clear()
+    if not state.scheduled:
+        state.scheduled = True
+        _make_ready(chat_id, state)
+    return await future
+
+
+def stats() -> Dict[str, Any]:
+    """Returns queue depth plus sent/failed/retry counts and wait times per priority."""
+    result: Dict[str, Any] = {'queue_depth': _depth}
+    for name, values in _stats.items():
+        handled = values['sent'] + values['failed']
+        result[name] = {
+            'sent': values['sent'],
+            'failed': values['failed'],
+            'retries': values['retries'],
+            'wait_avg': values['wait_total'] / handled if handled else 0.0,
+            'wait_max': values['wait_max'],
+        }
+    return result
@@ -1,9 +1,10 @@
 # src/bot/personas.py
 import os
 import logging
-import requests
-import json
-from typing import List, Tuple, Dict, Any
+import random
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bot import context_builder, llm_client, metrics, model_router
 
 # Set up logging
 logging.basicConfig(
@@ -20,6 +21,8 @@ OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 # Using a free model as a default from the OpenRouter docs
 DEFAULT_MODEL = "x-ai/grok-4-fast:free"
 DEEPSEEK_MODEL = "deepseek/deepseek-chat-v3.1:free"
+# Models tried in order; later ones serve as hedges and failovers for the first
+MODEL_ROUTE = [DEFAULT_MODEL, DEEPSEEK_MODEL]
 
 if not USE_LLM:
     print("OPENROUTER_API_KEY not found. LLM features will be disabled.")
@@ -87,7 +90,65 @@ PERSONAS: Dict[str, Dict[str, Any]] = {
     },
 }
 
-async def generate_response(persona: str, user_message: str, history: List[Tuple[str, str]]) -> str:
+PING_INSTRUCTION = "It's time for a scheduled check-in. Re-engage me based on our conversation so far, without explicitly saying 'this is a check-in'. Keep it natural and in character."
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain the long-term memory of a conversation between a user and their assistant. "
+    "Merge the new messages into the existing summary. Keep durable facts: goals, commitments, "
+    "progress, setbacks, recurring excuses, preferences, names and dates. Drop small talk. "
+    "Reply with the updated summary only, as concise bullet points, at most about 300 words."
+)
+
+def _build_llm_messages(persona_config: Dict[str, Any], history: List[Tuple[str, str]], final_user_content: str, model: str, summary: Optional[str] = None, recalled: Optional[List[Tuple[str, str]]] = None) -> List[Dict[str, str]]:
+    """Builds the chat-completions message list, packing as much recent history as the model's token budget allows."""
+    return context_builder.build_messages(
+        persona_config["system_prompt"], history, final_user_content, model=model,
+        summary=summary, recalled=recalled
+    )
+
+def _build_request_data(messages_for_llm: List[Dict[str, str]], model: str, stream: bool = False) -> Dict[str, Any]:
+    data = {
+        "model": model,
+        "messages": messages_for_llm,
+        "reasoning": {
+                "enabled": True
+              },
+        "temperature": 1.5,
+        "max_tokens": context_builder.output_budget(model), # Adjusted for safety with free models
+    }
+    if stream:
+        data["stream"] = True
+    return data
+
+def _request_headers() -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json"
+    }
+
+def _record_usage(model: str, usage: Optional[Dict[str, Any]]):
+    """Counts prompt/completion tokens reported by OpenRouter."""
+    if not usage:
+        return
+    for kind in ('prompt', 'completion'):
+        tokens = usage.get(f'{kind}_tokens')
+        if tokens:
+            metrics.inc(metrics.LLM_TOKENS_TOTAL, tokens, model=model, type=kind)
+
+async def _complete(persona_config: Dict[str, Any], history: List[Tuple[str, str]], final_user_content: str, summary: Optional[str] = None, recalled: Optional[List[Tuple[str, str]]] = None) -> str:
+    """Runs a chat completion across MODEL_ROUTE, hedging slow requests onto the alternate model."""
+    async def request(model: str) -> str:
+        messages_for_llm = _build_llm_messages(persona_config, history, final_user_content, model, summary, recalled)
+        data = _build_request_data(messages_for_llm, model)
+        # Non-blocking call over the shared pooled client (raises on timeouts and bad status codes)
+        result = await llm_client.post_json(OPENROUTER_API_URL, data, _request_headers())
+        _record_usage(model, result.get('usage'))
+        return result['choices'][0]['message']['content']
+
+    return await model_router.complete(MODEL_ROUTE, request)
+
+@metrics.timed("llm.generate_response")
+async def generate_response(persona: str, user_message: str, history: List[Tuple[str, str]], summary: Optional[str] = None, recalled: Optional[List[Tuple[str, str]]] = None) -> str:
     """
     Generates a response based on the selected persona, user message, and conversation history.
     """
@@ -98,35 +159,11 @@ async def generate_response(persona: str, user_message: str, history: List[Tuple
 
     if USE_LLM:
         try:
-            # Convert role 'user'/'bot' to expected 'user'/'assistant' format
-            messages_for_llm = [{"role": "system", "content": persona_config["system_prompt"]}]
-            for role, content in history:
-                role = "assistant" if role == "bot" else "user"
-                messages_for_llm.append({"role": role, "content": content})
-            # Add current user message
-            messages_for_llm.append({"role": "user", "content": user_message})
-            
-            headers = {
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "model": DEFAULT_MODEL,
-                "messages": messages_for_llm,
-                "reasoning": {
-                        "enabled": True
-                      },
-                "temperature": 1.5,
-                "max_tokens": 32000, # Adjusted for safety with free models
-            }
-
-            response = requests.post(
-                OPENROUTER_API_URL, headers=headers, data=json.dumps(data)
-            )
-            response.raise_for_status()  # Raise an exception for bad status codes
-            
-            result = response.json()
-            return result['choices'][0]['message']['content']
+            return await _complete(persona_config, history, user_message, summary, recalled)
+        except model_router.AllCircuitsOpen:
+            # Fast-fail path: no request was made
+            logger.info("LLM circuits open. Replying from templates.")
+            return await generate_template_response(persona, user_message, history)
         except Exception as e:
             logger.error(f"LLM call failed: {e}")
             # Fallback to template-based response
@@ -134,11 +171,86 @@ async def generate_response(persona: str, user_message: str, history: List[Tuple
     else:
         return await generate_template_response(persona, user_message, history)
 
+@metrics.timed("llm.stream_response")
+async def stream_response(persona: str, user_message: str, history: List[Tuple[str, str]], summary: Optional[str] = None, recalled: Optional[List[Tuple[str, str]]] = None) -> AsyncIterator[str]:
+    """
+    Streaming variant of generate_response: yields the reply text in chunks as
+    the completion is generated. Falls back to the template response if the
+    stream fails before producing any content.
+    """
+    if persona not in PERSONAS:
+        persona = "accountability"
+
+    async def open_stream(model: str) -> AsyncIterator[str]:
+        messages_for_llm = _build_llm_messages(PERSONAS[persona], history, user_message, model, summary, recalled)
+        data = _build_request_data(messages_for_llm, model, stream=True)
+        async for event in llm_client.stream_sse(OPENROUTER_API_URL, data, _request_headers()):
+            # The final event carries the token usage
+            _record_usage(model, event.get('usage'))
+            choices = event.get('choices') or []
+            if not choices:
+                continue
+            # Reasoning tokens arrive in delta['reasoning']; only the answer is shown
+            chunk = (choices[0].get('delta') or {}).get('content')
+            if chunk:
+                yield chunk
+
+    produced = False
+    if USE_LLM:
+        try:
+            async for chunk in model_router.stream(MODEL_ROUTE, open_stream):
+                produced = True
+                yield chunk
+        except model_router.AllCircuitsOpen:
+            logger.info("LLM circuits open. Replying from templates.")
+        except Exception as e:
+            logger.error(f"LLM stream failed: {e}")
+
+    if not produced:
+        yield await generate_template_response(persona, user_message, history)
+
+@metrics.timed("llm.generate_summary")
+async def generate_summary(previous_summary: Optional[str], messages: List[Tuple[str, str]]) -> Optional[str]:
+    """
+    Folds (role, content) messages into the running conversation summary.
+    Returns None if the LLM is unavailable or the call fails, leaving the old summary in place.
+    """
+    if not USE_LLM or not messages:
+        return None
+
+    transcript = "\n".join(
+        f"{'Assistant' if role == 'bot' else 'User'}: {content}" for role, content in messages
+    )
+
+    async def request(model: str) -> str:
+        data = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none yet)'}\n\nNew messages:\n{transcript}"},
+            ],
+            "temperature": 0.3, # Summaries should be faithful, not creative
+            "max_tokens": 2000,
+        }
+        result = await llm_client.post_json(OPENROUTER_API_URL, data, _request_headers())
+        _record_usage(model, result.get('usage'))
+        return result['choices'][0]['message']['content']
+
+    try:
+        # Off the hot path: plain failover, no hedged duplicate requests
+        summary = (await model_router.complete(MODEL_ROUTE, request, hedge=False) or "").strip()
+        return summary or None
+    except Exception as e:
+        logger.error(f"LLM summary call failed: {e}")
+        return None
+
 async def generate_template_response(persona: str, user_message: str, history: List[Tuple[str, str]]) -> str:
     """Generate response using templates when LLM is not available."""
-    return "LLM is not available. Please try again later or contact the administrator."
+    templates = PERSONAS.get(persona, PERSONAS["accountability"])["templates"]
+    return random.choice(templates)
 
-async def generate_ping(persona: str, history: List[Tuple[str, str]]) -> str:
+@metrics.timed("llm.generate_ping")
+async def generate_ping(persona: str, history: List[Tuple[str, str]], summary: Optional[str] = None) -> str:
     """Generates a scheduled ping message based on the persona, now with memory."""
     if persona not in PERSONAS:
         persona = "accountability"
@@ -146,36 +258,10 @@ async def generate_ping(persona: str, history: List[Tuple[str, str]]) -> str:
     # --- LLM-based Ping Generation ---
     if USE_LLM:
         try:
-            persona_config = PERSONAS[persona]
-            messages_for_llm = [{"role": "system", "content": persona_config["system_prompt"]}]
-            for role, content in history:
-                role = "assistant" if role == "bot" else "user"
-                messages_for_llm.append({"role": role, "content": content})
-            
             # Add a specific instruction for the LLM to generate a check-in
-            messages_for_llm.append({"role": "user", "content": "It's time for a scheduled check-in. Re-engage me based on our conversation so far, without explicitly saying 'this is a check-in'. Keep it natural and in character."})
-
-            headers = {
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "model": DEFAULT_MODEL,
-                "messages": messages_for_llm,
-                "reasoning": {
-                        "enabled": True
-                      },
-                "temperature": 1.5, # Slightly higher temp for more creative pings
-                "max_tokens": 32000,
-            }
-
-            response = requests.post(
-                OPENROUTER_API_URL, headers=headers, data=json.dumps(data)
-            )
-            response.raise_for_status()
-
-            result = response.json()
-            return result['choices'][0]['message']['content']
+            return await _complete(PERSONAS[persona], history, PING_INSTRUCTION, summary)
+        except model_router.AllCircuitsOpen:
+            logger.info("LLM circuits open. Sending template ping.")
         except Exception as e:
             logger.error(f"LLM-based ping failed: {e}. Falling back to template.")
             # Fallback to template on error
@@ -0,0 +1,192 @@
+# src/bot/retrieval.py
+import asyncio
+import json
+import logging
+import os
+import re
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from database import db_utils
+from bot import metrics
+
+try:
+    import numpy as np
+except ImportError:  # Retrieval is optional; the bot works without it
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# --- Retrieval Settings ---
+RETRIEVAL_ENABLED = np is not None and os.getenv("RETRIEVAL_ENABLED", "true").lower() == "true"
+# Hashed feature dimensions per message. 128 float32s keep 100k messages at ~50 MB
+# and a full scan around 3 ms (src/benchmarks/retrieval.py).
+RETRIEVAL_DIM = int(os.getenv("RETRIEVAL_DIM", 128))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 5))
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", 0.25))
+RETRIEVAL_MAX_USERS = int(os.getenv("RETRIEVAL_MAX_USERS", 32))
+RETRIEVAL_INDEX_DIR = os.getenv("RETRIEVAL_INDEX_DIR", "data/retrieval")
+
+if np is None:
+    logger.info("numpy not installed. Relevant-context retrieval will be disabled.")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Disk appends run on one worker thread so they stay ordered and off the event loop
+_io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retrieval-io")
+
+
+def embed(text: str) -> "np.ndarray":
+    """
+    Embeds text with a signed hashing vectorizer over word unigrams and bigrams,
+    L2-normalized so a dot product is the cosine similarity.
+    """
+    vector = np.zeros(RETRIEVAL_DIM, dtype=np.float32)
+    tokens = _TOKEN_RE.findall(text.lower())
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        # Low bits pick the slot, the top bit picks the sign to cancel out collisions
+        vector[h % RETRIEVAL_DIM] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+class _UserIndex:
+    """Append-only float32 matrix of message embeddings with their (role, content) pairs."""
+
+    def __init__(self, vectors: "np.ndarray", messages: List[Tuple[str, str]]):
+        self.count = len(messages)
+        self.vectors = np.zeros((max(64, self.count * 2), RETRIEVAL_DIM), dtype=np.float32)
+        self.vectors[:self.count] = vectors[:self.count]
+        self.messages = messages
+
+    def append(self, vector: "np.ndarray", role: str, content: str):
+        if self.count == len(self.vectors):
+            # Amortized O(1) growth
+            grown = np.zeros((len(self.vectors) * 2, RETRIEVAL_DIM), dtype=np.float32)
+            grown[:self.count] = self.vectors[:self.count]
+            self.vectors = grown
+        self.vectors[self.count] = vector
+        self.messages.append((role, content))
+        self.count += 1
+
+    def search(self, query: "np.ndarray", k: int, exclude_recent: int, min_score: float) -> List[Tuple[str, str]]:
+        """Top-k messages by cosine similarity, skipping the newest `exclude_recent`, oldest first."""
+        limit = self.count - exclude_recent
+        if limit <= 0 or k <= 0:
+            return []
+        scores = self.vectors[:limit] @ query
+        # Threshold first: usually only a handful of messages qualify, so the partition is tiny
+        top = np.flatnonzero(scores >= min_score)
+        if len(top) > k:
+            top = top[np.argpartition(-scores[top], k - 1)[:k]]
+        # Present recalled messages in conversation order
+        return [self.messages[i] for i in np.sort(top)]
+
+
+_indexes: "OrderedDict[int, _UserIndex]" = OrderedDict()
+_load_locks = {}
+
+
+def _paths(user_id: int) -> Tuple[str, str]:
+    base = os.path.join(RETRIEVAL_INDEX_DIR, str(user_id))
+    return f"{base}.f32", f"{base}.jsonl"
+
+
+def _load_from_disk(user_id: int) -> Optional[Tuple["np.ndarray", List[Tuple[str, str]]]]:
+    vectors_path, messages_path = _paths(user_id)
+    if not (os.path.exists(vectors_path) and os.path.exists(messages_path)):
+        return None
+    vectors = np.fromfile(vectors_path, dtype=np.float32)
+    vectors = vectors[:len(vectors) - len(vectors) % RETRIEVAL_DIM].reshape(-1, RETRIEVAL_DIM)
+    with open(messages_path, "r", encoding="utf-8") as f:
+        messages = [tuple(json.loads(line)) for line in f if line.strip()]
+    # A crash between the two appends can leave them one entry apart; keep the common prefix
+    count = min(len(vectors), len(messages))
+    return vectors[:count], messages[:count]
+
+
+def _append_to_disk(user_id: int, vectors: "np.ndarray", messages: List[Tuple[str, str]], truncate: bool = False):
+    os.makedirs(RETRIEVAL_INDEX_DIR, exist_ok=True)
+    vectors_path, messages_path = _paths(user_id)
+    mode = "wb" if truncate else "ab"
+    with open(vectors_path, mode) as f:
+        f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+    with open(messages_path, mode) as f:
+        f.write("".join(json.dumps([role, content]) + "\n" for role, content in messages).encode("utf-8"))
+
+
+def _delete_from_disk(user_id: int):
+    for path in _paths(user_id):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+async def _get_index(user_id: int) -> _UserIndex:
+    """Returns the user's index, loading it from disk (or bootstrapping it from the database) on first use."""
+    index = _indexes.get(user_id)
+    if index is not None:
+        _indexes.move_to_end(user_id)
+        return index
+
+    lock = _load_locks.setdefault(user_id, asyncio.Lock())
+    async with lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            loop = asyncio.get_running_loop()
+            loaded = await loop.run_in_executor(_io_executor, _load_from_disk, user_id)
+            if loaded is None:
+                messages = await db_utils.get_last_n_messages(user_id, db_utils.MESSAGE_HARD_LIMIT)
+                vectors = np.array([embed(content) for _, content in messages], dtype=np.float32).reshape(-1, RETRIEVAL_DIM)
+                await loop.run_in_executor(_io_executor, _append_to_disk, user_id, vectors, messages, True)
+                loaded = (vectors, messages)
+            index = _UserIndex(*loaded)
+            _indexes[user_id] = index
+            while len(_indexes) > RETRIEVAL_MAX_USERS:
+                _indexes.popitem(last=False)
+    _load_locks.pop(user_id, None)
+    return index
+
+
+async def index_message(user_id: int, role: str, content: str):
+    """Embeds a newly stored message and appends it to the user's index and on-disk files."""
+    if not RETRIEVAL_ENABLED:
+        return
+    try:
+        index = await _get_index(user_id)
+        vector = embed(content)
+        index.append(vector, role, content)
+        asyncio.get_running_loop().run_in_executor(
+            _io_executor, _append_to_disk, user_id, vector[None, :], [(role, content)]
+        )
+    except Exception as e:
+        logger.error(f"Failed to index message for user {user_id}: {e}", exc_info=True)
+
+
+@metrics.timed("retrieval.search")
+async def search(user_id: int, query: str, k: int = RETRIEVAL_TOP_K, exclude_recent: int = 0) -> List[Tuple[str, str]]:
+    """
+    Returns up to k past (role, content) messages most relevant to the query, ignoring the
+    newest `exclude_recent` messages (already part of the prompt).
+    """
+    if not RETRIEVAL_ENABLED:
+        return []
+    try:
+        index = await _get_index(user_id)
+        return index.search(embed(query), k, exclude_recent, RETRIEVAL_MIN_SCORE)
+    except Exception as e:
+        logger.error(f"Retrieval failed for user {user_id}: {e}", exc_info=True)
+        return []
+
+
+async def clear(user_id: int):
+    """Drops a user's index from memory and disk."""
+    if not RETRIEVAL_ENABLED:
+        return
+    _indexes.pop(user_id, None)
+    await asyncio.get_running_loop().run_in_executor(_io_executor, _delete_from_disk, user_id)
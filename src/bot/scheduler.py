@@ -1,14 +1,19 @@
 # src/bot/scheduler.py
+import asyncio
 import logging
 import os
-from datetime import datetime
+import random
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Set, Tuple
 import pytz
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from telegram import Bot
 
 from database import db_utils
+from database.jobstore import BackendJobStore
+from bot import access, memory, metrics, outbound, summarizer
 from bot.personas import generate_ping
 
 from bot.utils import send_to_alexa
@@ -19,123 +24,324 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # --- Environment Variables ---
-db_url_raw = os.getenv("DATABASE_URL")
-if not db_url_raw:
-    logger.warning("DATABASE_URL environment variable not set. Scheduler will use memory job store.")
-    DATABASE_URL = None
-else:
-    # Replace asyncpg with psycopg2 for SQLAlchemy compatibility
-    DATABASE_URL = db_url_raw.replace("asyncpg", "psycopg2")
-
-OWNER_ID_STR = os.getenv("OWNER_TELEGRAM_ID")
-OWNER_ID = int(OWNER_ID_STR) if OWNER_ID_STR else 0
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
 # --- Scheduler Setup ---
-jobstores = {
-    'default': SQLAlchemyJobStore(url=DATABASE_URL) if DATABASE_URL else None
-}
-# Filter out None values, so APScheduler falls back to MemoryJobStore if DATABASE_URL is not set
-jobstores = {k: v for k, v in jobstores.items() if v is not None}
+# Jobs persist through the configured storage backend, written behind from memory
+job_store = BackendJobStore()
+scheduler = AsyncIOScheduler(jobstores={'default': job_store}, timezone=os.getenv("TIMEZONE", "UTC"))
 
-scheduler = AsyncIOScheduler(jobstores=jobstores, timezone=os.getenv("TIMEZONE", "UTC"))
+async def start():
+    """Loads the persisted jobs, then starts the scheduler."""
+    if scheduler.running:
+        logger.info("Scheduler was already running.")
+        return
+    # Per-user jobs from before ticks have incompatible arguments; drop them before they can fire
+    await job_store.load(discard=LEGACY_PING_JOB.fullmatch)
+    scheduler.start()
+    logger.info("Scheduler started.")
+
+async def shutdown():
+    """Stops the scheduler and writes any job changes still queued."""
+    if scheduler.running:
+        scheduler.shutdown()
+        logger.info("Scheduler shut down.")
+    await job_store.close()
+
+# --- Ping Fan-Out ---
+# Users whose pings share a cron expression and timezone fire on the same tick and are
+# served by one job. Membership lives in memory and is rebuilt from registered users'
+# settings on sync, so moving a single user between ticks is a pair of dict lookups.
+PING_CONCURRENCY = int(os.getenv("PING_CONCURRENCY", 16))
+TICK_JOB_PREFIX = "ping_tick:"
+LEGACY_PING_JOB = re.compile(r"ping_\d+")  # Per-user jobs from before ticks; ids are ping_<user_id>
+
+_tick_members: Dict[str, Set[int]] = {}
+_user_tick: Dict[int, str] = {}
+_synced = False
+_sync_lock: Optional[asyncio.Lock] = None
+_ping_semaphore: Optional[asyncio.Semaphore] = None
+_bot: Optional[Bot] = None
+
+# --- Ping Pre-Generation ---
+# Pings are generated up to PING_PREFETCH_LEAD seconds before their tick and cached per
+# (user, fire time), so the tick itself only has to send. An entry is discarded if the
+# user's history changed after it was generated.
+PING_PREFETCH_LEAD = float(os.getenv("PING_PREFETCH_LEAD", 300))  # Seconds; 0 disables
+PING_PREFETCH_INTERVAL = 60
+PREFETCH_JOB_ID = "ping_prefetch"
+
+_ping_cache: Dict[Tuple[int, datetime], Tuple[str, int]] = {}
+_prefetching: Dict[Tuple[int, datetime], asyncio.Task] = {}
+
+def set_bot(bot: Bot):
+    """Shares the application's Bot so every ping reuses one HTTP connection pool."""
+    global _bot
+    _bot = bot
+
+def get_bot() -> Bot:
+    global _bot
+    if _bot is None:
+        _bot = Bot(token=TELEGRAM_TOKEN)
+    return _bot
 
-async def send_ping(bot_token: str, user_id: int):
-    """The job function that sends a scheduled message."""
+def _cron_for(frequency_hours: float) -> Tuple[str, str]:
+    """Returns the (hour, minute) cron fields for a ping frequency, respecting the DND period (00:00-06:00)."""
+    # Use a safer check for floating point numbers
+    if frequency_hours < 1: # Handles 2 minutes (0.03) and any other fractional hour
+        return "*", "*/2"
+    # The "Do Not Disturb" period is from 00:00 to 05:59. Pings can start at 06:00.
+    # The active period is from 07:00 to 22:59.
+    if frequency_hours == 24:
+        # For a 24-hour frequency, just ping once a day at the start of the active window.
+        return "7", "0"
+    return f"7-22/{int(frequency_hours)}", "0"
+
+def _tick_key(settings: Dict[str, Any]) -> str:
+    frequency_hours = settings.get('ping_frequency_hours') or db_utils.SETTING_DEFAULTS['ping_frequency_hours']
+    timezone = settings.get('timezone') or db_utils.SETTING_DEFAULTS['timezone']
+    hour_cron, minute_cron = _cron_for(frequency_hours)
+    return f"{hour_cron}|{minute_cron}|{timezone}"
+
+def _ensure_tick_job(tick_key: str):
+    job_id = TICK_JOB_PREFIX + tick_key
+    if scheduler.get_job(job_id) is not None:
+        return
+    hour_cron, minute_cron, timezone = tick_key.split("|")
+    scheduler.add_job(
+        send_ping_tick,
+        'cron',
+        hour=hour_cron,
+        minute=minute_cron,
+        timezone=pytz.timezone(timezone),
+        id=job_id,
+        args=[tick_key],
+        replace_existing=True,
+        misfire_grace_time=3600  # If the bot was offline, run jobs that are up to 1 hour late
+    )
+    logger.info(f"Scheduled ping tick '{tick_key}' (hour='{hour_cron}', minute='{minute_cron}').")
+
+def _leave_tick(user_id: int):
+    """Takes a user off their tick, removing the tick job if they were its last member."""
+    old_key = _user_tick.pop(user_id, None)
+    if old_key is None:
+        return
+    members = _tick_members[old_key]
+    members.discard(user_id)
+    if not members:
+        del _tick_members[old_key]
+        job_id = TICK_JOB_PREFIX + old_key
+        if scheduler.get_job(job_id) is not None:
+            scheduler.remove_job(job_id)
+            logger.info(f"Removed empty ping tick '{old_key}'.")
+
+def _assign_user(user_id: int, tick_key: str):
+    """Moves a user onto a tick, creating or removing tick jobs as groups fill and empty."""
+    if _user_tick.get(user_id) == tick_key:
+        return
+    _leave_tick(user_id)
+    _user_tick[user_id] = tick_key
+    _tick_members.setdefault(tick_key, set()).add(user_id)
+    _ensure_tick_job(tick_key)
+
+def _fire_time(moment: datetime) -> datetime:
+    """Normalizes a tick time to a cache key: UTC, truncated to the minute the cron fires on."""
+    return moment.astimezone(pytz.utc).replace(second=0, microsecond=0)
+
+async def _generate_ping_message(user_id: int) -> str:
+    current_persona = await db_utils.get_user_setting(user_id, 'persona')
+    # Fetch conversation history to make the ping context-aware
+    summary, history = await memory.get_context(user_id, n=50)
+    return await generate_ping(current_persona, history, summary) # Pass history to the generator
+
+async def _take_prefetched(user_id: int, fire_time: datetime) -> Optional[str]:
+    """Returns the pre-generated ping for this tick if one exists and is still current."""
+    key = (user_id, fire_time)
+    task = _prefetching.get(key)
+    if task is not None:
+        # Generation already under way: finishing it beats starting over. wait() neither
+        # raises if the task is cancelled by a reschedule nor cancels it if this tick is.
+        await asyncio.wait([task])
+    cached = _ping_cache.pop(key, None)
+    if cached is None:
+        return None
+    message, version = cached
+    if version != memory.history_version(user_id):
+        logger.info(f"Discarding pre-generated ping for user {user_id}: new messages arrived.")
+        return None
+    return message
+
+@metrics.traced("send_ping")
+async def send_ping(user_id: int, fire_time: Optional[datetime] = None):
+    """Sends one user's scheduled message, using the pre-generated one for `fire_time` when valid."""
     try:
-        bot = Bot(token=bot_token)
-        current_persona = await db_utils.get_user_setting(user_id, 'persona')
-        # Fetch conversation history to make the ping context-aware
-        history = await db_utils.get_last_n_messages(user_id, n=50)
-        message = await generate_ping(current_persona, history) # Pass history to the generator
+        message = await _take_prefetched(user_id, fire_time) if fire_time else None
+        if message is None:
+            message = await _generate_ping_message(user_id)
 
         # Now, send the same message to Alexa to be read aloud
         send_to_alexa(f"Elon says: {message}") 
 
-        await bot.send_message(chat_id=user_id, text=message)
+        # Queued behind interactive replies and rate-limited alongside them
+        await outbound.send(
+            user_id, lambda: get_bot().send_message(chat_id=user_id, text=message), priority=outbound.SCHEDULED
+        )
         # Also, save the bot's ping to memory so it knows it just sent it
-        await db_utils.add_message(user_id, 'bot', message)
+        await memory.add_message(user_id, 'bot', message)
         logger.info(f"Sent scheduled ping to user {user_id} at {datetime.now()}")
     except Exception as e:
         logger.error(f"Failed to send ping to {user_id}: {e}", exc_info=True)
 
+def _get_ping_semaphore() -> asyncio.Semaphore:
+    global _ping_semaphore
+    if _ping_semaphore is None:
+        _ping_semaphore = asyncio.Semaphore(PING_CONCURRENCY)
+    return _ping_semaphore
+
+async def send_ping_tick(tick_key: str):
+    """The job function for a tick: pings every member concurrently, bounded by PING_CONCURRENCY."""
+    if not _synced:
+        # A persisted tick can fire on startup before membership has been loaded
+        await sync_and_reschedule_jobs()
+    fire_time = _fire_time(datetime.now(pytz.utc))
+
+    async def bounded_ping(user_id: int):
+        async with _get_ping_semaphore():
+            await send_ping(user_id, fire_time)
+
+    members = list(_tick_members.get(tick_key, ()))
+    logger.info(f"Ping tick '{tick_key}' firing for {len(members)} user(s).")
+    await asyncio.gather(*(bounded_ping(user_id) for user_id in members))
+
+async def _prefetch_ping(user_id: int, fire_time: datetime, delay: float):
+    key = (user_id, fire_time)
+    try:
+        await asyncio.sleep(delay)
+        # Not under the tick semaphore: a firing tick may be waiting on this task while holding it.
+        # The jittered start and llm_client's own limit keep prefetch load smooth.
+        version = memory.history_version(user_id)
+        message = await _generate_ping_message(user_id)
+        # Only keep it if nothing was said while it was being generated
+        if version == memory.history_version(user_id):
+            _ping_cache[key] = (message, version)
+    except Exception as e:
+        logger.error(f"Failed to pre-generate ping for {user_id}: {e}", exc_info=True)
+    finally:
+        # A reschedule may have dropped this task and started another for the same tick
+        if _prefetching.get(key) is asyncio.current_task():
+            del _prefetching[key]
+
+async def prefetch_pings():
+    """Periodic job: starts generating pings for ticks due within PING_PREFETCH_LEAD seconds."""
+    now = datetime.now(pytz.utc)
+    # Forget entries for ticks that have come and gone without using them
+    horizon = _fire_time(now) - timedelta(seconds=PING_PREFETCH_LEAD)
+    for key in [key for key in _ping_cache if key[1] < horizon]:
+        del _ping_cache[key]
+
+    for tick_key, members in _tick_members.items():
+        job = scheduler.get_job(TICK_JOB_PREFIX + tick_key)
+        if job is None or job.next_run_time is None:
+            continue
+        until_fire = (job.next_run_time - now).total_seconds()
+        if not 0 < until_fire <= PING_PREFETCH_LEAD:
+            continue
+        fire_time = _fire_time(job.next_run_time)
+        for user_id in members:
+            key = (user_id, fire_time)
+            if key in _ping_cache or key in _prefetching:
+                continue
+            # Spread generation over the first half of the remaining lead so it lands before the tick
+            _prefetching[key] = asyncio.create_task(
+                _prefetch_ping(user_id, fire_time, random.uniform(0, until_fire / 2))
+            )
+
+def _ensure_prefetch_job():
+    if PING_PREFETCH_LEAD <= 0 or scheduler.get_job(PREFETCH_JOB_ID) is not None:
+        return
+    scheduler.add_job(
+        prefetch_pings,
+        'interval',
+        seconds=PING_PREFETCH_INTERVAL,
+        id=PREFETCH_JOB_ID,
+        replace_existing=True,
+        coalesce=True,
+    )
+
+def _discard_prefetched(user_id: int):
+    """Drops a user's pre-generated pings and stops any still being generated."""
+    for key in [key for key in _ping_cache if key[0] == user_id]:
+        del _ping_cache[key]
+    for key in [key for key in _prefetching if key[0] == user_id]:
+        _prefetching.pop(key).cancel()
+
+async def reschedule_user(user_id: int):
+    """Re-reads one user's settings and moves them to the matching tick."""
+    settings = await db_utils.get_user_settings(user_id)
+    # Pings generated under the old settings are not carried over to the new schedule
+    _discard_prefetched(user_id)
+    _assign_user(user_id, _tick_key(settings))
+
+def unschedule_user(user_id: int):
+    """Stops a user's pings, e.g. when their access is revoked."""
+    _discard_prefetched(user_id)
+    _leave_tick(user_id)
+
 async def sync_and_reschedule_jobs():
     """
-    Clears ALL existing jobs for the owner and schedules a new one based on the
-    ping frequency from the database, respecting the DND period (00:00-06:00).
+    Rebuilds tick membership for every registered user with a settings row and brings the
+    scheduled tick jobs in line with it, respecting the DND period (00:00-06:00).
     """
-    if not OWNER_ID or not TELEGRAM_TOKEN:
-        logger.warning("OWNER_TELEGRAM_ID or TELEGRAM_BOT_TOKEN not set. Scheduler cannot run.")
+    global _synced, _sync_lock
+    if not TELEGRAM_TOKEN:
+        logger.warning("TELEGRAM_BOT_TOKEN not set. Scheduler cannot run.")
         return
+    if _sync_lock is None:
+        _sync_lock = asyncio.Lock()
 
-    logger.info("Syncing and rescheduling jobs...")
-
-    # --- Clear all previous jobs for the owner ---
-    # This is crucial to remove any lingering jobs from the old format.
-    removed_count = 0
-    for job in scheduler.get_jobs():
-        # The user_id is passed as the second argument to send_ping
-        if job.args and len(job.args) > 1 and job.args[1] == OWNER_ID:
-            job.remove()
-            removed_count += 1
-            logger.info(f"Removed existing job: {job.id}")
-    
-    if removed_count > 0:
-        logger.info(f"Total of {removed_count} old jobs removed for user {OWNER_ID}.")
-    else:
-        logger.info(f"No existing jobs found for user {OWNER_ID}.")
-
-
-    # --- Schedule the new single job ---
-    job_id = f"ping_{OWNER_ID}"
-    
-    # Fetch new schedule settings
-    frequency_hours = await db_utils.get_user_setting(OWNER_ID, 'ping_frequency_hours')
-    user_timezone_str = await db_utils.get_user_setting(OWNER_ID, 'timezone')
-    
-    if frequency_hours is None or user_timezone_str is None:
-        logger.error(f"Could not retrieve schedule settings for user {OWNER_ID}. Aborting reschedule.")
-        return
+    async with _sync_lock:
+        logger.info("Syncing and rescheduling jobs...")
+        all_settings = await db_utils.get_all_user_settings()
 
-    # --- Generate Cron Expression ---
-    hour_cron = None
-    minute_cron = '0'
+        _tick_members.clear()
+        _user_tick.clear()
+        for settings in all_settings:
+            # Settings outlive revoked access; only registered users are pinged
+            if not access.is_allowed(settings['user_id']):
+                continue
+            tick_key = _tick_key(settings)
+            _user_tick[settings['user_id']] = tick_key
+            _tick_members.setdefault(tick_key, set()).add(settings['user_id'])
 
-    # Use a safer check for floating point numbers
-    if frequency_hours < 1: # Handles 2 minutes (0.03) and any other fractional hour
-        minute_cron = "*/2"
-        hour_cron = "*" # Every hour
-        logger.info(
-            f"Scheduling job for user {OWNER_ID} with 2-minute frequency for testing."
-        )
-    else:
-        # The "Do Not Disturb" period is from 00:00 to 05:59. Pings can start at 06:00.
-        # The active period is from 07:00 to 22:59.
-        hour_cron = f"7-22/{int(frequency_hours)}"
-        if frequency_hours == 24:
-            # For a 24-hour frequency, just ping once a day at the start of the active window.
-            hour_cron = "7"
-        logger.info(
-            f"Scheduling job for user {OWNER_ID} with frequency {int(frequency_hours)} hours. "
-            f"Cron hour expression: '{hour_cron}' in timezone {user_timezone_str}"
-        )
+        # One full scan on sync: drop ticks nobody is on any more
+        removed_count = 0
+        for job in scheduler.get_jobs():
+            if job.id.startswith(TICK_JOB_PREFIX) and job.id[len(TICK_JOB_PREFIX):] not in _tick_members:
+                job.remove()
+                removed_count += 1
+        if removed_count > 0:
+            logger.info(f"Removed {removed_count} stale ping job(s).")
 
+        for tick_key in _tick_members:
+            _ensure_tick_job(tick_key)
+        _ensure_prefetch_job()
+        _synced = True
+
+    logger.info(f"Scheduled pings for {len(_user_tick)} user(s) across {len(_tick_members)} tick(s).")
+
+def schedule_maintenance_jobs():
+    """Schedules background upkeep that runs during the do-not-disturb window."""
+    if not summarizer.SUMMARIZATION_ENABLED:
+        logger.info("Conversation summarization disabled; no maintenance jobs scheduled.")
+        return
 
     scheduler.add_job(
-        send_ping,
+        summarizer.summarize_all_users,
         'cron',
-        hour=hour_cron,
-        minute=minute_cron,
-        timezone=pytz.timezone(user_timezone_str),
-        id=job_id,
-        args=[TELEGRAM_TOKEN, OWNER_ID],
+        hour=summarizer.SUMMARY_HOUR,
+        minute=0,
+        id="summarize_conversations",
         replace_existing=True,
-        misfire_grace_time=3600  # If the bot was offline, run jobs that are up to 1 hour late
+        misfire_grace_time=3 * 3600  # Still worth running if we come up later in the night
     )
-
-    if scheduler.get_jobs():
-        logger.info("Current scheduled jobs:")
-        for job in scheduler.get_jobs():
-            logger.info(f"- Job ID: {job.id}, Trigger: {job.trigger}, Next run: {job.next_run_time}")
-    else:
-        logger.warning("No jobs scheduled after sync!")
+    logger.info(f"Conversation summarization scheduled daily at {summarizer.SUMMARY_HOUR:02d}:00.")
@@ -0,0 +1,56 @@
+-- SQLite schema for telegram-persona-bot (the embedded storage backend)
+
+-- Who may use the bot; loaded into an in-memory allowlist at startup and after every change
+CREATE TABLE IF NOT EXISTS users (
+user_id INTEGER PRIMARY KEY,
+role TEXT NOT NULL DEFAULT 'member', -- 'admin' or 'member'
+invited_by INTEGER,
+created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS settings (
+user_id INTEGER PRIMARY KEY,
+persona TEXT NOT NULL DEFAULT 'accountability',
+timezone TEXT NOT NULL DEFAULT 'UTC',
+ping_frequency_hours REAL NOT NULL DEFAULT 1
+);
+
+-- AUTOINCREMENT keeps ids increasing after deletes, as summaries track the newest id they cover
+CREATE TABLE IF NOT EXISTS messages (
+id INTEGER PRIMARY KEY AUTOINCREMENT,
+user_id INTEGER NOT NULL,
+role TEXT NOT NULL, -- 'user' or 'bot'
+content TEXT NOT NULL,
+timestamp TEXT NOT NULL -- ISO 8601 UTC with microseconds, so text order is time order
+);
+
+-- Index for faster message retrieval
+CREATE INDEX IF NOT EXISTS idx_messages_user_id_timestamp ON messages (user_id, timestamp);
+
+-- Full-text index over the archive (all of its month tables), written in the same transaction
+-- as each archived message; porter stemming matches the english configuration used on Postgres.
+-- user_id is indexed too, so a query intersects the user's posting list instead of reading every match's row.
+CREATE VIRTUAL TABLE IF NOT EXISTS message_search USING fts5(
+content,
+user_id,
+role UNINDEXED,
+timestamp UNINDEXED,
+tokenize = 'porter unicode61'
+);
+
+-- Rolling per-user summary of messages that have been folded out of the raw history
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+user_id INTEGER PRIMARY KEY,
+summary TEXT NOT NULL,
+last_message_id INTEGER NOT NULL, -- newest messages.id covered by the summary
+updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Scheduled jobs (APScheduler state), read once at startup in next_run_time order
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+id TEXT PRIMARY KEY,
+next_run_time REAL, -- UTC timestamp; NULL while paused
+job_state BLOB NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_next_run_time ON scheduled_jobs (next_run_time);
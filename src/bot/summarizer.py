@@ -0,0 +1,50 @@
+# src/bot/summarizer.py
+import logging
+import os
+
+from database import db_utils
+from bot import memory, personas
+
+logger = logging.getLogger(__name__)
+
+# --- Summarization Settings ---
+# Messages older than the newest SUMMARY_KEEP_RECENT are folded into the running summary.
+SUMMARY_KEEP_RECENT = int(os.getenv("SUMMARY_KEEP_RECENT", 20))
+# Runs inside the 00:00-06:00 do-not-disturb window, when no pings are sent.
+SUMMARY_HOUR = int(os.getenv("SUMMARY_HOUR", 3))
+SUMMARIZATION_ENABLED = personas.USE_LLM and os.getenv("SUMMARIZATION_ENABLED", "true").lower() == "true"
+
+
+async def summarize_user(user_id: int) -> bool:
+    """Folds a user's unsummarized older messages into their summary. Returns True if it changed."""
+    previous_summary, rows = await db_utils.get_messages_to_summarize(user_id, SUMMARY_KEEP_RECENT)
+    if not rows:
+        return False
+
+    summary = await personas.generate_summary(previous_summary, [(role, content) for _, role, content in rows])
+    if summary is None:
+        logger.warning(f"Summary generation failed for user {user_id}; keeping the previous summary.")
+        return False
+
+    await db_utils.save_summary(user_id, summary, rows[-1][0])
+    # Reload history and summary on next access so prompts use the new cutoff
+    memory.invalidate(user_id)
+    logger.info(f"Folded {len(rows)} messages into the summary for user {user_id}.")
+    return True
+
+
+async def summarize_all_users():
+    """Scheduled job: updates the running summary for every user with enough new history."""
+    if not SUMMARIZATION_ENABLED:
+        return
+    try:
+        user_ids = await db_utils.get_users_to_summarize(SUMMARY_KEEP_RECENT)
+    except Exception as e:
+        logger.error(f"Could not list users to summarize: {e}", exc_info=True)
+        return
+
+    for user_id in user_ids:
+        try:
+            await summarize_user(user_id)
+        except Exception as e:
+            logger.error(f"Failed to summarize history for user {user_id}: {e}", exc_info=True)
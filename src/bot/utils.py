@@ -1,31 +1,150 @@
 # src/bot/utils.py
+import asyncio
 import logging
 import os
-import requests
-import urllib.parse
+import re
+import time
+from typing import List, Optional, Tuple
+
+import httpx
+
+from bot import metrics
 
 logger = logging.getLogger(__name__)
 
-def send_to_alexa(message_text: str):
-    """
-    Sends a message to your Alexa device via Voice Monkey.
-    """
-    token = os.getenv("VOICE_MONKEY_TOKEN")
-    device_id = os.getenv("VOICE_MONKEY_DEVICE_ID")
+# --- Alexa Announcements ---
+# Announcements are queued and sent by a background worker so replies and pings never
+# wait on Voice Monkey.
+VOICE_MONKEY_URL = "https://api-v2.voicemonkey.io/announcement"
+ALEXA_QUEUE_MAX_SIZE = int(os.getenv("ALEXA_QUEUE_MAX_SIZE", 32))
+ALEXA_TIMEOUT = float(os.getenv("ALEXA_TIMEOUT", 5))  # Seconds per request
+# Long replies are split at sentence boundaries into pieces Alexa reads comfortably
+ALEXA_CHUNK_CHARS = int(os.getenv("ALEXA_CHUNK_CHARS", 400))
+# Announcements arriving within this many seconds of each other are sent together
+ALEXA_COALESCE_WINDOW = float(os.getenv("ALEXA_COALESCE_WINDOW", 2))
+# Announcements still unsent after this long are dropped rather than read out late
+ALEXA_MAX_AGE = float(os.getenv("ALEXA_MAX_AGE", 60))
 
-    if not token or not device_id:
-        logger.warning("Voice Monkey token or device ID not set in environment variables.")
-        return
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+")
+
+_queue: Optional[asyncio.Queue] = None
+_worker: Optional[asyncio.Task] = None
+_client: Optional[httpx.AsyncClient] = None
 
-    # URL-encode the message to handle special characters and spaces
-    encoded_message = urllib.parse.quote(message_text)
 
-    # Construct the full API URL
-    api_url = f"https://api-v2.voicemonkey.io/announcement?token={token}&device={device_id}&text={encoded_message}"
+def _credentials():
+    return os.getenv("VOICE_MONKEY_TOKEN"), os.getenv("VOICE_MONKEY_DEVICE_ID")
 
+
+def chunk_for_speech(text: str, limit: int = ALEXA_CHUNK_CHARS) -> List[str]:
+    """Splits text into pieces of at most `limit` characters, preferring sentence, then word, boundaries."""
+    chunks = []
+    current = ""
+    for sentence in _SENTENCE_END_RE.split(text.strip()):
+        while len(sentence) > limit:
+            # A single overlong sentence: cut at the last space that fits
+            cut = sentence.rfind(" ", 0, limit)
+            cut = cut if cut > 0 else limit
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + 1 + len(sentence) > limit:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return [chunk for chunk in chunks if chunk]
+
+
+@metrics.timed("alexa.announce")
+async def _announce(text: str):
+    token, device_id = _credentials()
     try:
-        response = requests.get(api_url)
+        response = await _client.get(VOICE_MONKEY_URL, params={'token': token, 'device': device_id, 'text': text})
         response.raise_for_status()
         logger.info("Successfully sent message to Alexa via Voice Monkey.")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error sending to Voice Monkey: {e}")
\ No newline at end of file
+    except httpx.HTTPError as e:
+        logger.error(f"Error sending to Voice Monkey: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected error sending to Voice Monkey: {e}", exc_info=True)
+
+
+async def _announce_batch(batch: List[Tuple[float, str]]):
+    now = time.monotonic()
+    texts = []
+    for enqueued_at, text in batch:
+        metrics.observe(metrics.QUEUE_WAIT_SECONDS, now - enqueued_at, queue="alexa")
+        if now - enqueued_at > ALEXA_MAX_AGE:
+            logger.info("Dropping a stale Alexa announcement.")
+        elif not texts or texts[-1] != text:
+            texts.append(text)
+
+    for chunk in chunk_for_speech(" ".join(texts)):
+        await _announce(chunk)
+
+
+async def _announcement_worker():
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _queue.get()]
+        # Gather whatever else arrives shortly after, so a burst becomes one announcement
+        deadline = loop.time() + ALEXA_COALESCE_WINDOW
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                batch.append(await asyncio.wait_for(_queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        try:
+            await _announce_batch(batch)
+        except Exception as e:
+            # One bad batch must not stop the worker; later announcements still go out
+            logger.error(f"Dropping {len(batch)} Alexa announcement(s) after an error: {e}", exc_info=True)
+
+
+def start_announcer():
+    """Starts the background announcement worker on the running loop."""
+    global _queue, _worker, _client
+    if _worker is not None:
+        return
+    _queue = asyncio.Queue(maxsize=ALEXA_QUEUE_MAX_SIZE)
+    _client = httpx.AsyncClient(
+        timeout=httpx.Timeout(ALEXA_TIMEOUT),
+        limits=httpx.Limits(max_connections=2, max_keepalive_connections=1),
+    )
+    _worker = asyncio.create_task(_announcement_worker())
+
+
+async def stop_announcer():
+    """Stops the worker, discarding pending announcements, and closes its HTTP client."""
+    global _worker, _client
+    if _worker is None:
+        return
+    _worker.cancel()
+    await asyncio.gather(_worker, return_exceptions=True)
+    await _client.aclose()
+    _worker = _client = None
+
+
+def send_to_alexa(message_text: str):
+    """
+    Queues a message to be announced on your Alexa device via Voice Monkey.
+    Returns immediately; the announcement is sent by the background worker.
+    """
+    token, device_id = _credentials()
+    if not token or not device_id:
+        logger.warning("Voice Monkey token or device ID not set in environment variables.")
+        return
+    if _worker is None:
+        logger.warning("Alexa announcer is not running; dropping announcement.")
+        return
+
+    if _queue.full():
+        # Keep the freshest announcements; the oldest would be the first to go stale anyway
+        _queue.get_nowait()
+        logger.info("Alexa announcement queue full; dropped the oldest entry.")
+    _queue.put_nowait((time.monotonic(), message_text))
@@ -0,0 +1,168 @@
+# src/bot/watchdog.py
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from bot import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- Watchdog Settings ---
+# A heartbeat callback on the event loop and a thread watching it: when the loop stops
+# beating for longer than the threshold, the loop thread's stack is logged mid-stall.
+WATCHDOG_ENABLED = os.getenv("WATCHDOG_ENABLED", "true").lower() == "true"
+WATCHDOG_INTERVAL = float(os.getenv("WATCHDOG_INTERVAL", 0.1))  # Seconds between heartbeats
+WATCHDOG_THRESHOLD = float(os.getenv("WATCHDOG_THRESHOLD", 0.5))  # Loop lag reported as a stall
+
+# --- Profiler Settings ---
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.01))  # Seconds between stack samples
+PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+
+LOOP_LAG_SECONDS = "bot_loop_lag_seconds"
+LOOP_STALLS_TOTAL = "bot_loop_stalls_total"
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread_id: Optional[int] = None
+_last_beat = 0.0
+_heartbeat_handle: Optional[asyncio.TimerHandle] = None
+_watch_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def _loop_frame():
+    return sys._current_frames().get(_loop_thread_id)
+
+
+def _describe_current_task() -> str:
+    """Names the task the loop is running, e.g. a chat worker job or a scheduler job."""
+    try:
+        task = asyncio.current_task(_loop)
+    except RuntimeError:
+        task = None
+    if task is None:
+        return "no task (loop callback)"
+    coro = task.get_coro()
+    return f"task '{task.get_name()}' running {getattr(coro, '__qualname__', coro)}"
+
+
+def _heartbeat():
+    global _last_beat, _heartbeat_handle
+    now = time.monotonic()
+    if _last_beat:
+        metrics.observe(LOOP_LAG_SECONDS, max(0.0, now - _last_beat - WATCHDOG_INTERVAL))
+    _last_beat = now
+    _heartbeat_handle = _loop.call_later(WATCHDOG_INTERVAL, _heartbeat)
+
+
+def _watch():
+    stalled_since = None
+    while not _stop.wait(WATCHDOG_INTERVAL):
+        lag = time.monotonic() - _last_beat - WATCHDOG_INTERVAL
+        if lag >= WATCHDOG_THRESHOLD and stalled_since is None:
+            stalled_since = _last_beat
+            frame = _loop_frame()
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "(stack unavailable)\n"
+            logger.warning(
+                f"Event loop stalled for {lag:.2f}s in {_describe_current_task()}. Loop thread stack:\n{stack}"
+            )
+            metrics.inc(LOOP_STALLS_TOTAL)
+        elif lag < WATCHDOG_THRESHOLD and stalled_since is not None:
+            logger.warning(f"Event loop recovered after a {_last_beat - stalled_since:.2f}s stall.")
+            stalled_since = None
+
+
+def start():
+    """Starts the heartbeat on the running loop and the watchdog thread."""
+    global _loop, _loop_thread_id, _watch_thread
+    if not WATCHDOG_ENABLED or _watch_thread is not None:
+        return
+    _loop = asyncio.get_running_loop()
+    _loop_thread_id = threading.get_ident()
+    _stop.clear()
+    _heartbeat()
+    _watch_thread = threading.Thread(target=_watch, name="loop-watchdog", daemon=True)
+    _watch_thread.start()
+    logger.info(f"Event loop watchdog started (threshold {WATCHDOG_THRESHOLD}s).")
+
+
+def stop():
+    global _watch_thread, _heartbeat_handle
+    _stop.set()
+    if _heartbeat_handle is not None:
+        _heartbeat_handle.cancel()
+        _heartbeat_handle = None
+    if _watch_thread is not None:
+        _watch_thread.join(timeout=1)
+        _watch_thread = None
+    stop_profiler()
+
+
+# --- Sampling Profiler ---
+class _Profiler(threading.Thread):
+    """Samples the loop thread's stack every PROFILE_INTERVAL seconds into folded-stack counts."""
+
+    def __init__(self, thread_id: int):
+        super().__init__(name="sampling-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.samples: Counter = Counter()
+        self.started_at = time.time()
+        self.halt = threading.Event()
+
+    def run(self):
+        while not self.halt.wait(PROFILE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+
+_profiler: Optional[_Profiler] = None
+
+
+def profiler_running() -> bool:
+    return _profiler is not None
+
+
+def start_profiler() -> bool:
+    """Starts sampling the event loop thread. Returns False if already running."""
+    global _profiler
+    if _profiler is not None:
+        return False
+    thread_id = _loop_thread_id if _loop_thread_id is not None else threading.get_ident()
+    _profiler = _Profiler(thread_id)
+    _profiler.start()
+    logger.info("Sampling profiler started.")
+    return True
+
+
+def stop_profiler() -> Optional[str]:
+    """
+    Stops the profiler and writes its samples in folded-stack format (one `frame;frame count`
+    line per stack, as consumed by flamegraph.pl and speedscope). Returns the file path.
+    """
+    global _profiler
+    if _profiler is None:
+        return None
+    profiler, _profiler = _profiler, None
+    profiler.halt.set()
+    profiler.join(timeout=1)
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"profile-{datetime.fromtimestamp(profiler.started_at):%Y%m%d-%H%M%S}.folded")
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in profiler.samples.most_common():
+            f.write(f"{stack} {count}\n")
+    logger.info(f"Sampling profiler stopped: {sum(profiler.samples.values())} samples written to {path}.")
+    return path
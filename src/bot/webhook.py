@@ -0,0 +1,53 @@
+# src/bot/webhook.py
+import hmac
+import json
+import logging
+import os
+import secrets
+
+from telegram import Update
+from telegram.ext import Application
+
+from bot import http_server
+
+logger = logging.getLogger(__name__)
+
+# --- Webhook Settings ---
+# Setting WEBHOOK_URL (the bot's public base URL) switches from polling to webhooks.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_ENABLED = bool(WEBHOOK_URL)
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+# Telegram echoes this in every webhook request; a random one is used if unset.
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+
+def register(application: Application):
+    """Adds the webhook route, which hands each update to the application's update queue."""
+
+    async def receive_update(request: http_server.Request) -> http_server.Response:
+        secret = request.headers.get(SECRET_HEADER)
+        if secret is None:
+            logger.warning("Rejected webhook request without a secret token.")
+            return http_server.text_response(401, "unauthorized")
+        # As bytes: compare_digest rejects non-ASCII strings, and headers are decoded as latin-1
+        if not hmac.compare_digest(secret.encode("latin-1"), WEBHOOK_SECRET.encode("utf-8")):
+            logger.warning("Rejected webhook request with a wrong secret token.")
+            return http_server.text_response(403, "forbidden")
+        try:
+            update = Update.de_json(json.loads(request.body), application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Rejected malformed webhook update: {e}")
+            return http_server.text_response(400, "bad update")
+        # Acknowledge right away; the application processes the queue in the background
+        application.update_queue.put_nowait(update)
+        return http_server.text_response(200, "ok")
+
+    http_server.route("POST", WEBHOOK_PATH, receive_update)
+
+
+async def set_webhook(application: Application):
+    """Points Telegram at this server's webhook route."""
+    url = WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH
+    await application.bot.set_webhook(url=url, secret_token=WEBHOOK_SECRET, allowed_updates=Update.ALL_TYPES)
+    logger.info(f"Webhook set to {url}.")
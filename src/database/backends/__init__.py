@@ -0,0 +1,181 @@
+# src/database/backends/__init__.py
+"""
+Storage backends behind db_utils. Each one implements StorageBackend for a single engine;
+db_utils keeps the caching, write-behind queue and metrics on top of whichever is configured.
+"""
+import re
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Column defaults of a freshly inserted settings row, matching the table definitions
+COLUMN_DEFAULTS = {'persona': 'accountability', 'timezone': 'UTC', 'ping_frequency_hours': 1.0}
+
+MessageRow = Tuple[int, str, str, datetime]  # (user_id, role, content, timestamp)
+ArchiveRow = Tuple[datetime, str, str]  # (timestamp, role, content)
+JobRow = Tuple[str, Optional[float], bytes]  # (job id, next run as a UTC timestamp or None if paused, pickled state)
+SearchHit = Tuple[datetime, str, str]  # (timestamp, role, snippet with the matched words marked)
+
+# Every backend marks matches in search snippets the same way
+SNIPPET_START, SNIPPET_END, SNIPPET_ELLIPSIS = "«", "»", "…"
+SNIPPET_WORDS = 16
+
+
+def search_terms(query: str) -> List[str]:
+    """The words of a search query, lowercased; punctuation and search operators are ignored."""
+    return re.findall(r"\w+", query.lower())
+
+
+def archive_months(timestamps: Iterable[datetime]) -> Set[date]:
+    """The UTC months (as their first day) the archive partitions for these timestamps cover."""
+    return {moment.astimezone(timezone.utc).date().replace(day=1) for moment in timestamps}
+
+
+def next_month(month: date) -> date:
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+
+class StorageBackend(ABC):
+    """
+    The operations db_utils needs from a store: users, settings, messages, summaries and scheduled
+    jobs. A backend that leaves any of them out fails when it is created.
+    """
+
+    name = "base"
+    # Errors worth retrying a write for (lost connections, a locked database file)
+    transient_errors: Tuple[type, ...] = (OSError,)
+
+    @abstractmethod
+    async def connect(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def close(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def initialize(self, admin_id: Optional[int] = None):
+        """Creates or migrates the schema and, if given, registers admin_id as an admin."""
+        raise NotImplementedError
+
+    # --- Users ---
+    @abstractmethod
+    async def load_users(self) -> Dict[int, str]:
+        """Every registered user and their role."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def save_user(self, user_id: int, role: str, invited_by: Optional[int]):
+        """Registers a user, or changes the role of one already registered."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_user(self, user_id: int) -> bool:
+        """Unregisters a user and returns whether they were registered. Their settings and history stay."""
+        raise NotImplementedError
+
+    # --- Settings ---
+    @abstractmethod
+    async def fetch_settings(self, user_id: int) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def fetch_all_settings(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create_settings(self, user_id: int, defaults: Dict[str, Any]) -> bool:
+        """Inserts a settings row with these values unless the user has one. Returns whether it did."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def upsert_setting(self, user_id: int, column: str, value: Any) -> Dict[str, Any]:
+        """Sets one column, creating the row if needed, and returns the full settings row."""
+        raise NotImplementedError
+
+    # --- Messages ---
+    @abstractmethod
+    async def insert_messages(self, rows: Sequence[MessageRow]):
+        """Adds rows to the recent-history table and, in the same transaction, to the archive."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def last_messages(self, user_id: int, n: int) -> List[Tuple[str, str]]:
+        """The newest n (role, content) pairs, in chronological order."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def trim_messages(self, keep: int, retain_unsummarized: bool, hard_limit: int) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def clear_memory(self, user_id: int):
+        """Deletes a user's messages, summary and archived history, with its search index, together."""
+        raise NotImplementedError
+
+    # --- Message Archive ---
+    @abstractmethod
+    def iter_archive(self, user_id: int, batch_size: int) -> AsyncIterator[List[ArchiveRow]]:
+        """Every archived message of the user, oldest first, in batches of up to batch_size rows."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def search_archive(self, user_id: int, query: str, limit: int, offset: int, max_ranked: int) -> Tuple[int, List[SearchHit]]:
+        """
+        Archived messages of the user containing every word of the query. Up to max_ranked matches
+        are ordered best first (newest first among equals); past that, newest first, as ranking
+        every match of a near-universal word costs more than it tells apart. Returns the total
+        number of matches and the requested page.
+        """
+        raise NotImplementedError
+
+    # --- Conversation Summaries ---
+    @abstractmethod
+    async def summary_state(self, user_id: int) -> Tuple[Optional[str], int]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def users_to_summarize(self, keep_recent: int) -> List[int]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def messages_to_summarize(self, user_id: int, keep_recent: int) -> Tuple[Optional[str], List[Tuple[int, str, str]]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def save_summary(self, user_id: int, summary: str, last_message_id: int):
+        raise NotImplementedError
+
+    # --- Scheduled Jobs ---
+    @abstractmethod
+    async def load_jobs(self) -> List[Tuple[str, bytes]]:
+        """Every persisted (job id, pickled state), soonest next run first."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def write_jobs(self, upserts: Sequence[JobRow], deletes: Sequence[str]):
+        """Inserts or replaces and deletes jobs in one transaction."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_all_jobs(self):
+        raise NotImplementedError
+
+
+def create_backend(kind: str, database_url: Optional[str] = None, database_path: Optional[str] = None) -> StorageBackend:
+    """
+    Builds a backend by name: "postgres" (needs database_url), "sqlite" (a file at
+    database_path) or "memory". Engine modules are imported only when chosen.
+    """
+    if kind == "postgres":
+        if not database_url:
+            raise ValueError("DATABASE_URL environment variable is not set.")
+        from database.backends.postgres import PostgresBackend
+        return PostgresBackend(database_url)
+    if kind == "sqlite":
+        from database.backends.sqlite import SQLiteBackend
+        return SQLiteBackend(database_path)
+    if kind == "memory":
+        from database.backends.memory import MemoryBackend
+        return MemoryBackend()
+    raise ValueError(f"Unknown storage backend: {kind}")
@@ -0,0 +1,169 @@
+# src/database/backends/memory.py
+import bisect
+import itertools
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple
+
+from database.backends import (
+    COLUMN_DEFAULTS, SNIPPET_ELLIPSIS, SNIPPET_END, SNIPPET_START, SNIPPET_WORDS,
+    ArchiveRow, JobRow, MessageRow, SearchHit, StorageBackend, search_terms,
+)
+
+
+def _snippet(content: str, terms: Set[str]) -> str:
+    """A window of words around the first match, with matching words marked."""
+    words = content.split()
+    matched = [bool(terms.intersection(search_terms(word))) for word in words]
+    first = matched.index(True) if True in matched else 0
+    start = max(0, min(first - SNIPPET_WORDS // 4, len(words) - SNIPPET_WORDS))
+    end = start + SNIPPET_WORDS
+    shown = [f"{SNIPPET_START}{word}{SNIPPET_END}" if hit else word for word, hit in zip(words[start:end], matched[start:end])]
+    return (SNIPPET_ELLIPSIS if start > 0 else "") + " ".join(shown) + (SNIPPET_ELLIPSIS if end < len(words) else "")
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Keeps everything in process memory, for tests and benchmarks. Nothing survives a restart;
+    the semantics (ordering, ids, trimming) match the SQL backends.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self.users: Dict[int, Tuple[str, Optional[int]]] = {}  # user_id -> (role, invited_by)
+        self.settings: Dict[int, Dict[str, Any]] = {}
+        # Per user: (timestamp, id, role, content), kept sorted in (timestamp, id) order
+        self.messages: Dict[int, List[Tuple[Any, int, str, str]]] = {}
+        self.summaries: Dict[int, Tuple[str, int]] = {}
+        # Per user, same layout as messages but never trimmed; clear_memory drops it
+        self.archive: Dict[int, List[Tuple[Any, int, str, str]]] = {}
+        self.jobs: Dict[str, Tuple[Optional[float], bytes]] = {}
+        self._message_ids = itertools.count(1)
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def initialize(self, admin_id: Optional[int] = None):
+        if admin_id is not None:
+            await self.save_user(admin_id, 'admin', None)
+
+    # --- Users ---
+    async def load_users(self) -> Dict[int, str]:
+        return {user_id: role for user_id, (role, _) in self.users.items()}
+
+    async def save_user(self, user_id: int, role: str, invited_by: Optional[int]):
+        # Like the SQL upsert, a role change keeps who first invited the user
+        self.users[user_id] = (role, self.users[user_id][1] if user_id in self.users else invited_by)
+
+    async def delete_user(self, user_id: int) -> bool:
+        return self.users.pop(user_id, None) is not None
+
+    # --- Settings ---
+    async def fetch_settings(self, user_id: int) -> Dict[str, Any]:
+        settings = self.settings.get(user_id)
+        return dict(settings) if settings else {}
+
+    async def fetch_all_settings(self) -> List[Dict[str, Any]]:
+        return [{'user_id': user_id, **settings} for user_id, settings in self.settings.items()]
+
+    async def create_settings(self, user_id: int, defaults: Dict[str, Any]) -> bool:
+        if user_id in self.settings:
+            return False
+        self.settings[user_id] = {column: defaults[column] for column in COLUMN_DEFAULTS}
+        return True
+
+    async def upsert_setting(self, user_id: int, column: str, value: Any) -> Dict[str, Any]:
+        settings = self.settings.setdefault(user_id, dict(COLUMN_DEFAULTS))
+        settings[column] = value
+        return dict(settings)
+
+    # --- Messages ---
+    async def insert_messages(self, rows: Sequence[MessageRow]):
+        for user_id, role, content, timestamp in rows:
+            row = (timestamp, next(self._message_ids), role, content)
+            bisect.insort(self.messages.setdefault(user_id, []), row)
+            bisect.insort(self.archive.setdefault(user_id, []), row)
+
+    async def last_messages(self, user_id: int, n: int) -> List[Tuple[str, str]]:
+        rows = self.messages.get(user_id, [])
+        return [(role, content) for _, _, role, content in rows[max(0, len(rows) - n):]]
+
+    async def trim_messages(self, keep: int, retain_unsummarized: bool, hard_limit: int) -> int:
+        removed = 0
+        for user_id, rows in self.messages.items():
+            covered = self.summaries.get(user_id, (None, 0))[1]
+            kept = []
+            for rank, row in enumerate(reversed(rows), start=1):
+                if rank > keep and (not retain_unsummarized or row[1] <= covered or rank > hard_limit):
+                    removed += 1
+                else:
+                    kept.append(row)
+            rows[:] = reversed(kept)
+        return removed
+
+    async def clear_memory(self, user_id: int):
+        self.messages.pop(user_id, None)
+        self.summaries.pop(user_id, None)
+        self.archive.pop(user_id, None)
+
+    # --- Message Archive ---
+    async def iter_archive(self, user_id: int, batch_size: int) -> AsyncIterator[List[ArchiveRow]]:
+        rows = self.archive.get(user_id, [])
+        for start in range(0, len(rows), batch_size):
+            yield [(timestamp, role, content) for timestamp, _, role, content in rows[start:start + batch_size]]
+
+    async def search_archive(self, user_id: int, query: str, limit: int, offset: int, max_ranked: int) -> Tuple[int, List[SearchHit]]:
+        # A scan with exact, unstemmed word matching, ranked by how often the words occur
+        terms = set(search_terms(query))
+        if not terms:
+            return 0, []
+        matches = []
+        for timestamp, message_id, role, content in self.archive.get(user_id, []):
+            words = search_terms(content)
+            if terms.issubset(words):
+                rank = sum(word in terms for word in words)
+                matches.append((rank, timestamp, message_id, role, content))
+        if len(matches) > max_ranked:
+            matches.sort(key=lambda match: match[1:3], reverse=True)
+        else:
+            matches.sort(reverse=True)
+        return len(matches), [
+            (timestamp, role, _snippet(content, terms)) for _, timestamp, _, role, content in matches[offset:offset + limit]
+        ]
+
+    # --- Conversation Summaries ---
+    def _uncovered(self, user_id: int) -> List[Tuple[Any, int, str, str]]:
+        covered = self.summaries.get(user_id, (None, 0))[1]
+        return [row for row in self.messages.get(user_id, []) if row[1] > covered]
+
+    async def summary_state(self, user_id: int) -> Tuple[Optional[str], int]:
+        if user_id not in self.summaries:
+            return None, 0
+        return self.summaries[user_id][0], len(self._uncovered(user_id))
+
+    async def users_to_summarize(self, keep_recent: int) -> List[int]:
+        return [user_id for user_id in self.messages if len(self._uncovered(user_id)) > keep_recent]
+
+    async def messages_to_summarize(self, user_id: int, keep_recent: int) -> Tuple[Optional[str], List[Tuple[int, str, str]]]:
+        summary = self.summaries.get(user_id, (None, 0))[0]
+        rows = self._uncovered(user_id)
+        return summary, [(message_id, role, content) for _, message_id, role, content in rows[:max(0, len(rows) - keep_recent)]]
+
+    async def save_summary(self, user_id: int, summary: str, last_message_id: int):
+        self.summaries[user_id] = (summary, last_message_id)
+
+    # --- Scheduled Jobs ---
+    async def load_jobs(self) -> List[Tuple[str, bytes]]:
+        ordered = sorted(self.jobs.items(), key=lambda item: (item[1][0] is None, item[1][0] or 0.0))
+        return [(job_id, state) for job_id, (_, state) in ordered]
+
+    async def write_jobs(self, upserts: Sequence[JobRow], deletes: Sequence[str]):
+        for job_id in deletes:
+            self.jobs.pop(job_id, None)
+        for job_id, next_run_time, state in upserts:
+            self.jobs[job_id] = (next_run_time, state)
+
+    async def delete_all_jobs(self):
+        self.jobs.clear()
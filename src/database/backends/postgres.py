@@ -0,0 +1,359 @@
+# src/database/backends/postgres.py
+import asyncio
+import logging
+from datetime import date
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import asyncpg
+
+from database.backends import (
+    SNIPPET_END, SNIPPET_START, SNIPPET_WORDS,
+    ArchiveRow, JobRow, MessageRow, SearchHit, StorageBackend, archive_months, next_month,
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_PATH = 'src/bot/schema.sql'
+
+# A role change keeps who first invited the user
+_UPSERT_USER = """
+    INSERT INTO users (user_id, role, invited_by) VALUES ($1, $2, $3)
+    ON CONFLICT (user_id) DO UPDATE SET role = excluded.role
+"""
+
+# Headlines re-parse the text, so only the rows on the requested page get one
+_SEARCH_ARCHIVE = """
+    WITH query AS (SELECT plainto_tsquery('english', $2) AS q),
+    page AS (
+        SELECT a.id, a.timestamp, a.role, a.content, {rank} AS rank
+        FROM message_archive a, query
+        WHERE a.user_id = $1 AND a.content_tsv @@ query.q
+        ORDER BY {order}
+        LIMIT $3 OFFSET $4
+    )
+    SELECT page.timestamp, page.role,
+           ts_headline('english', page.content, query.q,
+                       'StartSel={start}, StopSel={end}, MaxWords={words}, MinWords={min_words}, MaxFragments=1') AS snippet
+    FROM page, query
+    ORDER BY {order}
+"""
+# Ranked: every match is scored (found through the GIN index on content_tsv). Recent: the
+# (user_id, timestamp) index is walked backwards until a page of matches is found.
+_SEARCH_RANKED, _SEARCH_RECENT = (
+    _SEARCH_ARCHIVE.format(
+        rank=rank, order=order, start=SNIPPET_START, end=SNIPPET_END, words=SNIPPET_WORDS, min_words=SNIPPET_WORDS // 2
+    )
+    for rank, order in (
+        ("ts_rank_cd(a.content_tsv, query.q)", "rank DESC, timestamp DESC, id DESC"),
+        ("0", "timestamp DESC, id DESC"),
+    )
+)
+_COUNT_SEARCH = "SELECT count(*) FROM message_archive WHERE user_id = $1 AND content_tsv @@ plainto_tsquery('english', $2)"
+
+
+def _read_schema() -> str:
+    with open(SCHEMA_PATH, 'r') as f:
+        return f.read()
+
+
+class PostgresBackend(StorageBackend):
+    """Postgres through an asyncpg connection pool."""
+
+    name = "postgres"
+    # Only failures a retry can fix; constraint or type errors would fail again every time
+    transient_errors = (
+        asyncpg.PostgresConnectionError, asyncpg.InterfaceError, OSError,
+        asyncpg.SerializationError, asyncpg.DeadlockDetectedError,
+    )
+
+    def __init__(self, database_url: str):
+        self.database_url = database_url
+        self.pool: Optional[asyncpg.Pool] = None
+        self._partitions: Set[date] = set()  # Archive months known to have a partition
+
+    async def connect(self):
+        self.pool = await asyncpg.create_pool(dsn=self.database_url)
+        logger.info("Database connection pool initialized.")
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def initialize(self, admin_id: Optional[int] = None):
+        # Read the schema file off the event loop
+        schema = await asyncio.to_thread(_read_schema)
+        async with self.pool.acquire() as conn:
+            # --- Schema Initialization ---
+            # This will create tables if they don't exist
+            await conn.execute(schema)
+            logger.info("Initial schema check complete. Tables created if they did not exist.")
+
+            # --- Schema Migrations ---
+            # Migration 1: Add ping_frequency_hours if it doesn't exist
+            try:
+                await conn.execute("ALTER TABLE settings ADD COLUMN ping_frequency_hours REAL NOT NULL DEFAULT 1;")
+                logger.info("Migration successful: Added 'ping_frequency_hours' column to settings.")
+            except asyncpg.exceptions.DuplicateColumnError:
+                # Column already exists, which is fine.
+                pass
+            except Exception as e:
+                logger.error(f"Error during 'ping_frequency_hours' migration: {e}")
+
+            # Migration 2: Drop the old 'schedule' table if it exists
+            try:
+                await conn.execute("DROP TABLE IF EXISTS schedule;")
+                logger.info("Migration successful: Dropped obsolete 'schedule' table.")
+            except Exception as e:
+                logger.error(f"Error dropping 'schedule' table: {e}")
+
+            # Migration 3: Change ping_frequency_hours to REAL for fractional values
+            try:
+                await conn.execute("ALTER TABLE settings ALTER COLUMN ping_frequency_hours TYPE REAL;")
+                logger.info("Migration successful: Changed 'ping_frequency_hours' column type to REAL.")
+            except Exception as e:
+                # This will fail if there's an issue, but we can log it.
+                logger.warning(f"Could not alter 'ping_frequency_hours' column type, it might already be correct or have data issues: {e}")
+
+            # Migration 4: Move jobs out of the old SQLAlchemy job store's table
+            try:
+                if await conn.fetchval("SELECT to_regclass('apscheduler_jobs') IS NOT NULL"):
+                    async with conn.transaction():
+                        await conn.execute("""
+                            INSERT INTO scheduled_jobs (id, next_run_time, job_state)
+                            SELECT id, next_run_time, job_state FROM apscheduler_jobs
+                            ON CONFLICT (id) DO NOTHING;
+                        """)
+                        await conn.execute("DROP TABLE apscheduler_jobs;")
+                    logger.info("Migration successful: Moved jobs from 'apscheduler_jobs' to 'scheduled_jobs'.")
+            except Exception as e:
+                logger.error(f"Error migrating 'apscheduler_jobs': {e}")
+
+            # Migration 5: Seed the archive with the history kept before it existed
+            try:
+                if await conn.fetchval("SELECT NOT EXISTS (SELECT 1 FROM message_archive)"):
+                    months = await conn.fetch(
+                        "SELECT DISTINCT date_trunc('month', timestamp AT TIME ZONE 'UTC') AS month FROM messages WHERE timestamp IS NOT NULL"
+                    )
+                    await self._ensure_partitions(conn, (row['month'].date() for row in months))
+                    status = await conn.execute("""
+                        INSERT INTO message_archive (user_id, role, content, timestamp)
+                        SELECT user_id, role, content, timestamp FROM messages WHERE timestamp IS NOT NULL
+                        ORDER BY timestamp, id;
+                    """)
+                    if status != "INSERT 0 0":
+                        logger.info(f"Migration successful: Archived existing messages ({status}).")
+            except Exception as e:
+                logger.error(f"Error seeding 'message_archive': {e}")
+
+            # Migration 6: Full-text search over the archive
+            try:
+                await conn.execute("""
+                    ALTER TABLE message_archive ADD COLUMN IF NOT EXISTS content_tsv TSVECTOR
+                    GENERATED ALWAYS AS (to_tsvector('english', content)) STORED;
+                """)
+                await conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_message_archive_content_tsv ON message_archive USING GIN (content_tsv);"
+                )
+            except Exception as e:
+                logger.error(f"Error adding the search index to 'message_archive': {e}")
+
+            # --- Bootstrap Admin ---
+            # Registered on every start, so the configured owner can always get back in and invite others
+            if admin_id is not None:
+                await conn.execute(_UPSERT_USER, admin_id, 'admin', None)
+
+    # --- Users ---
+    async def load_users(self) -> Dict[int, str]:
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch("SELECT user_id, role FROM users")
+        return {row['user_id']: row['role'] for row in rows}
+
+    async def save_user(self, user_id: int, role: str, invited_by: Optional[int]):
+        async with self.pool.acquire() as conn:
+            await conn.execute(_UPSERT_USER, user_id, role, invited_by)
+
+    async def delete_user(self, user_id: int) -> bool:
+        async with self.pool.acquire() as conn:
+            status = await conn.execute("DELETE FROM users WHERE user_id = $1", user_id)
+        return status != "DELETE 0"
+
+    # --- Settings ---
+    async def fetch_settings(self, user_id: int) -> Dict[str, Any]:
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT persona, timezone, ping_frequency_hours FROM settings WHERE user_id = $1", user_id
+            )
+        return dict(row) if row else {}
+
+    async def fetch_all_settings(self) -> List[Dict[str, Any]]:
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch("SELECT user_id, persona, timezone, ping_frequency_hours FROM settings")
+        return [dict(row) for row in rows]
+
+    async def create_settings(self, user_id: int, defaults: Dict[str, Any]) -> bool:
+        async with self.pool.acquire() as conn:
+            status = await conn.execute(
+                """
+                INSERT INTO settings (user_id, timezone, persona, ping_frequency_hours) VALUES ($1, $2, $3, $4)
+                ON CONFLICT (user_id) DO NOTHING
+                """,
+                user_id, defaults['timezone'], defaults['persona'], defaults['ping_frequency_hours']
+            )
+        return status == "INSERT 0 1"
+
+    async def upsert_setting(self, user_id: int, column: str, value: Any) -> Dict[str, Any]:
+        async with self.pool.acquire() as conn:
+            # Use an UPSERT to handle cases where the user's settings row might not exist yet
+            row = await conn.fetchrow(
+                f"""
+                INSERT INTO settings (user_id, {column}) VALUES ($1, $2)
+                ON CONFLICT (user_id) DO UPDATE SET {column} = $2
+                RETURNING persona, timezone, ping_frequency_hours;
+                """,
+                user_id, value
+            )
+        return dict(row)
+
+    async def _ensure_partitions(self, conn: asyncpg.Connection, months: Iterable[date]):
+        """Creates the monthly archive partitions that don't exist yet (about once a month)."""
+        for month in set(months) - self._partitions:
+            try:
+                await conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS message_archive_{month:%Y_%m} PARTITION OF message_archive
+                    FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{next_month(month).isoformat()} 00:00:00+00');
+                """)
+            except asyncpg.exceptions.DuplicateTableError:
+                pass  # Created concurrently by another connection
+            self._partitions.add(month)
+
+    # --- Messages ---
+    async def insert_messages(self, rows: Sequence[MessageRow]):
+        # One COPY per table for the whole batch
+        columns = ['user_id', 'role', 'content', 'timestamp']
+        async with self.pool.acquire() as conn:
+            await self._ensure_partitions(conn, archive_months(row[3] for row in rows))
+            async with conn.transaction():
+                await conn.copy_records_to_table('messages', records=rows, columns=columns)
+                await conn.copy_records_to_table('message_archive', records=rows, columns=columns)
+
+    async def last_messages(self, user_id: int, n: int) -> List[Tuple[str, str]]:
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT role, content FROM messages WHERE user_id = $1 ORDER BY timestamp DESC, id DESC LIMIT $2",
+                user_id, n
+            )
+        return [(row['role'], row['content']) for row in reversed(rows)]
+
+    async def trim_messages(self, keep: int, retain_unsummarized: bool, hard_limit: int) -> int:
+        async with self.pool.acquire() as conn:
+            status = await conn.execute("""
+                DELETE FROM messages WHERE id IN (
+                    SELECT t.id FROM (
+                        SELECT id, user_id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY timestamp DESC, id DESC) as rn
+                        FROM messages
+                    ) t
+                    LEFT JOIN conversation_summaries s ON s.user_id = t.user_id
+                    WHERE t.rn > $1
+                      AND (NOT $2 OR t.id <= COALESCE(s.last_message_id, 0) OR t.rn > $3)
+                );
+            """, keep, retain_unsummarized, hard_limit)
+        # asyncpg returns the command tag, e.g. "DELETE 12"
+        return int(status.split()[-1])
+
+    async def clear_memory(self, user_id: int):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("DELETE FROM messages WHERE user_id = $1", user_id)
+                await conn.execute("DELETE FROM conversation_summaries WHERE user_id = $1", user_id)
+                # Every partition, through its (user_id, timestamp) index; the search vector is in the row
+                await conn.execute("DELETE FROM message_archive WHERE user_id = $1", user_id)
+
+    # --- Message Archive ---
+    async def iter_archive(self, user_id: int, batch_size: int) -> AsyncIterator[List[ArchiveRow]]:
+        # A server-side cursor, so only one batch is ever held in memory
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                cursor = await conn.cursor(
+                    "SELECT timestamp, role, content FROM message_archive WHERE user_id = $1 ORDER BY timestamp, id",
+                    user_id
+                )
+                while rows := await cursor.fetch(batch_size):
+                    yield [(row['timestamp'], row['role'], row['content']) for row in rows]
+
+    async def search_archive(self, user_id: int, query: str, limit: int, offset: int, max_ranked: int) -> Tuple[int, List[SearchHit]]:
+        async with self.pool.acquire() as conn:
+            total = await conn.fetchval(_COUNT_SEARCH, user_id, query)
+            if not total:
+                return 0, []
+            rows = await conn.fetch(_SEARCH_RANKED if total <= max_ranked else _SEARCH_RECENT, user_id, query, limit, offset)
+        return total, [(row['timestamp'], row['role'], row['snippet']) for row in rows]
+
+    # --- Conversation Summaries ---
+    async def summary_state(self, user_id: int) -> Tuple[Optional[str], int]:
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT summary, last_message_id FROM conversation_summaries WHERE user_id = $1", user_id
+            )
+            if row is None:
+                return None, 0
+            pending = await conn.fetchval(
+                "SELECT count(*) FROM messages WHERE user_id = $1 AND id > $2", user_id, row['last_message_id']
+            )
+            return row['summary'], pending
+
+    async def users_to_summarize(self, keep_recent: int) -> List[int]:
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT m.user_id FROM messages m
+                LEFT JOIN conversation_summaries s ON s.user_id = m.user_id
+                WHERE m.id > COALESCE(s.last_message_id, 0)
+                GROUP BY m.user_id
+                HAVING count(*) > $1;
+            """, keep_recent)
+        return [row['user_id'] for row in rows]
+
+    async def messages_to_summarize(self, user_id: int, keep_recent: int) -> Tuple[Optional[str], List[Tuple[int, str, str]]]:
+        async with self.pool.acquire() as conn:
+            summary_row = await conn.fetchrow(
+                "SELECT summary, last_message_id FROM conversation_summaries WHERE user_id = $1", user_id
+            )
+            last_message_id = summary_row['last_message_id'] if summary_row else 0
+            rows = await conn.fetch("""
+                SELECT id, role, content FROM messages
+                WHERE user_id = $1 AND id > $2
+                ORDER BY timestamp DESC, id DESC
+                OFFSET $3;
+            """, user_id, last_message_id, keep_recent)
+        summary = summary_row['summary'] if summary_row else None
+        return summary, [(row['id'], row['role'], row['content']) for row in reversed(rows)]
+
+    async def save_summary(self, user_id: int, summary: str, last_message_id: int):
+        async with self.pool.acquire() as conn:
+            await conn.execute("""
+                INSERT INTO conversation_summaries (user_id, summary, last_message_id, updated_at)
+                VALUES ($1, $2, $3, CURRENT_TIMESTAMP)
+                ON CONFLICT (user_id) DO UPDATE
+                SET summary = $2, last_message_id = $3, updated_at = CURRENT_TIMESTAMP;
+            """, user_id, summary, last_message_id)
+
+    # --- Scheduled Jobs ---
+    async def load_jobs(self) -> List[Tuple[str, bytes]]:
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch("SELECT id, job_state FROM scheduled_jobs ORDER BY next_run_time NULLS LAST")
+        return [(row['id'], row['job_state']) for row in rows]
+
+    async def write_jobs(self, upserts: Sequence[JobRow], deletes: Sequence[str]):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if deletes:
+                    await conn.execute("DELETE FROM scheduled_jobs WHERE id = ANY($1::text[])", list(deletes))
+                if upserts:
+                    await conn.executemany("""
+                        INSERT INTO scheduled_jobs (id, next_run_time, job_state) VALUES ($1, $2, $3)
+                        ON CONFLICT (id) DO UPDATE SET next_run_time = $2, job_state = $3;
+                    """, upserts)
+
+    async def delete_all_jobs(self):
+        async with self.pool.acquire() as conn:
+            await conn.execute("DELETE FROM scheduled_jobs")
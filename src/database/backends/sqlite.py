@@ -0,0 +1,379 @@
+# src/database/backends/sqlite.py
+import asyncio
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from database.backends import (
+    SNIPPET_ELLIPSIS, SNIPPET_END, SNIPPET_START, SNIPPET_WORDS,
+    ArchiveRow, JobRow, MessageRow, SearchHit, StorageBackend, archive_months, search_terms,
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_PATH = 'src/bot/schema_sqlite.sql'
+
+# --- SQLite Settings ---
+# One connection, owned by a single I/O thread: every statement runs there, in order, and
+# the event loop only awaits the result. WAL lets readers proceed during a write and makes
+# commits a sequential append.
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL is durable across crashes of the process in WAL mode
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))  # For other processes holding the file
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", 16384))
+# Compiled statements kept per connection; every query here is a constant string, so each is prepared once
+SQLITE_STATEMENT_CACHE = 64
+
+_SELECT_USERS = "SELECT user_id, role FROM users"
+# A role change keeps who first invited the user
+_UPSERT_USER = """
+    INSERT INTO users (user_id, role, invited_by) VALUES (?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET role = excluded.role
+"""
+_DELETE_USER = "DELETE FROM users WHERE user_id = ?"
+_SELECT_SETTINGS = "SELECT persona, timezone, ping_frequency_hours FROM settings WHERE user_id = ?"
+_SELECT_ALL_SETTINGS = "SELECT user_id, persona, timezone, ping_frequency_hours FROM settings"
+_INSERT_SETTINGS = "INSERT OR IGNORE INTO settings (user_id, timezone, persona, ping_frequency_hours) VALUES (?, ?, ?, ?)"
+_UPSERT_SETTING = """
+    INSERT INTO settings (user_id, {column}) VALUES (?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET {column} = excluded.{column}
+    RETURNING persona, timezone, ping_frequency_hours
+"""
+_INSERT_MESSAGE = "INSERT INTO messages (user_id, role, content, timestamp) VALUES (?, ?, ?, ?)"
+_SELECT_LAST_MESSAGES = "SELECT role, content FROM messages WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?"
+_TRIM_MESSAGES = """
+    DELETE FROM messages WHERE id IN (
+        SELECT t.id FROM (
+            SELECT id, user_id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY timestamp DESC, id DESC) as rn
+            FROM messages
+        ) t
+        LEFT JOIN conversation_summaries s ON s.user_id = t.user_id
+        WHERE t.rn > ?
+          AND (? = 0 OR t.id <= COALESCE(s.last_message_id, 0) OR t.rn > ?)
+    )
+"""
+_SELECT_SUMMARY = "SELECT summary, last_message_id FROM conversation_summaries WHERE user_id = ?"
+_COUNT_PENDING = "SELECT count(*) FROM messages WHERE user_id = ? AND id > ?"
+_SELECT_USERS_TO_SUMMARIZE = """
+    SELECT m.user_id FROM messages m
+    LEFT JOIN conversation_summaries s ON s.user_id = m.user_id
+    WHERE m.id > COALESCE(s.last_message_id, 0)
+    GROUP BY m.user_id
+    HAVING count(*) > ?
+"""
+_SELECT_MESSAGES_TO_SUMMARIZE = """
+    SELECT id, role, content FROM messages
+    WHERE user_id = ? AND id > ?
+    ORDER BY timestamp DESC, id DESC
+    LIMIT -1 OFFSET ?
+"""
+# SQLite has no declarative partitioning, so the archive is one table per UTC month
+_CREATE_ARCHIVE_MONTH = """
+    CREATE TABLE IF NOT EXISTS {table} (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_{table}_user_id_timestamp ON {table} (user_id, timestamp);
+"""
+_INSERT_ARCHIVE = "INSERT INTO {table} (user_id, role, content, timestamp) VALUES (?, ?, ?, ?)"
+_SELECT_ARCHIVE = "SELECT timestamp, role, content FROM {table} WHERE user_id = ? ORDER BY timestamp, id"
+_DELETE_ARCHIVE = "DELETE FROM {table} WHERE user_id = ?"
+_INSERT_SEARCH = "INSERT INTO message_search (user_id, role, content, timestamp) VALUES (?, ?, ?, ?)"
+# Found through the user's token, as a plain user_id comparison would read the whole index
+_DELETE_SEARCH = "DELETE FROM message_search WHERE rowid IN (SELECT rowid FROM message_search WHERE message_search MATCH ?)"
+# Search goes through message_search's index; the user_id column is indexed as a token too.
+# Counting and newest-first pages match the user's token, so FTS5 intersects posting lists.
+# Ranked pages filter the user in SQL instead, as bm25() weighs every phrase of the MATCH and
+# the user's token occurs in every one of their messages. rowid order is arrival order.
+_SEARCH_SNIPPET = f"snippet(message_search, 0, '{SNIPPET_START}', '{SNIPPET_END}', '{SNIPPET_ELLIPSIS}', {SNIPPET_WORDS})"
+_COUNT_SEARCH = "SELECT count(*) FROM message_search WHERE message_search MATCH ?"
+_SEARCH_RANKED = f"""
+    SELECT timestamp, role, {_SEARCH_SNIPPET} AS snippet FROM message_search
+    WHERE message_search MATCH ? AND user_id = ?
+    ORDER BY rank, rowid DESC
+    LIMIT ? OFFSET ?
+"""
+_SEARCH_RECENT = f"""
+    SELECT timestamp, role, {_SEARCH_SNIPPET} AS snippet FROM message_search
+    WHERE message_search MATCH ?
+    ORDER BY rowid DESC
+    LIMIT ? OFFSET ?
+"""
+_SELECT_JOBS = "SELECT id, job_state FROM scheduled_jobs ORDER BY next_run_time IS NULL, next_run_time"
+_UPSERT_JOB = "INSERT OR REPLACE INTO scheduled_jobs (id, next_run_time, job_state) VALUES (?, ?, ?)"
+_DELETE_JOB = "DELETE FROM scheduled_jobs WHERE id = ?"
+_UPSERT_SUMMARY = """
+    INSERT INTO conversation_summaries (user_id, summary, last_message_id, updated_at)
+    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id) DO UPDATE
+    SET summary = excluded.summary, last_message_id = excluded.last_message_id, updated_at = CURRENT_TIMESTAMP
+"""
+
+
+def _format_timestamp(moment) -> str:
+    # Fixed-width UTC text sorts in time order, which the (user_id, timestamp) index relies on
+    return moment.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _archive_table(month: date) -> str:
+    return f"message_archive_{month:%Y_%m}"
+
+
+def _load_archive_months(conn: sqlite3.Connection) -> Set[date]:
+    return {
+        datetime.strptime(row[0], "message_archive_%Y_%m").date() for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'message_archive_[0-9]*'"
+        )
+    }
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    # IMMEDIATE takes the write lock up front instead of failing to upgrade mid-transaction
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class SQLiteBackend(StorageBackend):
+    """An embedded SQLite file in WAL mode, accessed from a dedicated I/O thread."""
+
+    name = "sqlite"
+    transient_errors = (sqlite3.OperationalError, OSError)
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._archive_months: Set[date] = set()
+
+    async def _run(self, func: Callable, *args) -> Any:
+        """Runs func(conn, *args) on the I/O thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, self._conn, *args)
+
+    def _open(self):
+        if self.path != ":memory:" and os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # isolation_level=None: autocommit, with explicit transactions where several statements must agree
+        conn = sqlite3.connect(self.path, isolation_level=None, cached_statements=SQLITE_STATEMENT_CACHE)
+        conn.row_factory = sqlite3.Row
+        journal_mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        if journal_mode.lower() != "wal":
+            logger.warning(f"SQLite database {self.path} is using journal mode '{journal_mode}', not WAL.")
+        conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        self._conn = conn
+
+    async def connect(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-io")
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._open)
+        logger.info(f"SQLite database opened at {self.path} (WAL).")
+
+    async def close(self):
+        if self._executor is None:
+            return
+        await self._run(lambda conn: conn.close())
+        self._executor.shutdown(wait=True)
+        self._conn = self._executor = None
+
+    async def initialize(self, admin_id: Optional[int] = None):
+        def initialize(conn):
+            with open(SCHEMA_PATH, 'r') as f:
+                conn.executescript(f.read())
+            # Jobs left by the old SQLAlchemy job store move into scheduled_jobs
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'apscheduler_jobs'").fetchone():
+                with _transaction(conn):
+                    conn.execute("""
+                        INSERT OR IGNORE INTO scheduled_jobs (id, next_run_time, job_state)
+                        SELECT id, next_run_time, job_state FROM apscheduler_jobs
+                    """)
+                    conn.execute("DROP TABLE apscheduler_jobs")
+                logger.info("Migration successful: Moved jobs from 'apscheduler_jobs' to 'scheduled_jobs'.")
+            self._archive_months = _load_archive_months(conn)
+            if self._archive_months and not conn.execute("SELECT 1 FROM message_search LIMIT 1").fetchone():
+                # Index the archive written before the search index existed
+                with _transaction(conn):
+                    for month in sorted(self._archive_months):
+                        conn.execute(
+                            f"INSERT INTO message_search (user_id, role, content, timestamp) "
+                            f"SELECT user_id, role, content, timestamp FROM {_archive_table(month)} ORDER BY timestamp, id"
+                        )
+                logger.info("Migration successful: Indexed the message archive for search.")
+            if not self._archive_months:
+                # Seed the archive with the history kept before it existed
+                rows = [
+                    (row['user_id'], row['role'], row['content'], datetime.fromisoformat(row['timestamp']))
+                    for row in conn.execute("SELECT user_id, role, content, timestamp FROM messages ORDER BY timestamp, id")
+                ]
+                if rows:
+                    with _transaction(conn):
+                        self._archive(conn, rows)
+                    logger.info(f"Migration successful: Archived {len(rows)} existing messages.")
+            if admin_id is not None:
+                conn.execute(_UPSERT_USER, (admin_id, 'admin', None))
+        await self._run(initialize)
+        logger.info("Initial schema check complete. Tables created if they did not exist.")
+
+    # --- Users ---
+    async def load_users(self) -> Dict[int, str]:
+        return await self._run(lambda conn: {row['user_id']: row['role'] for row in conn.execute(_SELECT_USERS)})
+
+    async def save_user(self, user_id: int, role: str, invited_by: Optional[int]):
+        await self._run(lambda conn: conn.execute(_UPSERT_USER, (user_id, role, invited_by)))
+
+    async def delete_user(self, user_id: int) -> bool:
+        return await self._run(lambda conn: conn.execute(_DELETE_USER, (user_id,)).rowcount > 0)
+
+    # --- Settings ---
+    async def fetch_settings(self, user_id: int) -> Dict[str, Any]:
+        def fetch(conn):
+            row = conn.execute(_SELECT_SETTINGS, (user_id,)).fetchone()
+            return dict(row) if row else {}
+        return await self._run(fetch)
+
+    async def fetch_all_settings(self) -> List[Dict[str, Any]]:
+        return await self._run(lambda conn: [dict(row) for row in conn.execute(_SELECT_ALL_SETTINGS)])
+
+    async def create_settings(self, user_id: int, defaults: Dict[str, Any]) -> bool:
+        params = (user_id, defaults['timezone'], defaults['persona'], defaults['ping_frequency_hours'])
+        return await self._run(lambda conn: conn.execute(_INSERT_SETTINGS, params).rowcount > 0)
+
+    async def upsert_setting(self, user_id: int, column: str, value: Any) -> Dict[str, Any]:
+        query = _UPSERT_SETTING.format(column=column)
+        return await self._run(lambda conn: dict(conn.execute(query, (user_id, value)).fetchone()))
+
+    def _archive(self, conn: sqlite3.Connection, rows: Sequence[MessageRow]):
+        """Appends rows to their month tables, creating any that are missing. Runs inside a transaction."""
+        by_month: Dict[date, List[Tuple]] = {}
+        for user_id, role, content, ts in rows:
+            (month,) = archive_months([ts])
+            by_month.setdefault(month, []).append((user_id, role, content, _format_timestamp(ts)))
+        for month, params in by_month.items():
+            table = _archive_table(month)
+            if month not in self._archive_months:
+                for statement in _CREATE_ARCHIVE_MONTH.format(table=table).split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+                self._archive_months.add(month)
+            conn.executemany(_INSERT_ARCHIVE.format(table=table), params)
+            conn.executemany(_INSERT_SEARCH, params)
+
+    # --- Messages ---
+    async def insert_messages(self, rows: Sequence[MessageRow]):
+        params = [(user_id, role, content, _format_timestamp(ts)) for user_id, role, content, ts in rows]
+
+        def insert(conn):
+            try:
+                with _transaction(conn):
+                    conn.executemany(_INSERT_MESSAGE, params)
+                    self._archive(conn, rows)
+            except BaseException:
+                # A rollback also undoes month tables created in the transaction
+                self._archive_months = _load_archive_months(conn)
+                raise
+        await self._run(insert)
+
+    async def last_messages(self, user_id: int, n: int) -> List[Tuple[str, str]]:
+        def fetch(conn):
+            rows = conn.execute(_SELECT_LAST_MESSAGES, (user_id, n)).fetchall()
+            return [(row['role'], row['content']) for row in reversed(rows)]
+        return await self._run(fetch)
+
+    async def trim_messages(self, keep: int, retain_unsummarized: bool, hard_limit: int) -> int:
+        return await self._run(
+            lambda conn: conn.execute(_TRIM_MESSAGES, (keep, int(retain_unsummarized), hard_limit)).rowcount
+        )
+
+    async def clear_memory(self, user_id: int):
+        def clear(conn):
+            with _transaction(conn):
+                conn.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+                conn.execute("DELETE FROM conversation_summaries WHERE user_id = ?", (user_id,))
+                for month in self._archive_months:
+                    conn.execute(_DELETE_ARCHIVE.format(table=_archive_table(month)), (user_id,))
+                conn.execute(_DELETE_SEARCH, (f'user_id : "{user_id}"',))
+        await self._run(clear)
+
+    # --- Message Archive ---
+    async def iter_archive(self, user_id: int, batch_size: int) -> AsyncIterator[List[ArchiveRow]]:
+        # Read on the I/O thread, which is the only one that changes it
+        months = await self._run(lambda conn: sorted(self._archive_months))
+        for month in months:
+            cursor = await self._run(lambda conn: conn.execute(_SELECT_ARCHIVE.format(table=_archive_table(month)), (user_id,)))
+            try:
+                while rows := await self._run(lambda conn: cursor.fetchmany(batch_size)):
+                    yield [(datetime.fromisoformat(ts), role, content) for ts, role, content in rows]
+            finally:
+                await self._run(lambda conn: cursor.close())
+
+    async def search_archive(self, user_id: int, query: str, limit: int, offset: int, max_ranked: int) -> Tuple[int, List[SearchHit]]:
+        terms = search_terms(query)
+        if not terms:
+            return 0, []
+        # Each word quoted, so the query's own punctuation is never read as FTS5 syntax; juxtaposition is AND
+        words = " ".join(f'"{term}"' for term in terms)
+        users_words = f'user_id : "{user_id}" AND content : ({words})'
+
+        def search(conn):
+            total = conn.execute(_COUNT_SEARCH, (users_words,)).fetchone()[0]
+            if not total:
+                return 0, []
+            if total <= max_ranked:
+                rows = conn.execute(_SEARCH_RANKED, (f"content : ({words})", user_id, limit, offset)).fetchall()
+            else:
+                rows = conn.execute(_SEARCH_RECENT, (users_words, limit, offset)).fetchall()
+            return total, [(datetime.fromisoformat(row['timestamp']), row['role'], row['snippet']) for row in rows]
+        return await self._run(search)
+
+    # --- Conversation Summaries ---
+    async def summary_state(self, user_id: int) -> Tuple[Optional[str], int]:
+        def fetch(conn):
+            row = conn.execute(_SELECT_SUMMARY, (user_id,)).fetchone()
+            if row is None:
+                return None, 0
+            pending = conn.execute(_COUNT_PENDING, (user_id, row['last_message_id'])).fetchone()[0]
+            return row['summary'], pending
+        return await self._run(fetch)
+
+    async def users_to_summarize(self, keep_recent: int) -> List[int]:
+        return await self._run(
+            lambda conn: [row['user_id'] for row in conn.execute(_SELECT_USERS_TO_SUMMARIZE, (keep_recent,))]
+        )
+
+    async def messages_to_summarize(self, user_id: int, keep_recent: int) -> Tuple[Optional[str], List[Tuple[int, str, str]]]:
+        def fetch(conn):
+            summary_row = conn.execute(_SELECT_SUMMARY, (user_id,)).fetchone()
+            last_message_id = summary_row['last_message_id'] if summary_row else 0
+            rows = conn.execute(_SELECT_MESSAGES_TO_SUMMARIZE, (user_id, last_message_id, keep_recent)).fetchall()
+            summary = summary_row['summary'] if summary_row else None
+            return summary, [(row['id'], row['role'], row['content']) for row in reversed(rows)]
+        return await self._run(fetch)
+
+    async def save_summary(self, user_id: int, summary: str, last_message_id: int):
+        await self._run(lambda conn: conn.execute(_UPSERT_SUMMARY, (user_id, summary, last_message_id)))
+
+    # --- Scheduled Jobs ---
+    async def load_jobs(self) -> List[Tuple[str, bytes]]:
+        return await self._run(lambda conn: [(row['id'], row['job_state']) for row in conn.execute(_SELECT_JOBS)])
+
+    async def write_jobs(self, upserts: Sequence[JobRow], deletes: Sequence[str]):
+        def write(conn):
+            with _transaction(conn):
+                conn.executemany(_DELETE_JOB, [(job_id,) for job_id in deletes])
+                conn.executemany(_UPSERT_JOB, upserts)
+        await self._run(write)
+
+    async def delete_all_jobs(self):
+        await self._run(lambda conn: conn.execute("DELETE FROM scheduled_jobs"))
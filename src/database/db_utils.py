@@ -1,8 +1,14 @@
 # src/database/db_utils.py
-import asyncpg
+import asyncio
 import logging
 import os
-from typing import List, Tuple, Union
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple, Union
+
+from bot import metrics
+from database.backends import ArchiveRow, SearchHit, StorageBackend, create_backend
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 OWNER_ID = int(os.getenv("OWNER_TELEGRAM_ID", 0))
@@ -13,131 +19,432 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-POOL = None
+# --- Storage Backend ---
+# "postgres" (DATABASE_URL), "sqlite" (an embedded file at DATABASE_PATH) or "memory".
+# Defaults to Postgres when DATABASE_URL is set and to SQLite otherwise.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND") or ("postgres" if DATABASE_URL else "sqlite")
+DATABASE_PATH = os.getenv("DATABASE_PATH", "data/bot_data.db")
 
-async def init_pool():
-    """Initializes the asyncpg connection pool."""
-    global POOL
-    if not DATABASE_URL:
-        raise ValueError("DATABASE_URL environment variable is not set.")
-    POOL = await asyncpg.create_pool(dsn=DATABASE_URL)
-    logger.info("Database connection pool initialized.")
+BACKEND: StorageBackend = create_backend(STORAGE_BACKEND, DATABASE_URL, DATABASE_PATH)
 
-async def initialize_database():
-    """Initializes and migrates the database schema."""
-    try:
-        async with POOL.acquire() as conn:
-            # --- Schema Initialization ---
-            with open('src/bot/schema.sql', 'r') as f:
-                # This will create tables if they don't exist
-                await conn.execute(f.read())
-            logger.info("Initial schema check complete. Tables created if they did not exist.")
-
-            # --- Schema Migrations ---
-            # Migration 1: Add ping_frequency_hours if it doesn't exist
-            try:
-                await conn.execute("ALTER TABLE settings ADD COLUMN ping_frequency_hours REAL NOT NULL DEFAULT 1;")
-                logger.info("Migration successful: Added 'ping_frequency_hours' column to settings.")
-            except asyncpg.exceptions.DuplicateColumnError:
-                # Column already exists, which is fine.
-                pass
-            except Exception as e:
-                logger.error(f"Error during 'ping_frequency_hours' migration: {e}")
+# --- Settings Cache ---
+# Whole settings rows are cached per user and kept coherent by update_user_setting,
+# so steady-state handlers read settings without a database round trip.
+SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", 3600))  # Seconds; only bounds staleness from out-of-band writes
+SETTINGS_CACHE_MAX_USERS = int(os.getenv("SETTINGS_CACHE_MAX_USERS", 1024))
+SETTING_COLUMNS = ('persona', 'timezone', 'ping_frequency_hours')
+SETTING_DEFAULTS = {'timezone': DEFAULT_TIMEZONE, 'persona': 'accountability', 'ping_frequency_hours': 1}
 
-            # Migration 2: Drop the old 'schedule' table if it exists
-            try:
-                await conn.execute("DROP TABLE IF EXISTS schedule;")
-                logger.info("Migration successful: Dropped obsolete 'schedule' table.")
-            except Exception as e:
-                logger.error(f"Error dropping 'schedule' table: {e}")
-            
-            # Migration 3: Change ping_frequency_hours to REAL for fractional values
-            try:
-                await conn.execute("ALTER TABLE settings ALTER COLUMN ping_frequency_hours TYPE REAL;")
-                logger.info("Migration successful: Changed 'ping_frequency_hours' column type to REAL.")
-            except Exception as e:
-                # This will fail if there's an issue, but we can log it.
-                logger.warning(f"Could not alter 'ping_frequency_hours' column type, it might already be correct or have data issues: {e}")
-
-
-            # --- Default Data Initialization for Owner ---
-            # Check if default settings exist for the owner
-            row = await conn.fetchrow("SELECT * FROM settings WHERE user_id = $1", OWNER_ID)
-            if row is None:
-                await conn.execute(
-                    "INSERT INTO settings (user_id, timezone, persona, ping_frequency_hours) VALUES ($1, $2, $3, $4)",
-                    OWNER_ID, DEFAULT_TIMEZONE, 'accountability', 1
-                )
-                logger.info(f"Initialized default settings for owner {OWNER_ID}")
+_settings_cache: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_settings_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+# --- Write-Behind Message Persistence ---
+# add_message enqueues rows; a background writer drains the queue in batches (COPY on Postgres),
+# and a periodic sweeper trims every user back to MESSAGE_HISTORY_LIMIT in one statement.
+MESSAGE_HISTORY_LIMIT = 50
+# When summaries are enabled, rows past the limit are kept until summarized, up to this hard cap.
+MESSAGE_HARD_LIMIT = int(os.getenv("MESSAGE_HARD_LIMIT", 500))
+MESSAGE_QUEUE_MAX_SIZE = int(os.getenv("MESSAGE_QUEUE_MAX_SIZE", 10000))
+MESSAGE_BATCH_SIZE = int(os.getenv("MESSAGE_BATCH_SIZE", 500))
+MESSAGE_WRITE_RETRIES = 3
+RETENTION_SWEEP_INTERVAL = float(os.getenv("RETENTION_SWEEP_INTERVAL", 300))  # Seconds
+
+_message_queue: Optional[asyncio.Queue] = None
+# A read only needs the reader's own rows written: it takes them off the queue and writes
+# them itself, so it never waits behind other users' backlog.
+_queued_by_user: Dict[int, Deque["_QueuedMessage"]] = {}
+_in_flight: Dict[int, int] = {}  # The user's rows in batches being written right now
+_in_flight_done: Dict[int, asyncio.Event] = {}
+_writer_task: Optional[asyncio.Task] = None
+_sweeper_task: Optional[asyncio.Task] = None
+_retain_unsummarized = False
+
+async def open_storage():
+    """Opens the configured storage backend (connection pool, database file or in-memory store)."""
+    await BACKEND.connect()
+
+
+async def close_storage():
+    await BACKEND.close()
+    logger.info("Storage backend closed.")
 
+
+async def initialize_database():
+    """Initializes and migrates the database schema, and registers OWNER_ID as the bootstrap admin."""
+    try:
+        await BACKEND.initialize(OWNER_ID or None)
         logger.info("Database initialized and migrations checked successfully.")
     except Exception as e:
         logger.error(f"Error initializing database: {e}", exc_info=True)
 
 
+# --- Users ---
+@metrics.timed("db.get_users")
+async def get_users() -> Dict[int, str]:
+    """Every registered user and their role."""
+    return await BACKEND.load_users()
+
+
+@metrics.timed("db.save_user")
+async def save_user(user_id: int, role: str, invited_by: Optional[int] = None):
+    await BACKEND.save_user(user_id, role, invited_by)
+
+
+@metrics.timed("db.delete_user")
+async def delete_user(user_id: int) -> bool:
+    """Unregisters a user; returns whether they were registered."""
+    return await BACKEND.delete_user(user_id)
+
+
+@metrics.timed("db.create_user_settings")
+async def create_user_settings(user_id: int) -> bool:
+    """Gives a user the default settings unless they already have a row. Returns whether one was created."""
+    created = await BACKEND.create_settings(user_id, SETTING_DEFAULTS)
+    if created:
+        invalidate_settings_cache(user_id)
+    return created
+
+
+def _cache_settings(user_id: int, settings: Dict[str, Any]):
+    """Stores a settings row in the cache, evicting the least recently used users beyond the cap."""
+    _settings_cache[user_id] = (time.monotonic() + SETTINGS_CACHE_TTL, settings)
+    _settings_cache.move_to_end(user_id)
+    while len(_settings_cache) > SETTINGS_CACHE_MAX_USERS:
+        _settings_cache.popitem(last=False)
+        _settings_cache_stats['evictions'] += 1
+
+
+def invalidate_settings_cache(user_id: Union[int, None] = None):
+    """Drops one user's cached settings, or the whole cache when no user is given."""
+    if user_id is None:
+        _settings_cache.clear()
+    else:
+        _settings_cache.pop(user_id, None)
+
+
+def settings_cache_stats() -> Dict[str, int]:
+    """Returns hit/miss/eviction counters and the current number of cached users."""
+    return {**_settings_cache_stats, 'size': len(_settings_cache)}
+
+
+async def get_user_settings(user_id: int) -> Dict[str, Any]:
+    """Retrieves the full settings row for a user (empty dict if none), served from cache when fresh."""
+    entry = _settings_cache.get(user_id)
+    if entry is not None and entry[0] > time.monotonic():
+        _settings_cache.move_to_end(user_id)
+        _settings_cache_stats['hits'] += 1
+        return entry[1]
+
+    _settings_cache_stats['misses'] += 1
+    settings = await _fetch_user_settings(user_id)
+    _cache_settings(user_id, settings)
+    return settings
+
+
+@metrics.timed("db.get_user_settings")
+async def _fetch_user_settings(user_id: int) -> Dict[str, Any]:
+    return await BACKEND.fetch_settings(user_id)
+
+
+@metrics.timed("db.get_all_user_settings")
+async def get_all_user_settings() -> List[Dict[str, Any]]:
+    """Retrieves every user's settings row, including its user_id. Bypasses the cache."""
+    return await BACKEND.fetch_all_settings()
+
+
 async def get_user_setting(user_id: int, setting_name: str) -> Union[str, int, float, None]:
     """Retrieves a specific setting for a user."""
-    async with POOL.acquire() as conn:
-        row = await conn.fetchrow(f"SELECT {setting_name} FROM settings WHERE user_id = $1", user_id)
-        
-        value = row[setting_name] if row else None
-
-        if value is None:
-            # Return defaults for specific settings if the user record or the specific value doesn't exist.
-            logger.warning(f"Value for '{setting_name}' is None for user {user_id}. Falling back to default.")
-            if setting_name == 'timezone': return DEFAULT_TIMEZONE
-            if setting_name == 'persona': return 'accountability'
-            if setting_name == 'ping_frequency_hours': return 1
-            return None
-            
-        return value
+    if setting_name not in SETTING_COLUMNS:
+        raise ValueError(f"Unknown setting: {setting_name}")
+
+    settings = await get_user_settings(user_id)
+    value = settings.get(setting_name)
+
+    if value is None:
+        # Return defaults for specific settings if the user record or the specific value doesn't exist.
+        logger.warning(f"Value for '{setting_name}' is None for user {user_id}. Falling back to default.")
+        return SETTING_DEFAULTS.get(setting_name)
 
+    return value
 
+
+@metrics.timed("db.update_user_setting")
 async def update_user_setting(user_id: int, setting_name: str, value: Union[str, int, float]):
-    """Updates a specific setting for a user."""
-    async with POOL.acquire() as conn:
-        # Use an UPSERT to handle cases where the user's settings row might not exist yet
-        await conn.execute(
-            f"""
-            INSERT INTO settings (user_id, {setting_name}) VALUES ($1, $2)
-            ON CONFLICT (user_id) DO UPDATE SET {setting_name} = $2;
-            """,
-            user_id, value
-        )
+    """Updates a specific setting for a user and writes the new row through to the cache."""
+    if setting_name not in SETTING_COLUMNS:
+        raise ValueError(f"Unknown setting: {setting_name}")
+
+    # An upsert, as the user's settings row might not exist yet
+    _cache_settings(user_id, await BACKEND.upsert_setting(user_id, setting_name, value))
+
+
+def _writer_running() -> bool:
+    return _writer_task is not None and not _writer_task.done()
+
+
+@metrics.timed("db.insert_messages")
+async def _insert_messages(rows: List[Tuple[int, str, str, datetime]]):
+    """Inserts a batch of (user_id, role, content, timestamp) rows in one backend call."""
+    await BACKEND.insert_messages(rows)
+
+
+class _QueuedMessage:
+    """A queued row; `taken` once the writer or a reader has claimed it for writing."""
+    __slots__ = ('row', 'taken')
+
+    def __init__(self, row: Tuple[int, str, str, datetime]):
+        self.row = row
+        self.taken = False
+
+
+def _unqueue(entry: _QueuedMessage):
+    entry.taken = True
+    user_id = entry.row[0]
+    user_queue = _queued_by_user[user_id]
+    # Rows are taken in queue order, so this is almost always the head
+    if user_queue[0] is entry:
+        user_queue.popleft()
+    else:
+        user_queue.remove(entry)
+    if not user_queue:
+        del _queued_by_user[user_id]
+
+
+def _take(entries: List[_QueuedMessage]) -> List[Tuple[int, str, str, datetime]]:
+    """Claims queued rows for writing, counting them as in flight until _written is called."""
+    rows = []
+    for entry in entries:
+        if entry.taken:
+            continue
+        _unqueue(entry)
+        user_id = entry.row[0]
+        _in_flight[user_id] = _in_flight.get(user_id, 0) + 1
+        rows.append(entry.row)
+    return rows
+
+
+def _written(rows: List[Tuple[int, str, str, datetime]]):
+    """Marks rows as no longer in flight, waking readers waiting on their users."""
+    for row in rows:
+        user_id = row[0]
+        _in_flight[user_id] -= 1
+        if not _in_flight[user_id]:
+            del _in_flight[user_id]
+            done = _in_flight_done.pop(user_id, None)
+            if done is not None:
+                done.set()
+
+
+async def _write_batch(rows: List[Tuple[int, str, str, datetime]]):
+    """Writes rows, retrying transient errors; rows that still fail are logged and dropped."""
+    try:
+        for attempt in range(1, MESSAGE_WRITE_RETRIES + 1):
+            try:
+                await _insert_messages(rows)
+                return
+            except BACKEND.transient_errors as e:
+                if attempt == MESSAGE_WRITE_RETRIES:
+                    logger.error(f"Dropping {len(rows)} messages after {attempt} failed writes: {e}", exc_info=True)
+                else:
+                    logger.warning(f"Message batch write failed (attempt {attempt}), retrying: {e}")
+                    await asyncio.sleep(0.5 * attempt)
+    except Exception as e:
+        # Not worth retrying, but the writer must survive it for the batches that follow
+        logger.error(f"Dropping {len(rows)} messages after a failed write: {e}", exc_info=True)
+    finally:
+        _written(rows)
+
+
+async def _message_writer():
+    """Drains the message queue, writing whatever has accumulated as one batch."""
+    while True:
+        entries = [await _message_queue.get()]
+        # No artificial delay: rows that pile up while a batch is being written form the next one
+        while len(entries) < MESSAGE_BATCH_SIZE and not _message_queue.empty():
+            entries.append(_message_queue.get_nowait())
+        try:
+            # Rows a reader already wrote itself are skipped
+            rows = _take(entries)
+            if rows:
+                await _write_batch(rows)
+        finally:
+            for _ in entries:
+                _message_queue.task_done()
+        # Let readers woken by this batch take their remaining rows before the next one forms
+        await asyncio.sleep(0)
+
+
+@metrics.timed("db.trim_messages")
+async def trim_messages(keep: int = MESSAGE_HISTORY_LIMIT, retain_unsummarized: bool = False) -> int:
+    """
+    Deletes everything beyond each user's newest `keep` messages. With retain_unsummarized,
+    rows not yet folded into the user's summary are spared until they pass MESSAGE_HARD_LIMIT.
+    Returns the number of rows removed.
+    """
+    return await BACKEND.trim_messages(keep, retain_unsummarized, MESSAGE_HARD_LIMIT)
+
+
+async def _retention_sweeper():
+    while True:
+        await asyncio.sleep(RETENTION_SWEEP_INTERVAL)
+        try:
+            removed = await trim_messages(retain_unsummarized=_retain_unsummarized)
+            if removed:
+                logger.info(f"Retention sweep removed {removed} old messages.")
+        except Exception as e:
+            logger.error(f"Retention sweep failed: {e}", exc_info=True)
+
+
+def start_background_tasks(retain_unsummarized: bool = False):
+    """
+    Starts the write-behind message writer and the retention sweeper on the running loop.
+    Pass retain_unsummarized when a summarizer folds old messages, so the sweeper waits for it.
+    """
+    global _message_queue, _writer_task, _sweeper_task, _retain_unsummarized
+    if _writer_running():
+        return
+    _retain_unsummarized = retain_unsummarized
+    _message_queue = asyncio.Queue(maxsize=MESSAGE_QUEUE_MAX_SIZE)
+    _writer_task = asyncio.create_task(_message_writer())
+    _sweeper_task = asyncio.create_task(_retention_sweeper())
+    logger.info("Message writer and retention sweeper started.")
+
+
+async def flush_messages():
+    """Waits until every queued message has been written."""
+    if _writer_running():
+        await _message_queue.join()
+
+
+async def flush_user_messages(user_id: int):
+    """
+    Makes the user's queued messages visible to reads. Waits at most for a batch already
+    being written with the user's rows in it, then writes the rest of theirs directly.
+    """
+    if not _writer_running():
+        return
+    while user_id in _in_flight:
+        done = _in_flight_done.get(user_id)
+        if done is None:
+            done = _in_flight_done[user_id] = asyncio.Event()
+        await done.wait()
+    rows = _take(list(_queued_by_user.get(user_id, ())))
+    if rows:
+        await _write_batch(rows)
+
+
+async def stop_background_tasks():
+    """Flushes pending messages, then stops the writer and sweeper."""
+    global _writer_task, _sweeper_task
+    if _writer_running():
+        await flush_messages()
+        logger.info("Pending messages flushed.")
+    for task in (_writer_task, _sweeper_task):
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    _writer_task = _sweeper_task = None
 
 
 async def add_message(user_id: int, role: str, content: str):
-    """Adds a message to the history and enforces the 50-message limit."""
-    async with POOL.acquire() as conn:
-        async with conn.transaction():
-            await conn.execute(
-                "INSERT INTO messages (user_id, role, content) VALUES ($1, $2, $3)",
-                user_id, role, content
-            )
-            # Enforce the 50 message limit by deleting the oldest message
-            # This is slightly inefficient but good enough for a single-user bot.
-            # A better approach for multi-user systems would involve partitions or a cleanup job.
-            await conn.execute("""
-                DELETE FROM messages WHERE id IN (
-                    SELECT id FROM (
-                        SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY timestamp DESC) as rn
-                        FROM messages WHERE user_id = $1
-                    ) t WHERE t.rn > 50
-                );
-            """, user_id)
+    """
+    Adds a message to the history. Rows are queued for the background writer when it is
+    running, otherwise inserted immediately. The 50-message limit is enforced by the sweeper.
+    """
+    # Timestamp at enqueue time so batched rows keep their real order
+    row = (user_id, role, content, datetime.now(timezone.utc))
+    if not _writer_running():
+        await _insert_messages([row])
+        return
+    entry = _QueuedMessage(row)
+    # Visible to readers even while a full queue makes us wait
+    _queued_by_user.setdefault(user_id, deque()).append(entry)
+    try:
+        # A full queue applies backpressure instead of growing without bound
+        await _message_queue.put(entry)
+    except BaseException:
+        # Never queued: forget the row unless a reader has already written it
+        if not entry.taken:
+            _unqueue(entry)
+        raise
 
 
+@metrics.timed("db.get_last_n_messages")
 async def get_last_n_messages(user_id: int, n: int = 50) -> List[Tuple[str, str]]:
     """Retrieves the last N messages for a user."""
-    async with POOL.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT role, content FROM messages WHERE user_id = $1 ORDER BY timestamp DESC LIMIT $2",
-            user_id, n
-        )
-        # Convert list of records to list of tuples
-        return [(row['role'], row['content']) for row in reversed(rows)] # Return in chronological order
+    # Make sure the user's queued writes are visible before reading
+    await flush_user_messages(user_id)
+    return await BACKEND.last_messages(user_id, n)  # In chronological order
 
+@metrics.timed("db.clear_memory")
 async def clear_memory(user_id: int):
-    """Deletes all messages for a user."""
-    async with POOL.acquire() as conn:
-        await conn.execute("DELETE FROM messages WHERE user_id = $1", user_id)
+    """Deletes all messages, archived history included, and the conversation summary for a user."""
+    # Flush first so queued rows can't reappear after the delete
+    await flush_user_messages(user_id)
+    await BACKEND.clear_memory(user_id)
+
+
+# --- Message Archive ---
+# Every message is also appended to an archive (partitioned by month) that the sweeper
+# never trims, so exports cover the full history while the messages table stays small.
+# Only clear_memory deletes from it.
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 1000))
+
+
+@metrics.timed("db.iter_message_archive")
+async def iter_message_archive(user_id: int, batch_size: int = ARCHIVE_BATCH_SIZE) -> AsyncIterator[List[ArchiveRow]]:
+    """Yields a user's full message history as batches of (timestamp, role, content), oldest first."""
+    await flush_user_messages(user_id)
+    async for batch in BACKEND.iter_archive(user_id, batch_size):
+        yield batch
+
+
+# --- Message Search ---
+# Full-text search over the archive: a GIN index on a generated tsvector column on Postgres,
+# an FTS5 table on SQLite. Both are written in the same transaction as the message itself.
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 5))
+# Queries matching more messages than this list them newest first instead of scoring them all
+SEARCH_MAX_RANKED = int(os.getenv("SEARCH_MAX_RANKED", 10000))
+
+
+@metrics.timed("db.search_messages")
+async def search_messages(user_id: int, query: str, page: int = 1, page_size: int = SEARCH_PAGE_SIZE) -> Tuple[int, List[SearchHit]]:
+    """Ranked matches for the query in the user's full history. Returns (total matches, hits on the 1-based page)."""
+    await flush_user_messages(user_id)
+    return await BACKEND.search_archive(user_id, query, page_size, (page - 1) * page_size, SEARCH_MAX_RANKED)
+
+
+# --- Conversation Summaries ---
+@metrics.timed("db.get_summary_state")
+async def get_summary_state(user_id: int) -> Tuple[Optional[str], int]:
+    """
+    Returns the user's running summary (or None) and how many stored messages are newer
+    than what it covers.
+    """
+    await flush_user_messages(user_id)
+    return await BACKEND.summary_state(user_id)
+
+
+@metrics.timed("db.get_users_to_summarize")
+async def get_users_to_summarize(keep_recent: int) -> List[int]:
+    """Returns users with more than `keep_recent` messages not yet covered by their summary."""
+    await flush_messages()
+    return await BACKEND.users_to_summarize(keep_recent)
+
+
+@metrics.timed("db.get_messages_to_summarize")
+async def get_messages_to_summarize(user_id: int, keep_recent: int) -> Tuple[Optional[str], List[Tuple[int, str, str]]]:
+    """
+    Returns the current summary and the (id, role, content) messages it doesn't cover yet,
+    excluding the newest `keep_recent`, in chronological order.
+    """
+    return await BACKEND.messages_to_summarize(user_id, keep_recent)
+
+
+@metrics.timed("db.save_summary")
+async def save_summary(user_id: int, summary: str, last_message_id: int):
+    """Stores the user's running summary and the newest message id it covers."""
+    await BACKEND.save_summary(user_id, summary, last_message_id)
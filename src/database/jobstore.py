@@ -0,0 +1,150 @@
+# src/database/jobstore.py
+import asyncio
+import logging
+import pickle
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from apscheduler.job import Job
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.util import datetime_to_utc_timestamp
+
+from database import db_utils
+
+logger = logging.getLogger(__name__)
+
+JOB_WRITE_RETRIES = 3
+
+
+class BackendJobStore(MemoryJobStore):
+    """
+    An APScheduler job store persisted through the storage backend (db_utils.BACKEND).
+
+    APScheduler calls job stores synchronously from the event loop, so lookups and due-job
+    queries are answered from MemoryJobStore's list ordered by next run time (a wakeup walks
+    only the due prefix), loaded once by load() before the scheduler starts. Changes are
+    pickled immediately, so unserializable jobs still fail at add_job, and written behind by
+    a background task that folds everything queued since its last write into one transaction.
+    """
+
+    def __init__(self, pickle_protocol: int = pickle.HIGHEST_PROTOCOL):
+        super().__init__()
+        self.pickle_protocol = pickle_protocol
+        self._persisted_states: List[Tuple[str, bytes]] = []
+        self._discarded: List[str] = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+
+    async def load(self, discard: Optional[Callable[[str], bool]] = None):
+        """
+        Reads the persisted jobs; they are restored when the scheduler starts this store.
+        Jobs whose id `discard` accepts are never restored, so they can't fire, and are deleted.
+        """
+        states = await db_utils.BACKEND.load_jobs()
+        self._persisted_states = [(job_id, state) for job_id, state in states if not (discard and discard(job_id))]
+        self._discarded = [job_id for job_id, _ in states if discard and discard(job_id)]
+        logger.info(f"Loaded {len(self._persisted_states)} persisted job(s), discarded {len(self._discarded)}.")
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.get_running_loop().create_task(self._write_behind())
+        stale = self._discarded
+        self._discarded = []
+        for job_id, state in self._persisted_states:
+            try:
+                MemoryJobStore.add_job(self, self._reconstitute_job(state))
+            except Exception:
+                logger.exception(f'Unable to restore job "{job_id}" -- removing it')
+                stale.append(job_id)
+        self._persisted_states = []
+        if stale:
+            self._queue.put_nowait(('delete', stale))
+
+    def _reconstitute_job(self, state: bytes) -> Job:
+        job_state = pickle.loads(state)
+        job_state['jobstore'] = self
+        job = Job.__new__(Job)
+        job.__setstate__(job_state)
+        job._scheduler = self._scheduler
+        job._jobstore_alias = self._alias
+        return job
+
+    def _persist(self, job: Job):
+        state = pickle.dumps(job.__getstate__(), self.pickle_protocol)
+        self._queue.put_nowait(('put', (job.id, datetime_to_utc_timestamp(job.next_run_time), state)))
+
+    def add_job(self, job: Job):
+        super().add_job(job)
+        self._persist(job)
+
+    def update_job(self, job: Job):
+        super().update_job(job)
+        self._persist(job)
+
+    def remove_job(self, job_id: str):
+        super().remove_job(job_id)
+        self._queue.put_nowait(('delete', [job_id]))
+
+    def remove_all_jobs(self):
+        super().remove_all_jobs()
+        self._queue.put_nowait(('clear', None))
+
+    def shutdown(self):
+        # Only forget the in-memory copies; the persisted jobs stay for the next start
+        MemoryJobStore.remove_all_jobs(self)
+
+    async def _write_behind(self):
+        while True:
+            ops = [await self._queue.get()]
+            while not self._queue.empty():
+                ops.append(self._queue.get_nowait())
+
+            # Fold the batch into its net effect: the last state of each job wins
+            clear = False
+            upserts: Dict[str, Tuple] = {}
+            deletes: Set[str] = set()
+            for kind, payload in ops:
+                if kind == 'clear':
+                    clear = True
+                    upserts.clear()
+                    deletes.clear()
+                elif kind == 'put':
+                    upserts[payload[0]] = payload
+                    deletes.discard(payload[0])
+                else:
+                    for job_id in payload:
+                        upserts.pop(job_id, None)
+                        deletes.add(job_id)
+
+            try:
+                for attempt in range(1, JOB_WRITE_RETRIES + 1):
+                    try:
+                        if clear:
+                            await db_utils.BACKEND.delete_all_jobs()
+                            clear = False
+                        await db_utils.BACKEND.write_jobs(list(upserts.values()), list(deletes))
+                        break
+                    except db_utils.BACKEND.transient_errors as e:
+                        if attempt == JOB_WRITE_RETRIES:
+                            logger.error(f"Dropping {len(ops)} job store change(s) after {attempt} failed writes: {e}", exc_info=True)
+                        else:
+                            logger.warning(f"Job store write failed (attempt {attempt}), retrying: {e}")
+                            await asyncio.sleep(0.5 * attempt)
+            except Exception as e:
+                logger.error(f"Job store write failed: {e}", exc_info=True)
+            finally:
+                for _ in ops:
+                    self._queue.task_done()
+
+    async def flush(self):
+        """Waits until every queued change has been written."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self):
+        """Writes pending changes, then stops the writer."""
+        await self.flush()
+        if self._writer is not None:
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
@@ -16,7 +16,7 @@ from telegram.ext import Application, CommandHandler, MessageHandler, filters
 
 # Import using relative imports since we're in src/
 from database import db_utils
-from bot import handlers, scheduler
+from bot import access, handlers, scheduler, llm_client, outbound, summarizer, utils, http_server, webhook, metrics, watchdog
 
 # --- Setup Logging ---
 logging.basicConfig(
@@ -37,11 +37,16 @@ async def main():
         logger.critical("TELEGRAM_BOT_TOKEN or OWNER_TELEGRAM_ID environment variable not set. Exiting.")
         return
     
-    # Initialize the database connection pool first
-    await db_utils.init_pool()
+    # Open the storage backend first
+    await db_utils.open_storage()
     await db_utils.initialize_database()
+    # Load the allowlist before any update is handled or anyone is scheduled
+    await access.load()
+    # Keep old messages around until the nightly summarizer has folded them in
+    db_utils.start_background_tasks(retain_unsummarized=summarizer.SUMMARIZATION_ENABLED)
 
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    # Updates are handled concurrently; the per-chat dispatcher keeps each chat's work in order
+    application = Application.builder().token(TELEGRAM_TOKEN).concurrent_updates(True).build()
 
     # --- Register Handlers ---
     application.add_handler(CommandHandler("start", handlers.start_command))
@@ -50,26 +55,47 @@ async def main():
     application.add_handler(CommandHandler("set_schedule", handlers.set_schedule_command))
     application.add_handler(CommandHandler("memory_clear", handlers.clear_memory_command))
     application.add_handler(CommandHandler("export_memory", handlers.export_memory_command))
+    application.add_handler(CommandHandler("search", handlers.search_command))
+    application.add_handler(CommandHandler("stats", handlers.stats_command))
+    application.add_handler(CommandHandler("profile", handlers.profile_command))
+    application.add_handler(CommandHandler("invite", handlers.invite_command))
+    application.add_handler(CommandHandler("revoke", handlers.revoke_command))
+    application.add_handler(CommandHandler("users", handlers.users_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handlers.handle_message))
     application.add_error_handler(handlers.error_handler)
 
     try:
+        # Report anything that blocks the event loop from here on
+        watchdog.start()
+
+        # All Telegram sends (replies and pings) go through the rate-limited dispatcher
+        outbound.start()
+        utils.start_announcer()
+
         # Start the scheduler FIRST
-        if not scheduler.scheduler.running:
-            scheduler.scheduler.start()
-            logger.info("Scheduler started.")
-        else:
-            logger.info("Scheduler was already running.")
+        await scheduler.start()
 
-        # THEN, sync the jobs
+        # THEN, sync the jobs; pings go out through the application's shared Bot
+        scheduler.set_bot(application.bot)
         await scheduler.sync_and_reschedule_jobs()
+        scheduler.schedule_maintenance_jobs()
 
         # Initialize and start the bot application
         await application.initialize()
         await application.start()
-        
+
+        # The embedded HTTP server always serves /healthz; in webhook mode it also receives updates
+        if webhook.WEBHOOK_ENABLED:
+            webhook.register(application)
+        if metrics.METRICS_ENABLED:
+            metrics.register_endpoint()  # Prometheus scrape target at /metrics
+        await http_server.start(PORT)
+
+        if webhook.WEBHOOK_ENABLED:
+            await webhook.set_webhook(application)
+            logger.info(f"Bot started in webhook mode on port {PORT}.")
         # For Railway deployment - use simple polling
-        if os.getenv("RAILWAY_ENVIRONMENT"):
+        elif os.getenv("RAILWAY_ENVIRONMENT"):
             await application.updater.start_polling()
             logger.info("Bot started with polling for Railway deployment.")
         else:
@@ -85,14 +111,21 @@ async def main():
         logger.info("Bot shutdown signal received.")
     finally:
         logger.info("Shutting down bot and scheduler...")
-        if scheduler.scheduler.running:
-            scheduler.scheduler.shutdown()
-            logger.info("Scheduler shut down.")
-        
+        await http_server.stop()
+        watchdog.stop()
+        await scheduler.shutdown()
+
         if application.running:
             await application.shutdown()
             logger.info("Bot application has been shut down.")
 
+        # Deliver queued sends, then persist any queued messages before exiting
+        await outbound.stop()
+        await utils.stop_announcer()
+        await db_utils.stop_background_tasks()
+        await db_utils.close_storage()
+        await llm_client.close()
+
 if __name__ == "__main__":
     try:
         asyncio.run(main())
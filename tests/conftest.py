@@ -0,0 +1,26 @@
+# tests/conftest.py
+import os
+import sys
+from collections import OrderedDict
+
+import pytest
+
+# The bot imports its modules relative to src/, as main.py does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+@pytest.fixture
+def memory_storage(monkeypatch):
+    """A fresh in-memory backend, with the caches in front of storage emptied."""
+    from database import db_utils
+    from database.backends import create_backend
+    from bot import memory
+
+    backend = create_backend("memory")
+    monkeypatch.setattr(db_utils, "BACKEND", backend)
+    monkeypatch.setattr(db_utils, "_settings_cache", OrderedDict())
+    monkeypatch.setattr(memory, "_buffers", OrderedDict())
+    monkeypatch.setattr(memory, "_warm_locks", {})
+    monkeypatch.setattr(memory, "_summaries", {})
+    monkeypatch.setattr(memory, "_versions", {})
+    return backend
@@ -0,0 +1,56 @@
+# tests/llm_stub.py
+"""A local chat-completions endpoint with per-model latency and failure injection."""
+import asyncio
+import json
+from typing import Dict, List
+
+from bot import http_server
+
+
+class StubLLM:
+    """
+    Answers OpenRouter-style completion requests on a free local port. Each model's reply is
+    delayed by `latency[model]` seconds (else `default_latency`) and fails with
+    `status[model]` when one is set. Counts requests, and the most ever in flight, per model,
+    and keeps the last message of every prompt.
+    """
+
+    def __init__(self, default_latency: float = 0.0):
+        self.default_latency = default_latency
+        self.latency: Dict[str, float] = {}
+        self.status: Dict[str, int] = {}
+        self.requests: Dict[str, int] = {}
+        self.prompts: List[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.server = None
+
+    async def __aenter__(self) -> "StubLLM":
+        self.server = await http_server.serve({("POST", "/api/v1/chat/completions"): self._complete}, 0, host="127.0.0.1")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.server.close()
+        await self.server.wait_closed()
+
+    @property
+    def url(self) -> str:
+        port = self.server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/api/v1/chat/completions"
+
+    async def _complete(self, request: http_server.Request) -> http_server.Response:
+        payload = json.loads(request.body)
+        model = payload["model"]
+        if payload.get("messages"):
+            self.prompts.append(payload["messages"][-1]["content"])
+        self.requests[model] = self.requests.get(model, 0) + 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency.get(model, self.default_latency))
+        finally:
+            self.in_flight -= 1
+        if model in self.status:
+            return http_server.text_response(self.status[model], "injected failure")
+        body = {"choices": [{"message": {"role": "assistant", "content": f"reply from {model}"}}]}
+        return 200, json.dumps(body).encode("utf-8"), "application/json"
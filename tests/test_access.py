@@ -0,0 +1,126 @@
+# tests/test_access.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from database import db_utils
+from bot import access, handlers, outbound, scheduler
+
+OWNER = 1001
+MEMBER = 2002
+STRANGER = 3003
+REJECTED = "This bot is for private use only."
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch, memory_storage):
+    """The owner registered as admin on a fresh in-memory backend; scheduling calls are recorded, not made."""
+    monkeypatch.setattr(db_utils, "OWNER_ID", OWNER)
+    monkeypatch.setattr(access, "_roles", {})
+    monkeypatch.setattr(access, "_provisioned", set())
+    monkeypatch.setattr(outbound, "_workers", [])
+    scheduled = SimpleNamespace(rescheduled=[], unscheduled=[])
+
+    async def reschedule_user(user_id):
+        scheduled.rescheduled.append(user_id)
+    monkeypatch.setattr(scheduler, "reschedule_user", reschedule_user)
+    monkeypatch.setattr(scheduler, "unschedule_user", scheduled.unscheduled.append)
+    asyncio.run(memory_storage.save_user(OWNER, access.ADMIN, None))
+    return scheduled
+
+
+class _User:
+    """Sends commands and messages as one Telegram user and collects the bot's replies."""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.replies = []
+
+    async def _reply_text(self, text: str, **kwargs):
+        self.replies.append(text)
+
+    async def run(self, handler, *args: str):
+        user = SimpleNamespace(id=self.user_id)
+        update = SimpleNamespace(effective_chat=user, effective_user=user,
+                                 message=SimpleNamespace(text=" ".join(args), reply_text=self._reply_text))
+        await handler(update, SimpleNamespace(args=list(args)))
+        return self.replies[-1] if self.replies else None
+
+
+@handlers.users_only
+async def _probe(update, context):
+    """Any handler open to registered users."""
+    await handlers._reply(update, "welcome")
+
+
+def test_an_unregistered_user_is_rejected(registry):
+    async def scenario():
+        await access.load()
+        return await _User(STRANGER).run(_probe)
+
+    assert asyncio.run(scenario()) == REJECTED
+    assert STRANGER not in access._provisioned
+    assert registry.rescheduled == []
+
+
+@pytest.mark.parametrize("command, args", [
+    (handlers.invite_command, (str(STRANGER),)),
+    (handlers.revoke_command, (str(OWNER),)),
+    (handlers.users_command, ()),
+])
+def test_members_cannot_manage_access(registry, memory_storage, command, args):
+    async def scenario():
+        await memory_storage.save_user(MEMBER, access.MEMBER, OWNER)
+        await access.load()
+        reply = await _User(MEMBER).run(command, *args)
+        return reply, await db_utils.get_users()
+
+    reply, users = asyncio.run(scenario())
+    assert reply == REJECTED
+    assert users == {OWNER: access.ADMIN, MEMBER: access.MEMBER}
+
+
+def test_revoke_takes_effect_at_once(registry):
+    async def scenario():
+        await access.load()
+        owner, member = _User(OWNER), _User(MEMBER)
+        await owner.run(handlers.invite_command, str(MEMBER))
+        first = await member.run(_probe)
+        provisioned = MEMBER in access._provisioned
+        await owner.run(handlers.revoke_command, str(MEMBER))
+        return first, provisioned, await member.run(_probe)
+
+    first, provisioned, after_revoke = asyncio.run(scenario())
+    assert (first, provisioned) == ("welcome", True)
+    assert after_revoke == REJECTED
+    assert not access.is_allowed(MEMBER)
+    assert MEMBER not in access._provisioned
+    assert registry.unscheduled == [MEMBER]
+
+
+def test_a_reinvited_user_is_provisioned_and_rescheduled_again(registry):
+    async def scenario():
+        await access.load()
+        owner, member = _User(OWNER), _User(MEMBER)
+        await owner.run(handlers.invite_command, str(MEMBER))
+        await member.run(_probe)
+        await member.run(_probe)  # Not a first contact
+        await owner.run(handlers.revoke_command, str(MEMBER))
+        await owner.run(handlers.invite_command, str(MEMBER))
+        return await member.run(_probe)
+
+    assert asyncio.run(scenario()) == "welcome"
+    assert registry.rescheduled.count(MEMBER) == 2
+    assert MEMBER in access._provisioned
+
+
+def test_load_only_counts_settings_of_registered_users(memory_storage):
+    async def scenario():
+        await memory_storage.save_user(MEMBER, access.MEMBER, OWNER)
+        for user_id in (OWNER, MEMBER, STRANGER):
+            await memory_storage.create_settings(user_id, db_utils.SETTING_DEFAULTS)
+        await access.load()
+
+    asyncio.run(scenario())
+    assert access._provisioned == {OWNER, MEMBER}
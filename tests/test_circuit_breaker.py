@@ -0,0 +1,136 @@
+# tests/test_circuit_breaker.py
+import asyncio
+import time
+
+import pytest
+
+from bot import circuit_breaker, llm_client, model_router, personas
+from bot.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from llm_stub import StubLLM
+
+PRIMARY, FALLBACK = "stub/primary", "stub/fallback"
+THRESHOLD = 2
+COOL_DOWN = 0.2
+
+
+@pytest.fixture(autouse=True)
+def breakers(monkeypatch):
+    """Two-model route with fresh, fast-cooling breakers and no hedging."""
+    monkeypatch.setattr(personas, "USE_LLM", True)
+    monkeypatch.setattr(personas, "MODEL_ROUTE", [PRIMARY, FALLBACK])
+    monkeypatch.setattr(personas, "OPENROUTER_API_URL", personas.OPENROUTER_API_URL)
+    monkeypatch.setattr(model_router, "HEDGE_ENABLED", False)
+    monkeypatch.setattr(llm_client, "_client", None)
+    monkeypatch.setattr(llm_client, "_semaphore", None)
+    monkeypatch.setattr(circuit_breaker, "_breakers", {
+        model: CircuitBreaker(model, failure_threshold=THRESHOLD, cool_down=COOL_DOWN) for model in (PRIMARY, FALLBACK)
+    })
+    return circuit_breaker._breakers
+
+
+def _with_stub(scenario):
+    """Runs scenario(stub) against a fresh stub endpoint."""
+    async def run():
+        async with StubLLM() as stub:
+            personas.OPENROUTER_API_URL = stub.url
+            try:
+                return await scenario(stub)
+            finally:
+                await llm_client.close()
+    return asyncio.run(run())
+
+
+def _reply():
+    return personas.generate_response("concise", "hello", [])
+
+
+def test_breaker_cycles_closed_open_half_open_closed():
+    breaker = CircuitBreaker("unit", failure_threshold=2, cool_down=COOL_DOWN)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(COOL_DOWN)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow(), "only one trial call at a time"
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.stats()['opened'] == 1 and breaker.stats()['rejected'] == 2
+
+
+def test_failed_trial_call_reopens():
+    breaker = CircuitBreaker("unit", failure_threshold=1, cool_down=COOL_DOWN)
+    breaker.record_failure()
+    time.sleep(COOL_DOWN)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_failing_model_opens_only_its_own_breaker(breakers):
+    async def scenario(stub):
+        stub.status[PRIMARY] = 500
+        replies = [await _reply() for _ in range(THRESHOLD + 3)]
+        return stub, replies
+
+    stub, replies = _with_stub(scenario)
+    assert replies == [f"reply from {FALLBACK}"] * (THRESHOLD + 3)
+    assert breakers[PRIMARY].state == OPEN
+    assert breakers[FALLBACK].state == CLOSED
+    # Once open, the failing model is skipped without a request
+    assert stub.requests[PRIMARY] == THRESHOLD
+    assert stub.requests[FALLBACK] == THRESHOLD + 3
+
+
+def test_slow_model_counts_as_failing(breakers, monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_READ_TIMEOUT", 0.1)
+
+    async def scenario(stub):
+        stub.latency[PRIMARY] = 1.0
+        return [await _reply() for _ in range(THRESHOLD + 1)]
+
+    assert _with_stub(scenario)[-1] == f"reply from {FALLBACK}"
+    assert breakers[PRIMARY].state == OPEN
+    assert breakers[FALLBACK].state == CLOSED
+
+
+def test_all_breakers_open_falls_back_to_templates_without_a_request(breakers):
+    async def scenario(stub):
+        stub.status[PRIMARY] = stub.status[FALLBACK] = 503
+        for _ in range(THRESHOLD):
+            await _reply()
+        assert all(breaker.state == OPEN for breaker in breakers.values())
+
+        # Would take a second per model if a request were made
+        stub.latency[PRIMARY] = stub.latency[FALLBACK] = 1.0
+        requests = dict(stub.requests)
+        started = time.perf_counter()
+        reply = await _reply()
+        return reply, time.perf_counter() - started, stub.requests == requests
+
+    reply, elapsed, no_requests = _with_stub(scenario)
+    assert reply in personas.PERSONAS["concise"]["templates"]
+    assert elapsed < 0.05
+    assert no_requests
+
+
+def test_recovered_model_closes_its_breaker_after_cool_down(breakers):
+    async def scenario(stub):
+        stub.status[PRIMARY] = 500
+        for _ in range(THRESHOLD):
+            await _reply()
+        assert breakers[PRIMARY].state == OPEN
+
+        del stub.status[PRIMARY]
+        assert await _reply() == f"reply from {FALLBACK}", "still open during the cool-down"
+        await asyncio.sleep(COOL_DOWN)
+        return await _reply()
+
+    assert _with_stub(scenario) == f"reply from {PRIMARY}"
+    assert breakers[PRIMARY].state == CLOSED
+    assert breakers[PRIMARY].stats()['opened'] == 1
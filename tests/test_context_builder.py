@@ -0,0 +1,98 @@
+# tests/test_context_builder.py
+import pytest
+
+from bot import context_builder
+from bot.context_builder import MESSAGE_OVERHEAD_TOKENS, build_messages, estimate_tokens, output_budget, prompt_budget
+
+MODEL = "test/model"
+
+
+@pytest.fixture(autouse=True)
+def budgets(monkeypatch):
+    monkeypatch.setattr(context_builder, "MODEL_CONTEXT_TOKENS", {MODEL: 10_000, "test/small": 1_500})
+    monkeypatch.setattr(context_builder, "DEFAULT_CONTEXT_TOKENS", 4_000)
+    monkeypatch.setattr(context_builder, "MAX_OUTPUT_TOKENS", 1_000)
+    monkeypatch.setattr(context_builder, "PROMPT_TOKEN_BUDGET", 2_000)
+
+
+def _history(count: int, words: int = 10):
+    return [("user" if i % 2 else "bot", f"m{i} " + "word " * words) for i in range(count)]
+
+
+def _tokens(messages) -> int:
+    return sum(estimate_tokens(message["content"]) for message in messages)
+
+
+def test_budget_is_the_cap_or_the_window_less_the_reply(monkeypatch):
+    assert prompt_budget(MODEL) == 2_000  # min(2000, 10000 - 1000)
+    assert prompt_budget("test/small") == 1_125  # min(2000, 1500 - 1500 // 4)
+    assert prompt_budget("unknown/model") == 2_000  # min(2000, 4000 - 1000)
+    monkeypatch.setattr(context_builder, "MAX_OUTPUT_TOKENS", 5_000)
+    assert output_budget(MODEL) == 2_500, "the reply gets at most a quarter of the window"
+    assert prompt_budget(MODEL) == 2_000
+
+
+def test_an_unknown_model_keeps_most_of_the_default_window(monkeypatch, caplog):
+    monkeypatch.setattr(context_builder, "DEFAULT_CONTEXT_TOKENS", 32_768)
+    monkeypatch.setattr(context_builder, "MAX_OUTPUT_TOKENS", 32_000)
+    monkeypatch.setattr(context_builder, "PROMPT_TOKEN_BUDGET", 8_000)
+    monkeypatch.setattr(context_builder, "_unknown_models", set())
+    assert output_budget("unknown/model") == 8_192
+    assert prompt_budget("unknown/model") == 8_000
+    assert [r.getMessage() for r in caplog.records].count(
+        "No context window known for model unknown/model; assuming 32768 tokens.") == 1, "warned once"
+
+
+def test_token_estimate():
+    assert estimate_tokens("") == MESSAGE_OVERHEAD_TOKENS
+    assert estimate_tokens("a" * 40) == 10 + MESSAGE_OVERHEAD_TOKENS
+    assert estimate_tokens("abcde") == 2 + MESSAGE_OVERHEAD_TOKENS  # Rounded up
+    assert estimate_tokens("日本語") == 3 + MESSAGE_OVERHEAD_TOKENS  # One per non-ASCII character
+    assert estimate_tokens("hi 👋") == 1 + 1 + MESSAGE_OVERHEAD_TOKENS
+
+
+def test_short_history_is_sent_whole_in_order():
+    history = _history(6)
+    messages = build_messages("system", history, "latest", MODEL)
+    assert messages[0] == {"role": "system", "content": "system"}
+    assert messages[-1] == {"role": "user", "content": "latest"}
+    assert [(m["role"], m["content"]) for m in messages[1:-1]] == [
+        ("assistant" if role == "bot" else "user", content) for role, content in history
+    ]
+
+
+def test_long_history_keeps_the_newest_messages_that_fit():
+    history = _history(1_000)
+    messages = build_messages("system", history, "latest", MODEL)
+    kept = [m["content"] for m in messages[1:-1]]
+    assert kept == [content for _, content in history[-len(kept):]], "a contiguous run of the newest messages"
+    assert 0 < len(kept) < len(history)
+    assert _tokens(messages) <= prompt_budget(MODEL)
+    # One more message would not have fit
+    assert _tokens(messages) + estimate_tokens(history[-len(kept) - 1][1]) > prompt_budget(MODEL)
+
+
+def test_packing_stops_at_the_first_message_that_does_not_fit():
+    history = [("user", "old and short"), ("bot", "word " * 4_000), ("user", "newest")]
+    messages = build_messages("system", history, "latest", MODEL)
+    assert [m["content"] for m in messages] == ["system", "newest", "latest"]
+
+
+def test_summary_and_recall_are_always_kept_and_history_gets_the_rest():
+    history = _history(1_000)
+    recalled = [("user", "about the gym"), ("bot", "you went twice")]
+    plain = build_messages("system", history, "latest", MODEL)
+    messages = build_messages("system", history, "latest", MODEL, summary="we talked about goals", recalled=recalled)
+
+    assert messages[1]["role"] == "system" and messages[1]["content"].startswith(context_builder.SUMMARY_HEADER)
+    assert messages[2]["role"] == "system" and messages[2]["content"].startswith(context_builder.RECALLED_HEADER)
+    assert "- User: about the gym" in messages[2]["content"]
+    assert "- Assistant: you went twice" in messages[2]["content"]
+    assert len(messages) - 3 < len(plain) - 2, "history shrinks to make room"
+    assert _tokens(messages) <= prompt_budget(MODEL)
+
+
+def test_no_history_when_the_fixed_parts_fill_the_budget():
+    messages = build_messages("system " * 2_000, _history(10), "latest", MODEL, summary="summary")
+    assert [m["role"] for m in messages] == ["system", "system", "user"]
+    assert messages[-1]["content"] == "latest"
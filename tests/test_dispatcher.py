@@ -0,0 +1,85 @@
+# tests/test_dispatcher.py
+import asyncio
+import random
+import time
+
+import pytest
+
+from bot import dispatcher
+
+JOB_SECONDS = 0.01
+
+
+@pytest.fixture(autouse=True)
+def fresh_dispatcher(monkeypatch):
+    monkeypatch.setattr(dispatcher, "_workers", {})
+    monkeypatch.setattr(dispatcher, "_counters", {'jobs': 0, 'workers_started': 0, 'workers_reclaimed': 0})
+
+
+async def _stress(chats: int, jobs_per_chat: int, seed: int = 1):
+    """Interleaves submissions across chats, with jobs of random length. Returns (runs per chat, seconds)."""
+    rng = random.Random(seed)
+    ran = {chat: [] for chat in range(chats)}
+
+    def job(chat: int, index: int, seconds: float):
+        async def run():
+            await asyncio.sleep(seconds)
+            ran[chat].append(index)
+            return index
+        return run
+
+    submissions = [chat for chat in range(chats) for _ in range(jobs_per_chat)]
+    rng.shuffle(submissions)
+    submitted = dict.fromkeys(range(chats), 0)
+    futures = []
+    started = time.perf_counter()
+    for chat in submissions:
+        futures.append(dispatcher.submit(chat, job(chat, submitted[chat], rng.uniform(0, 2 * JOB_SECONDS))))
+        submitted[chat] += 1
+    await asyncio.gather(*futures)
+    return ran, time.perf_counter() - started
+
+
+def test_each_chats_jobs_run_in_submission_order():
+    ran, _ = asyncio.run(_stress(chats=50, jobs_per_chat=20))
+    assert all(indexes == list(range(20)) for indexes in ran.values())
+
+
+def test_throughput_scales_with_active_chats():
+    _, one = asyncio.run(_stress(chats=1, jobs_per_chat=20))
+    _, many = asyncio.run(_stress(chats=100, jobs_per_chat=20))
+    # 100x the work in about the same time: chats run in parallel, not one after another
+    assert many < 2 * one
+
+
+def test_a_failing_job_does_not_stop_the_chat():
+    async def fail():
+        raise ValueError("boom")
+
+    async def ok():
+        return "ok"
+
+    async def scenario():
+        failed, after = dispatcher.submit("chat", fail), dispatcher.submit("chat", ok)
+        with pytest.raises(ValueError):
+            await failed
+        return await after
+
+    assert asyncio.run(scenario()) == "ok"
+
+
+def test_idle_workers_are_reclaimed(monkeypatch):
+    monkeypatch.setattr(dispatcher, "DISPATCH_IDLE_TIMEOUT", 0.05)
+
+    async def scenario():
+        async def noop():
+            return None
+        await asyncio.gather(*(dispatcher.run(chat, noop) for chat in range(10)))
+        active = dispatcher.stats()['active_workers']
+        await asyncio.sleep(0.2)
+        return active, dispatcher.stats()
+
+    active, stats = asyncio.run(scenario())
+    assert active == 10
+    assert stats['active_workers'] == 0
+    assert stats['workers_reclaimed'] == 10
@@ -0,0 +1,71 @@
+# tests/test_http_server.py
+import asyncio
+
+import pytest
+
+from bot import http_server, webhook
+
+
+class _Application:
+    """Just enough of telegram.ext.Application for webhook.register."""
+
+    def __init__(self):
+        self.bot = None
+        self.update_queue = asyncio.Queue()
+
+
+async def _exchange(raw: bytes, routes) -> int:
+    """Sends a raw request to a fresh server on `routes` and returns the response status."""
+    server = await http_server.serve(routes, 0, host="127.0.0.1")
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        writer.write(raw)
+        await writer.drain()
+        status_line = await reader.readline()
+        writer.close()
+        return int(status_line.split()[1])
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+def _health(raw: bytes) -> int:
+    return asyncio.run(_exchange(raw, {("GET", "/healthz"): http_server._health}))
+
+
+def test_well_formed_request():
+    assert _health(b"GET /healthz HTTP/1.1\r\nConnection: close\r\n\r\n") == 200
+
+
+@pytest.mark.parametrize("raw", [
+    b"GARBAGE\r\n\r\n",
+    b"GET /healthz HTTP/1.1\r\nContent-Length: abc\r\n\r\n",
+    b"GET /healthz HTTP/1.1\r\nContent-Length: -5\r\n\r\n",
+])
+def test_malformed_request_is_a_bad_request(raw):
+    assert _health(raw) == 400
+
+
+def test_oversize_body_is_too_large(monkeypatch):
+    monkeypatch.setattr(http_server, "HTTP_MAX_BODY_BYTES", 10)
+    assert _health(b"POST /healthz HTTP/1.1\r\nContent-Length: 11\r\n\r\n") == 413
+
+
+def _webhook(secret_header: bytes) -> int:
+    async def exchange():
+        http_server._routes.pop(("POST", webhook.WEBHOOK_PATH), None)
+        webhook.register(_Application())
+        handler = http_server._routes.pop(("POST", webhook.WEBHOOK_PATH))
+        body = b'{"update_id": 1}'
+        raw = (f"POST {webhook.WEBHOOK_PATH} HTTP/1.1\r\nContent-Length: {len(body)}\r\n".encode("latin-1")
+               + secret_header + b"Connection: close\r\n\r\n" + body)
+        return await _exchange(raw, {("POST", webhook.WEBHOOK_PATH): handler})
+    return asyncio.run(exchange())
+
+
+def test_webhook_secret_is_checked(monkeypatch):
+    monkeypatch.setattr(webhook, "WEBHOOK_SECRET", "s3cret")
+    assert _webhook(b"") == 401
+    assert _webhook(b"X-Telegram-Bot-Api-Secret-Token: wrong\r\n") == 403
+    assert _webhook("X-Telegram-Bot-Api-Secret-Token: sécret\r\n".encode("utf-8")) == 403
+    assert _webhook(b"X-Telegram-Bot-Api-Secret-Token: s3cret\r\n") == 200
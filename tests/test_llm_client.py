@@ -0,0 +1,74 @@
+# tests/test_llm_client.py
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from bot import circuit_breaker, llm_client, model_router, personas
+from llm_stub import StubLLM
+
+LATENCY = 0.3
+
+
+@pytest.fixture(autouse=True)
+def llm(monkeypatch):
+    """Routes personas at a fresh client, semaphore and set of breakers for each test."""
+    monkeypatch.setattr(personas, "USE_LLM", True)
+    monkeypatch.setattr(personas, "MODEL_ROUTE", ["stub/model"])
+    # Each test points this at its own stub; restored afterwards
+    monkeypatch.setattr(personas, "OPENROUTER_API_URL", personas.OPENROUTER_API_URL)
+    monkeypatch.setattr(model_router, "HEDGE_ENABLED", False)
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    monkeypatch.setattr(llm_client, "_client", None)
+    monkeypatch.setattr(llm_client, "_semaphore", None)
+
+
+async def _run_with_stub(stub: StubLLM, calls: int) -> float:
+    """Sends `calls` replies concurrently through personas and returns the wall time."""
+    async with stub:
+        personas.OPENROUTER_API_URL = stub.url
+        try:
+            started = time.perf_counter()
+            replies = await asyncio.gather(*(
+                personas.generate_response("concise", f"message {i}", []) for i in range(calls)
+            ))
+            elapsed = time.perf_counter() - started
+        finally:
+            await llm_client.close()
+    assert replies == ["reply from stub/model"] * calls
+    return elapsed
+
+
+def test_concurrent_calls_take_about_one_round_trip():
+    stub = StubLLM(default_latency=LATENCY)
+    elapsed = asyncio.run(_run_with_stub(stub, llm_client.LLM_MAX_CONCURRENCY))
+
+    # Serial calls would take LLM_MAX_CONCURRENCY round trips
+    assert elapsed < 2 * LATENCY
+    assert stub.max_in_flight == llm_client.LLM_MAX_CONCURRENCY
+
+
+def test_concurrency_is_bounded(monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_MAX_CONCURRENCY", 2)
+    stub = StubLLM(default_latency=LATENCY)
+    elapsed = asyncio.run(_run_with_stub(stub, 6))
+
+    assert stub.max_in_flight == 2
+    assert 3 * LATENCY <= elapsed < 4 * LATENCY
+
+
+def test_read_timeout_bounds_a_slow_call(monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_READ_TIMEOUT", 0.1)
+
+    async def call():
+        async with StubLLM(default_latency=1.0) as stub:
+            try:
+                started = time.perf_counter()
+                with pytest.raises(httpx.ReadTimeout):
+                    await llm_client.post_json(stub.url, {"model": "stub/model"}, {})
+                return time.perf_counter() - started
+            finally:
+                await llm_client.close()
+
+    assert asyncio.run(call()) < 0.5
@@ -0,0 +1,131 @@
+# tests/test_message_debounce.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bot import access, circuit_breaker, dispatcher, handlers, llm_client, model_router, personas, retrieval
+from llm_stub import StubLLM
+
+USER = 4242
+MODEL = "stub/model"
+REPLY = f"reply from {MODEL}"
+WINDOW = 0.05
+LATENCY = 0.3
+
+
+@pytest.fixture(autouse=True)
+def bot(monkeypatch, memory_storage):
+    """One registered user, a short debounce window and non-streaming replies from a stub LLM."""
+    monkeypatch.setattr(handlers, "DEBOUNCE_WINDOW", WINDOW)
+    monkeypatch.setattr(handlers, "STREAM_REPLIES", False)
+    monkeypatch.setattr(handlers, "_pending_turns", {})
+    monkeypatch.setattr(handlers, "_active_turns", {})
+    monkeypatch.setattr(handlers, "send_to_alexa", lambda message_text: None)
+    monkeypatch.setattr(dispatcher, "_workers", {})
+    monkeypatch.setattr(retrieval, "RETRIEVAL_ENABLED", False)
+    monkeypatch.setattr(access, "_roles", {USER: access.MEMBER})
+    monkeypatch.setattr(access, "_provisioned", {USER})
+    monkeypatch.setattr(personas, "USE_LLM", True)
+    monkeypatch.setattr(personas, "MODEL_ROUTE", [MODEL])
+    monkeypatch.setattr(personas, "OPENROUTER_API_URL", personas.OPENROUTER_API_URL)
+    monkeypatch.setattr(model_router, "HEDGE_ENABLED", False)
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    monkeypatch.setattr(llm_client, "_client", None)
+    monkeypatch.setattr(llm_client, "_semaphore", None)
+    return memory_storage
+
+
+class _Chat:
+    """Builds fake updates from one private chat and collects the replies sent to it."""
+
+    def __init__(self):
+        self.replies = []
+
+    async def _reply_text(self, text: str, **kwargs):
+        self.replies.append(text)
+
+    async def send(self, text: str):
+        user = SimpleNamespace(id=USER)
+        update = SimpleNamespace(effective_chat=user, effective_user=user,
+                                 message=SimpleNamespace(text=text, reply_text=self._reply_text))
+        await handlers.handle_message(update, None)
+
+
+def _converse(script):
+    """Runs script(chat) against a stub LLM and waits for every turn to finish. Returns (chat, stub)."""
+    async def run():
+        chat = _Chat()
+        async with StubLLM(default_latency=LATENCY) as stub:
+            personas.OPENROUTER_API_URL = stub.url
+            try:
+                await script(chat)
+                while handlers._pending_turns or handlers._active_turns:
+                    await asyncio.sleep(0.01)
+                # The reply is stored after delivery; cancelled requests finish on the stub's side
+                await asyncio.sleep(LATENCY)
+            finally:
+                await llm_client.close()
+        return chat, stub
+    return asyncio.run(run())
+
+
+def _stored(backend):
+    return asyncio.run(backend.last_messages(USER, 50))
+
+
+def test_a_burst_is_one_turn_and_one_llm_call(bot):
+    async def script(chat):
+        for text in ("one", "two", "three"):
+            await chat.send(text)
+            await asyncio.sleep(WINDOW / 5)
+
+    chat, stub = _converse(script)
+    assert stub.requests == {MODEL: 1}
+    assert stub.prompts == ["one\ntwo\nthree"]
+    assert chat.replies == [REPLY]
+    assert _stored(bot) == [("user", "one\ntwo\nthree"), ("bot", REPLY)]
+
+
+def test_input_during_generation_cancels_the_reply(bot):
+    async def script(chat):
+        await chat.send("one")
+        await asyncio.sleep(WINDOW + LATENCY / 2)  # The first reply is being generated
+        await chat.send("two")
+
+    chat, stub = _converse(script)
+    assert stub.requests == {MODEL: 2}
+    assert chat.replies == [REPLY], "only the newer turn is answered"
+    # The first message was stored before generation began, so the second turn sees it as history
+    assert _stored(bot) == [("user", "one"), ("user", "two"), ("bot", REPLY)]
+
+
+def test_input_while_queued_behind_a_command_joins_the_turn(bot):
+    async def script(chat):
+        dispatcher.submit(USER, lambda: asyncio.sleep(4 * WINDOW))  # e.g. a slow /export_memory
+        await chat.send("one")
+        await asyncio.sleep(2 * WINDOW)  # The turn is now waiting in the dispatcher
+        await chat.send("two")
+
+    chat, stub = _converse(script)
+    assert stub.requests == {MODEL: 1}
+    assert stub.prompts == ["one\ntwo"]
+    assert chat.replies == [REPLY]
+    assert _stored(bot) == [("user", "one\ntwo"), ("bot", REPLY)]
+
+
+def test_input_while_the_turn_reads_history_joins_the_turn(bot, monkeypatch):
+    async def slow_search(user_id, query, k=retrieval.RETRIEVAL_TOP_K, exclude_recent=0):
+        await asyncio.sleep(4 * WINDOW)
+        return []
+    monkeypatch.setattr(retrieval, "search", slow_search)
+
+    async def script(chat):
+        await chat.send("one")
+        await asyncio.sleep(2 * WINDOW)  # Inside retrieval, before the message is stored
+        await chat.send("two")
+
+    chat, stub = _converse(script)
+    assert stub.requests == {MODEL: 1}
+    assert chat.replies == [REPLY]
+    assert _stored(bot) == [("user", "one\ntwo"), ("bot", REPLY)]
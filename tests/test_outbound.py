@@ -0,0 +1,130 @@
+# tests/test_outbound.py
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+import pytest
+from telegram.error import RetryAfter
+
+from bot import outbound
+
+CHAT_RATE = 20  # One send per 50ms in a chat
+GLOBAL_RATE = 50  # One send per 20ms overall
+SLACK = 0.9  # Timer granularity
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    """Small limits, one token of burst each, and a dispatcher with no state from other tests."""
+    monkeypatch.setattr(outbound, "OUTBOUND_CHAT_RATE", CHAT_RATE)
+    monkeypatch.setattr(outbound, "OUTBOUND_CHAT_BURST", 1)
+    monkeypatch.setattr(outbound, "OUTBOUND_GLOBAL_RATE", GLOBAL_RATE)
+    monkeypatch.setattr(outbound, "OUTBOUND_GLOBAL_BURST", 1)
+    monkeypatch.setattr(outbound, "_workers", [])
+    monkeypatch.setattr(outbound, "_chats", OrderedDict())
+    monkeypatch.setattr(outbound, "_sequence", itertools.count())
+    monkeypatch.setattr(outbound, "_depth", 0)
+    monkeypatch.setattr(outbound, "_stats", {
+        name: {'sent': 0, 'failed': 0, 'retries': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+        for name in outbound._PRIORITY_NAMES.values()
+    })
+
+
+class _Bot:
+    """Records each send_message call as (chat_id, text, monotonic time); flood control is set per chat."""
+
+    def __init__(self):
+        self.calls = []
+        self.flood_control = {}  # chat_id -> seconds Telegram asks to wait, once
+        self.gate = None  # While set and not open, sends wait for it
+
+    async def send_message(self, chat_id: int, text: str):
+        self.calls.append((chat_id, text, time.monotonic()))
+        if self.gate is not None:
+            await self.gate.wait()
+        if chat_id in self.flood_control:
+            raise RetryAfter(timedelta(seconds=self.flood_control.pop(chat_id)))
+        return text
+
+
+def _send(bot: _Bot, chat_id: int, text: str, priority: int = outbound.INTERACTIVE):
+    return outbound.send(chat_id, lambda: bot.send_message(chat_id, text), priority)
+
+
+def _dispatch(scenario):
+    """Runs scenario() with the dispatcher started and waits for it to drain."""
+    async def run():
+        outbound.start()
+        try:
+            return await scenario()
+        finally:
+            await outbound.stop()
+    return asyncio.run(run())
+
+
+def _gaps(times):
+    return [later - earlier for earlier, later in zip(times, times[1:])]
+
+
+def test_sends_to_one_chat_are_spaced_by_its_rate(monkeypatch):
+    monkeypatch.setattr(outbound, "OUTBOUND_WORKERS", 4)
+    bot = _Bot()
+
+    async def scenario():
+        return await asyncio.gather(*(_send(bot, 1, f"message {i}") for i in range(5)))
+
+    assert _dispatch(scenario) == [f"message {i}" for i in range(5)]
+    assert [text for _, text, _ in bot.calls] == [f"message {i}" for i in range(5)]
+    assert min(_gaps([at for _, _, at in bot.calls])) >= SLACK / CHAT_RATE
+
+
+def test_sends_across_chats_are_capped_by_the_global_rate(monkeypatch):
+    monkeypatch.setattr(outbound, "OUTBOUND_WORKERS", 4)
+    bot = _Bot()
+
+    async def scenario():
+        await asyncio.gather(*(_send(bot, chat_id, "hello") for chat_id in range(20)))
+
+    _dispatch(scenario)
+    times = [at for _, _, at in bot.calls]
+    assert len(times) == 20
+    # Each chat's own bucket is full, so only the global one holds them back
+    assert min(_gaps(times)) >= SLACK / GLOBAL_RATE
+    assert times[-1] - times[0] >= SLACK * 19 / GLOBAL_RATE
+
+
+def test_an_interactive_send_overtakes_earlier_scheduled_ones(monkeypatch):
+    monkeypatch.setattr(outbound, "OUTBOUND_WORKERS", 1)
+    bot = _Bot()
+
+    async def scenario():
+        bot.gate = asyncio.Event()
+        busy = asyncio.ensure_future(_send(bot, 0, "in flight"))
+        await asyncio.sleep(0.01)  # The only worker is now waiting on Telegram
+        pings = [asyncio.ensure_future(_send(bot, chat_id, "ping", outbound.SCHEDULED)) for chat_id in (1, 2, 3)]
+        reply = asyncio.ensure_future(_send(bot, 4, "reply"))
+        await asyncio.sleep(0.01)
+        bot.gate.set()
+        await asyncio.gather(busy, reply, *pings)
+
+    _dispatch(scenario)
+    assert [chat_id for chat_id, _, _ in bot.calls] == [0, 4, 1, 2, 3]
+
+
+def test_retry_after_holds_back_the_chat_and_every_other_send(monkeypatch):
+    monkeypatch.setattr(outbound, "OUTBOUND_WORKERS", 4)
+    bot = _Bot()
+    bot.flood_control[1] = 0.3
+
+    async def scenario():
+        flooded = asyncio.ensure_future(_send(bot, 1, "flooded"))
+        await asyncio.sleep(0.05)  # Telegram has answered with RetryAfter
+        return await asyncio.gather(flooded, _send(bot, 2, "other chat"))
+
+    assert _dispatch(scenario) == ["flooded", "other chat"]
+    (_, _, first), *later = bot.calls
+    assert sorted((chat_id, text) for chat_id, text, _ in later) == [(1, "flooded"), (2, "other chat")]
+    assert all(at - first >= SLACK * 0.3 for _, _, at in later)
+    assert outbound.stats()['interactive']['retries'] == 1
@@ -0,0 +1,93 @@
+# tests/test_ping_prefetch.py
+import asyncio
+from datetime import datetime
+
+import pytest
+import pytz
+
+from bot import memory, outbound, scheduler
+
+USER = 5151
+FIRE_TIME = scheduler._fire_time(datetime(2024, 1, 1, 9, tzinfo=pytz.utc))
+
+
+class _Bot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id: int, text: str):
+        self.sent.append(text)
+
+
+@pytest.fixture(autouse=True)
+def pings(monkeypatch, memory_storage):
+    """Numbered pings from a stand-in generator, sent straight to a fake bot; no tick jobs are created."""
+    generated = []
+
+    async def generate_ping(persona, history, summary=None):
+        generated.append(f"ping {len(generated) + 1}")
+        return generated[-1]
+
+    monkeypatch.setattr(scheduler, "generate_ping", generate_ping)
+    monkeypatch.setattr(scheduler, "send_to_alexa", lambda message_text: None)
+    monkeypatch.setattr(scheduler, "_bot", _Bot())
+    monkeypatch.setattr(scheduler, "_ensure_tick_job", lambda tick_key: None)
+    monkeypatch.setattr(scheduler, "_tick_members", {})
+    monkeypatch.setattr(scheduler, "_user_tick", {})
+    monkeypatch.setattr(scheduler, "_ping_cache", {})
+    monkeypatch.setattr(scheduler, "_prefetching", {})
+    monkeypatch.setattr(outbound, "_workers", [])
+    return generated
+
+
+def test_the_prefetched_ping_is_sent_when_nothing_was_said(pings):
+    async def scenario():
+        await scheduler._prefetch_ping(USER, FIRE_TIME, 0)
+        await scheduler.send_ping(USER, FIRE_TIME)
+
+    asyncio.run(scenario())
+    assert pings == ["ping 1"]
+    assert scheduler._bot.sent == ["ping 1"]
+    assert scheduler._ping_cache == {}
+
+
+def test_the_ping_is_generated_again_after_a_new_message(pings):
+    async def scenario():
+        await scheduler._prefetch_ping(USER, FIRE_TIME, 0)
+        await memory.add_message(USER, 'user', "I finished the report")
+        await scheduler.send_ping(USER, FIRE_TIME)
+
+    asyncio.run(scenario())
+    assert pings == ["ping 1", "ping 2"]
+    assert scheduler._bot.sent == ["ping 2"]
+
+
+def test_reschedule_drops_cached_and_pending_pings(pings):
+    async def scenario():
+        await scheduler._prefetch_ping(USER, FIRE_TIME, 0)
+        later = scheduler._fire_time(datetime(2024, 1, 1, 10, tzinfo=pytz.utc))
+        scheduler._prefetching[(USER, later)] = asyncio.create_task(scheduler._prefetch_ping(USER, later, 0.05))
+        await scheduler.reschedule_user(USER)
+        await asyncio.sleep(0.1)  # The pending generation would have finished by now
+        cache, prefetching = dict(scheduler._ping_cache), dict(scheduler._prefetching)
+        await scheduler.send_ping(USER, FIRE_TIME)
+        return cache, prefetching
+
+    cache, prefetching = asyncio.run(scenario())
+    assert cache == {} and prefetching == {}
+    assert pings == ["ping 1", "ping 2"]
+    assert scheduler._bot.sent == ["ping 2"]
+
+
+def test_a_tick_waiting_on_a_dropped_generation_still_sends(pings):
+    async def scenario():
+        key = (USER, FIRE_TIME)
+        scheduler._prefetching[key] = asyncio.create_task(scheduler._prefetch_ping(USER, FIRE_TIME, 0.05))
+        tick = asyncio.create_task(scheduler.send_ping(USER, FIRE_TIME))
+        await asyncio.sleep(0.01)  # The tick is waiting for the pending generation
+        await scheduler.reschedule_user(USER)
+        await tick
+
+    asyncio.run(scenario())
+    assert pings == ["ping 1"]
+    assert scheduler._bot.sent == ["ping 1"]
@@ -0,0 +1,260 @@
+# tests/test_storage_backends.py
+"""
+The behaviour db_utils relies on, checked against every storage backend. Postgres runs only
+when DATABASE_URL is set; point it at a throwaway database, as trims cover every user.
+"""
+import asyncio
+import itertools
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from database.backends import COLUMN_DEFAULTS, SNIPPET_END, SNIPPET_START, StorageBackend, create_backend
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+OWNER_DEFAULTS = {'persona': 'accountability', 'timezone': 'Europe/London', 'ping_frequency_hours': 2.0}
+
+# Far above real Telegram ids and fresh per run, so a shared database keeps its own rows
+_user_ids = itertools.count(9_000_000_000 + int(time.time()) % 100_000 * 1000)
+
+
+def _rows(user_id: int, count: int, start: datetime = START, prefix: str = "message"):
+    return [(user_id, "user" if i % 2 else "bot", f"{prefix} {i}", start + timedelta(seconds=i)) for i in range(count)]
+
+
+async def _archived(backend, user_id: int, batch_size: int = 100):
+    return [row async for batch in backend.iter_archive(user_id, batch_size) for row in batch]
+
+
+@pytest.fixture(params=["memory", "sqlite", "postgres"])
+def storage(request, tmp_path, monkeypatch):
+    """Runs storage(scenario) with a connected, initialized backend of each kind and returns its result."""
+    database_url = os.getenv("DATABASE_URL")
+    if request.param == "postgres" and not database_url:
+        pytest.skip("needs DATABASE_URL")
+    monkeypatch.chdir(REPO_ROOT)  # Schema paths are relative to the repository
+
+    def run(scenario):
+        async def main():
+            backend = create_backend(request.param, database_url, str(tmp_path / "bot.db"))
+            await backend.connect()
+            try:
+                await backend.initialize()
+                return await scenario(backend)
+            finally:
+                await backend.close()
+        return asyncio.run(main())
+    return run
+
+
+def test_a_backend_missing_an_operation_fails_when_created():
+    class Incomplete(StorageBackend):
+        async def connect(self):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_users(storage):
+    owner, user = next(_user_ids), next(_user_ids)
+
+    async def scenario(backend):
+        # initialize registers the bootstrap admin; saving again changes the role only
+        await backend.initialize(owner)
+        await backend.initialize(owner)
+        assert (await backend.load_users()).get(owner) == 'admin'
+        await backend.save_user(user, 'member', owner)
+        await backend.save_user(user, 'admin', owner)
+        assert (await backend.load_users()).get(user) == 'admin'
+        assert await backend.delete_user(user)
+        assert not await backend.delete_user(user)
+        assert user not in await backend.load_users()
+        await backend.delete_user(owner)
+    storage(scenario)
+
+
+def test_settings(storage):
+    owner, user = next(_user_ids), next(_user_ids)
+
+    async def scenario(backend):
+        # create_settings only writes a missing row; upserts fill the other columns with table defaults
+        assert await backend.create_settings(owner, OWNER_DEFAULTS)
+        assert not await backend.create_settings(owner, {**OWNER_DEFAULTS, 'persona': 'changed'})
+        assert await backend.fetch_settings(owner) == OWNER_DEFAULTS
+        assert await backend.fetch_settings(user) == {}
+        row = await backend.upsert_setting(user, 'persona', 'motivational')
+        assert row == {**COLUMN_DEFAULTS, 'persona': 'motivational'}
+        row = await backend.upsert_setting(user, 'ping_frequency_hours', 0.5)
+        assert row['persona'] == 'motivational' and row['ping_frequency_hours'] == 0.5
+        assert await backend.fetch_settings(user) == row
+        all_settings = {row['user_id']: row for row in await backend.fetch_all_settings()}
+        assert all_settings[user] == {'user_id': user, **row}
+    storage(scenario)
+
+
+def test_last_messages_are_the_newest_in_timestamp_order(storage):
+    user, other, unknown = next(_user_ids), next(_user_ids), next(_user_ids)
+
+    async def scenario(backend):
+        await backend.insert_messages(_rows(user, 10))
+        await backend.insert_messages(_rows(other, 3, prefix="other"))
+        await backend.insert_messages([(other, "bot", "late arrival", START + timedelta(seconds=1, milliseconds=500))])
+        assert await backend.last_messages(user, 4) == [
+            ("bot", "message 6"), ("user", "message 7"), ("bot", "message 8"), ("user", "message 9")]
+        assert [c for _, c in await backend.last_messages(other, 10)] == ["other 0", "other 1", "late arrival", "other 2"]
+        assert await backend.last_messages(unknown, 5) == []
+        await backend.clear_memory(user)
+        await backend.clear_memory(other)
+    storage(scenario)
+
+
+def test_summaries_never_cover_the_newest_messages(storage):
+    user, other = next(_user_ids), next(_user_ids)
+
+    async def scenario(backend):
+        await backend.insert_messages(_rows(user, 10))
+        await backend.insert_messages(_rows(other, 3))
+        assert await backend.summary_state(user) == (None, 0)
+        to_summarize = await backend.users_to_summarize(5)
+        assert user in to_summarize and other not in to_summarize
+        summary, pending = await backend.messages_to_summarize(user, 4)
+        assert summary is None and [c for _, _, c in pending] == [f"message {i}" for i in range(6)]
+        await backend.save_summary(user, "first summary", pending[-1][0])
+        assert await backend.summary_state(user) == ("first summary", 4)
+        assert await backend.messages_to_summarize(user, 4) == ("first summary", [])
+        assert user not in await backend.users_to_summarize(4)
+        await backend.save_summary(user, "second summary", pending[-1][0])
+        assert await backend.summary_state(user) == ("second summary", 4)
+        await backend.clear_memory(user)
+        await backend.clear_memory(other)
+    storage(scenario)
+
+
+def test_trimming_keeps_the_newest_and_spares_unsummarized_rows(storage):
+    user, other = next(_user_ids), next(_user_ids)
+
+    async def scenario(backend):
+        await backend.insert_messages(_rows(user, 10))
+        await backend.insert_messages(_rows(other, 4, prefix="other"))
+        _, pending = await backend.messages_to_summarize(user, 4)
+        await backend.save_summary(user, "summary", pending[-1][0])
+        await backend.insert_messages(_rows(user, 6, START + timedelta(hours=1), prefix="recent"))
+
+        assert await backend.trim_messages(keep=3, retain_unsummarized=True, hard_limit=100) >= 6
+        assert len(await backend.last_messages(user, 100)) == 10, "summarized rows trimmed, the rest kept"
+        assert len(await backend.last_messages(other, 100)) == 4, "unsummarized rows kept"
+        await backend.trim_messages(keep=3, retain_unsummarized=True, hard_limit=5)
+        assert len(await backend.last_messages(user, 100)) == 5, "hard limit"
+        await backend.trim_messages(keep=3, retain_unsummarized=False, hard_limit=100)
+        assert [c for _, c in await backend.last_messages(user, 100)] == ["recent 3", "recent 4", "recent 5"]
+        assert len(await backend.last_messages(other, 100)) == 3
+        await backend.clear_memory(user)
+        await backend.clear_memory(other)
+    storage(scenario)
+
+
+def test_clear_memory_drops_the_summary_and_ids_are_not_reused(storage):
+    user = next(_user_ids)
+
+    async def scenario(backend):
+        await backend.insert_messages(_rows(user, 1))
+        _, pending = await backend.messages_to_summarize(user, 0)
+        await backend.save_summary(user, "summary", pending[0][0])
+        await backend.clear_memory(user)
+        assert await backend.summary_state(user) == (None, 0)
+        await backend.insert_messages(_rows(user, 1))
+        _, pending_again = await backend.messages_to_summarize(user, 0)
+        assert pending_again[0][0] > pending[0][0]
+        await backend.clear_memory(user)
+    storage(scenario)
+
+
+def test_jobs_load_soonest_first_and_write_together(storage):
+    job_a, job_b, job_c = (f"test-{next(_user_ids)}-{name}" for name in "abc")
+
+    async def scenario(backend):
+        ours = lambda jobs: [job for job in jobs if job[0] in (job_a, job_b, job_c)]
+        # Paused jobs (no next run) load last
+        await backend.write_jobs([(job_a, 200.0, b"a"), (job_b, 100.0, b"b"), (job_c, None, b"c")], [])
+        assert ours(await backend.load_jobs()) == [(job_b, b"b"), (job_a, b"a"), (job_c, b"c")]
+        await backend.write_jobs([(job_a, 50.0, b"a2")], [job_b])
+        assert ours(await backend.load_jobs()) == [(job_a, b"a2"), (job_c, b"c")]
+        await backend.write_jobs([], [job_a, job_c])
+        assert ours(await backend.load_jobs()) == []
+    storage(scenario)
+
+
+def test_the_archive_keeps_every_message_through_trims(storage):
+    user, unknown = next(_user_ids), next(_user_ids)
+
+    async def scenario(backend):
+        await backend.insert_messages(_rows(user, 10))
+        await backend.trim_messages(keep=3, retain_unsummarized=False, hard_limit=100)
+        # In timestamp order across months
+        await backend.insert_messages([
+            (user, "user", "next month", START + timedelta(days=40)),
+            (user, "bot", "last month", START - timedelta(days=10)),
+        ])
+        batches = [batch async for batch in backend.iter_archive(user, 4)]
+        assert all(0 < len(batch) <= 4 for batch in batches)
+        archived = [row for batch in batches for row in batch]
+        assert [content for _, _, content in archived] == ["last month"] + [f"message {i}" for i in range(10)] + ["next month"]
+        assert archived[0][:2] == (START - timedelta(days=10), "bot")
+        assert await _archived(backend, unknown) == []
+        await backend.clear_memory(user)
+    storage(scenario)
+
+
+def test_search_needs_every_word_and_ranks_best_first(storage):
+    user, other = next(_user_ids), next(_user_ids)
+
+    async def scenario(backend):
+        await backend.insert_messages(_rows(user, 10))
+        await backend.insert_messages(_rows(user, 6, START + timedelta(hours=1), prefix="recent"))
+        await backend.insert_messages([
+            (user, "user", "next month", START + timedelta(days=40)),
+            (user, "bot", "last month", START - timedelta(days=10)),
+        ])
+        await backend.insert_messages(_rows(other, 3, prefix="other"))
+        # Search covers the whole archive, not only the recent history
+        await backend.trim_messages(keep=3, retain_unsummarized=False, hard_limit=100)
+
+        total, first = await backend.search_archive(user, "Month!", 1, 0, 100)
+        assert total == 2 and len(first) == 1
+        assert SNIPPET_START + "month" + SNIPPET_END in first[0][2]
+        total, second = await backend.search_archive(user, "month", 1, 1, 100)
+        assert total == 2 and {hit[2].split()[0] for hit in first + second} == {"next", "last"}
+        assert await backend.search_archive(user, "month", 1, 5, 100) == (2, [])
+
+        await backend.insert_messages([(user, "bot", "recent recent recent", START + timedelta(hours=2))])
+        total, hits = await backend.search_archive(user, "recent", 2, 0, 100)
+        assert total == 7 and hits[0][2].count(SNIPPET_START) == 3
+        # Past max_ranked matches, newest first
+        total, hits = await backend.search_archive(user, "recent", 2, 0, 6)
+        assert total == 7 and [ts for ts, _, _ in hits] == [START + timedelta(hours=2), START + timedelta(hours=1, seconds=5)]
+        total, hits = await backend.search_archive(user, "recent 4", 10, 0, 100)
+        assert total == 1 and "4" in hits[0][2]
+        assert await backend.search_archive(user, "other", 10, 0, 100) == (0, [])
+        assert await backend.search_archive(user, "!?", 10, 0, 100) == (0, [])
+        await backend.clear_memory(user)
+        await backend.clear_memory(other)
+    storage(scenario)
+
+
+def test_clear_memory_forgets_the_archive_of_that_user_only(storage):
+    user, other = next(_user_ids), next(_user_ids)
+
+    async def scenario(backend):
+        await backend.insert_messages(_rows(user, 5))
+        await backend.insert_messages(_rows(other, 3, prefix="other"))
+        await backend.clear_memory(user)
+        assert await _archived(backend, user) == []
+        assert await backend.search_archive(user, "message", 10, 0, 100) == (0, [])
+        assert len(await _archived(backend, other)) == 3
+        assert (await backend.search_archive(other, "other", 10, 0, 100))[0] == 3
+        await backend.clear_memory(other)
+    storage(scenario)